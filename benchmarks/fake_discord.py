@@ -0,0 +1,187 @@
+"""Stand-in Discord objects for driving guesser's command handlers offline.
+
+Only the attributes and coroutines the handlers actually use are
+implemented. Every REST-backed coroutine goes through FakeRest, which counts
+the call and can sleep to model network latency.
+"""
+import asyncio
+import itertools
+import time
+from types import SimpleNamespace
+
+_snowflakes = itertools.count(1 << 40)
+
+
+def snowflake():
+    return next(_snowflakes)
+
+
+class FakeRest:
+    """Counts simulated REST calls and optionally adds latency to each
+
+    A child created with ``scoped()`` counts its own calls and also adds
+    them to its parent's total.
+    """
+
+    def __init__(self, latency=0.0, parent=None):
+        self.latency = latency
+        self.parent = parent
+        self.calls = 0
+
+    def scoped(self):
+        return FakeRest(self.latency, parent=self)
+
+    async def call(self):
+        self.calls += 1
+        if self.parent is not None:
+            self.parent.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        else:
+            await asyncio.sleep(0)
+
+
+class FakeMember:
+    def __init__(self, user_id, name, nick=None, administrator=False):
+        self.id = user_id
+        self.name = name
+        self.nick = nick
+        self.display_name = nick or name
+        self.mention = f'<@{user_id}>'
+        self.bot = False
+        self.guild_permissions = SimpleNamespace(administrator=administrator)
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.members = {}
+        self.member_count = 0
+
+    def add_member(self, member):
+        self.members[member.id] = member
+        self.member_count = len(self.members)
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+
+class FakeMessage:
+    def __init__(self, channel, author, content):
+        self.id = snowflake()
+        self.channel = channel
+        self.author = author
+        self.content = content
+
+
+class FakeThread:
+    def __init__(self, rest, guild, name):
+        self.id = snowflake()
+        self.rest = rest
+        self.guild = guild
+        self.name = name
+        self.jump_url = f'https://discord.com/channels/{guild.id}/{self.id}'
+        self.messages = []
+
+    async def add_user(self, user):
+        await self.rest.call()
+
+    async def send(self, content=None, *, embed=None):
+        await self.rest.call()
+        self.messages.append(content if content is not None else embed)
+
+    async def delete(self):
+        await self.rest.call()
+
+
+class FakeChannel:
+    def __init__(self, rest, guild):
+        self.id = snowflake()
+        self.rest = rest
+        self.guild = guild
+        self.threads = []
+
+    async def create_thread(self, *, name, **kwargs):
+        await self.rest.call()
+        thread = FakeThread(self.rest, self.guild, name)
+        self.threads.append(thread)
+        return thread
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.first_response_at = None
+        self.modal = None
+        self.sent = []
+        self._done = False
+
+    async def _respond(self):
+        if self._done:
+            raise RuntimeError('This interaction has already been responded to')
+        self._done = True
+        self.first_response_at = time.perf_counter()
+        await self.interaction.rest.call()
+
+    def is_done(self):
+        return self._done
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond()
+        self.sent.append((content, kwargs))
+
+    async def defer(self, **kwargs):
+        await self._respond()
+
+    async def send_modal(self, modal):
+        await self._respond()
+        self.modal = modal
+
+    async def edit_message(self, **kwargs):
+        await self._respond()
+        self.sent.append((None, kwargs))
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        await self.interaction.rest.call()
+        self.sent.append((content, kwargs))
+
+
+class FakeInteraction:
+    def __init__(self, rest, guild, channel, user):
+        self.id = snowflake()
+        self.rest = rest
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = channel
+        self.user = user
+        self.command = None
+        self.extras = {}
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def edit_original_response(self, **kwargs):
+        await self.rest.call()
+
+
+class FakeGateway:
+    """Delivers user messages the way the bot's on_message listener would"""
+
+    def __init__(self, router):
+        self.router = router
+        self.messages = 0
+
+    async def reply(self, channel, author, content):
+        """Send a message once the handler is listening, like a user reading the prompt first"""
+        while not self.router.is_waiting(channel.id, author.id):
+            await asyncio.sleep(0)
+        self.messages += 1
+        self.router.dispatch(FakeMessage(channel, author, content))
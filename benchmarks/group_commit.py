@@ -0,0 +1,62 @@
+"""Compare per-guess commits against GuessWriter group commits.
+
+Simulates a burst of guesses arriving at once after /open_guessing and
+reports commits/sec and guesses/sec for both write paths.
+
+Usage: python benchmarks/group_commit.py [--guesses 10000] [--guilds 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+async def run_per_guess(guesser, db, rows):
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        db.main.execute('REPLACE INTO guesses (guild_id, round, question_id, user_id, username, guess) VALUES (?, ?, ?, ?, ?, ?)', row)
+        for row in rows
+    ))
+    return time.perf_counter() - start, len(rows)
+
+
+async def run_group_commit(guesser, db, rows):
+    writer = guesser.GuessWriter(db)
+    start = time.perf_counter()
+    await asyncio.gather(*(writer.submit(*row) for row in rows))
+    elapsed = time.perf_counter() - start
+    await writer.close()
+    return elapsed, writer.batches_committed
+
+
+async def bench(guesser, label, runner, rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = guesser.PartitionedDatabase(os.path.join(tmp, 'bench.db'))
+        await db.run_each(guesser.migrate_database)
+        elapsed, commits = await runner(guesser, db, rows)
+        stored = (await db.main.fetchone('SELECT COUNT(*) FROM guesses'))[0]
+        await db.close()
+    print(f'{label:<14} {len(rows):>7} guesses  {commits:>6} commits  '
+          f'{elapsed:8.3f}s  {commits / elapsed:10.1f} commits/s  {len(rows) / elapsed:10.1f} guesses/s  '
+          f'({stored} rows stored)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guesses', type=int, default=10000)
+    parser.add_argument('--guilds', type=int, default=50)
+    args = parser.parse_args()
+
+    import guesser
+
+    rows = [(i % args.guilds, 1, 1, i, f'user{i}', str(i * 7 % 1000)) for i in range(args.guesses)]
+    asyncio.run(bench(guesser, 'per-guess', run_per_guess, rows))
+    asyncio.run(bench(guesser, 'group-commit', run_group_commit, rows))
+
+
+if __name__ == '__main__':
+    main()
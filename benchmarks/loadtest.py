@@ -0,0 +1,188 @@
+"""Offline load test that drives guesser's command handlers through fake Discord objects.
+
+Every simulated guild plays a full round: set_question (plus add_question
+for each extra question), open_guessing, a burst of /guess from all of its
+users, then list_guesses, find_closest, stats and close_guessing (recording
+the results) for each question, a leaderboard and a confirmed reset_game.
+Handlers run against a real SQLite database in a temporary directory, so
+storage costs are included.
+Reports per-command throughput, p50/p99 latency and p99 time to the first
+interaction response.
+
+Usage: python benchmarks/loadtest.py [--guilds 1000] [--users 20] [--questions 1] [--thread-share 0.1] [--db-partitions 1]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_discord import FakeChannel, FakeGateway, FakeGuild, FakeInteraction, FakeMember, FakeRest, snowflake  # noqa: E402
+
+
+class LoadTest:
+    def __init__(self, guesser, args):
+        self.guesser = guesser
+        self.args = args
+        self.rest = FakeRest(args.rest_latency / 1000)
+        self.gateway = FakeGateway(guesser.router)
+        self.latencies = defaultdict(list)
+        self.first_responses = defaultdict(list)
+        self.rest_calls = defaultdict(int)
+        self.random = random.Random(args.seed)
+
+    async def invoke(self, name, interaction, callback, *args, **kwargs):
+        rest_before = interaction.rest.calls
+        start = time.perf_counter()
+        await callback(interaction, *args, **kwargs)
+        self.latencies[name].append(time.perf_counter() - start)
+        if interaction.response.first_response_at is not None:
+            self.first_responses[name].append(interaction.response.first_response_at - start)
+        self.rest_calls[name] += interaction.rest.calls - rest_before
+
+    def interaction(self, guild, user):
+        # Each interaction gets its own channel object so its thread is easy to find,
+        # and its own REST counter so calls are attributed to the right command
+        rest = self.rest.scoped()
+        return FakeInteraction(rest, guild, FakeChannel(rest, guild), user)
+
+    async def reply_in_thread(self, interaction, content):
+        while not interaction.channel.threads:
+            await asyncio.sleep(0)
+        await self.gateway.reply(interaction.channel.threads[-1], interaction.user, content)
+
+    async def user_guess(self, guild, user, numeric, question_ids):
+        g = self.guesser
+        answer = str(self.random.randint(0, 1000)) if numeric else self.random.choice(TEXT_ANSWERS)
+        interaction = self.interaction(guild, user)
+        # With one question users leave the option out, as they would in Discord
+        question = self.random.choice(question_ids) if len(question_ids) > 1 else None
+
+        if g.settings.guess_mode(guild.id) == 'thread':
+            replying = asyncio.create_task(self.reply_in_thread(interaction, answer))
+            await self.invoke('guess (thread)', interaction, g.guess.callback, question)
+            await replying
+            return
+
+        await self.invoke('guess', interaction, g.guess.callback, question)
+        modal = interaction.response.modal
+        # Fill in the form the way discord.py does when the submission arrives
+        modal.answer._refresh_state(None, {'value': answer})
+        await self.invoke('guess (form)', self.interaction(guild, user), modal.on_submit)
+
+    async def play_guild(self, index):
+        g = self.guesser
+        guild = FakeGuild(snowflake())
+        admin = FakeMember(snowflake(), f'admin{index}', administrator=True)
+        guild.add_member(admin)
+        users = []
+        for i in range(self.args.users):
+            user = FakeMember(snowflake(), f'user{index}_{i}', nick=f'Nick {i}' if i % 2 else None)
+            guild.add_member(user)
+            users.append(user)
+
+        numeric = index % 2 == 0
+        if self.random.random() < self.args.thread_share:
+            choice = g.app_commands.Choice(name="Private thread", value="thread")
+            await self.invoke('guess_mode', self.interaction(guild, admin), g.guess_mode.callback, choice)
+
+        text = 'How many jelly beans are in the jar?' if numeric else 'Name a country starting with B'
+        await self.invoke('set_question', self.interaction(guild, admin), g.set_question.callback, text, numeric)
+        for _ in range(self.args.questions - 1):
+            await self.invoke('add_question', self.interaction(guild, admin), g.add_question.callback, text, numeric)
+        question_ids = list(g.questions.questions(guild.id))
+        for question_id in question_ids:
+            await self.invoke('open_guessing', self.interaction(guild, admin), g.open_guessing.callback, question_id)
+        await asyncio.gather(*(self.user_guess(guild, user, numeric, question_ids) for user in users))
+
+        for question_id in question_ids:
+            await self.invoke('list_guesses', self.interaction(guild, admin), g.list_guesses.callback, question_id)
+            await self.invoke('find_closest', self.interaction(guild, admin), g.find_closest.callback,
+                              '500' if numeric else 'Brazil', question_id)
+            await self.invoke('stats', self.interaction(guild, admin), g.stats_command.callback, question_id)
+            await self.invoke('close_guessing', self.interaction(guild, admin), g.close_guessing.callback, question_id,
+                              '500' if numeric else 'Brazil')
+        await self.invoke('leaderboard', self.interaction(guild, users[0]), g.leaderboard.callback)
+
+        interaction = self.interaction(guild, admin)
+
+        async def confirm_reset():
+            await self.reply_in_thread(interaction, 'DELETE')
+            await self.gateway.reply(interaction.channel.threads[-1], admin, 'CONFIRM RESET')
+
+        confirming = asyncio.create_task(confirm_reset())
+        await self.invoke('reset_game', interaction, g.reset_game.callback)
+        await confirming
+
+    async def run(self):
+        limit = asyncio.Semaphore(self.args.concurrency)
+
+        async def bounded(index):
+            async with limit:
+                await self.play_guild(index)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(i) for i in range(self.args.guilds)))
+        return time.perf_counter() - start
+
+
+TEXT_ANSWERS = ['Brazil', 'Brasil', 'brazil', 'Belgium', 'Bolivia', 'Botswana', 'Bhutan', 'Barbados', 'Bulgaria', 'Burundi']
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(test, elapsed):
+    total = sum(len(v) for v in test.latencies.values())
+    print(f'{test.args.guilds} guilds x {test.args.users} users: {total} handler calls in {elapsed:.2f}s '
+          f'({total / elapsed:,.0f} calls/s), {test.rest.calls} REST calls, {test.gateway.messages} gateway messages')
+    print(f'{"command":<16}{"calls":>8}{"calls/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"1st resp p99":>14}{"REST/call":>11}')
+    for name, values in sorted(test.latencies.items()):
+        first = test.first_responses.get(name)
+        first_p99 = f'{percentile(first, 0.99) * 1000:.2f}' if first else '-'
+        print(f'{name:<16}{len(values):>8}{len(values) / elapsed:>10,.0f}'
+              f'{percentile(values, 0.50) * 1000:>10.2f}{percentile(values, 0.99) * 1000:>10.2f}'
+              f'{first_p99:>14}{test.rest_calls[name] / len(values):>11.1f}')
+
+
+async def main_async(guesser, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        guesser.db.configure(os.path.join(tmp, 'loadtest.db'), args.db_partitions)
+        await guesser.init_storage()
+        await guesser.compactor.start(guesser.partition)
+        test = LoadTest(guesser, args)
+        elapsed = await test.run()
+        await guesser.compactor.stop()
+        await guesser.guess_writer.close()
+        await guesser.db.close()
+    report(test, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=20, help='users per guild')
+    parser.add_argument('--questions', type=int, default=1, help='questions open at once in each guild')
+    parser.add_argument('--thread-share', type=float, default=0.1, help='fraction of guilds using the private-thread guess mode')
+    parser.add_argument('--concurrency', type=int, default=200, help='guilds playing at the same time')
+    parser.add_argument('--rest-latency', type=float, default=0.0, help='simulated latency per REST call, in ms')
+    parser.add_argument('--db-partitions', type=int, default=1, help='number of SQLite files to spread guilds over')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # Warnings such as guess timeouts would otherwise go to stderr
+    logging.getLogger('discord').setLevel(logging.ERROR)
+    import guesser
+    asyncio.run(main_async(guesser, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Compare the memory discord.py's caches use under each GATEWAY_PROFILE.
+
+Each profile runs in its own process, which builds the bot's connection
+state from guesser.gateway_options() and feeds it the gateway events a
+guild sends once the bot has joined: GUILD_CREATE (with members and voice
+states only when the profile's intents ask for them), then a stream of
+channel messages. Reports the resident set size the caches add, scaled to
+1,000 guilds, with the number of members and messages left cached.
+
+Usage: python benchmarks/memory_profile.py [--guilds 2000] [--voice-users 5] [--messages 10]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_discord import snowflake  # noqa: E402
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Peak rather than current size, but it only grows while the caches fill
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def user_payload(user_id, name):
+    return {'id': str(user_id), 'username': name, 'discriminator': '0', 'global_name': None, 'avatar': None, 'bot': False}
+
+
+def member_payload(user_id, name, nick=None):
+    return {'user': user_payload(user_id, name), 'nick': nick, 'roles': [], 'joined_at': '2024-01-01T00:00:00+00:00',
+            'deaf': False, 'mute': False, 'flags': 0}
+
+
+def guild_payload(index, self_id, args, intents):
+    guild_id = snowflake()
+    channels = [{'id': str(snowflake()), 'type': 0, 'name': f'general-{i}', 'position': i, 'permission_overwrites': []}
+                for i in range(args.text_channels)]
+    voice = {'id': str(snowflake()), 'type': 2, 'name': 'voice', 'position': len(channels), 'permission_overwrites': [],
+             'bitrate': 64000, 'user_limit': 0}
+    members = [member_payload(self_id, 'guesser')]
+    voice_states = []
+    # Discord only sends voice states, and the members in them, with the voice states intent
+    if intents.voice_states:
+        for i in range(args.voice_users):
+            user_id = snowflake()
+            members.append(member_payload(user_id, f'user{index}_{i}', nick=f'Nick {i}'))
+            voice_states.append({'user_id': str(user_id), 'channel_id': voice['id'], 'session_id': 'x', 'deaf': False,
+                                 'mute': False, 'self_deaf': False, 'self_mute': False, 'self_video': False,
+                                 'suppress': False, 'request_to_speak_timestamp': None})
+    return {
+        'id': str(guild_id), 'name': f'guild{index}', 'owner_id': str(snowflake()), 'member_count': args.members,
+        'large': args.members > 250, 'unavailable': False, 'features': [], 'emojis': [], 'stickers': [],
+        'roles': [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0, 'color': 0,
+                   'hoist': False, 'managed': False, 'mentionable': False}],
+        'channels': channels + [voice], 'threads': [], 'members': members, 'voice_states': voice_states,
+        'presences': [],
+    }
+
+
+def message_payload(guild, args, index):
+    channel = guild['channels'][index % args.text_channels]
+    user_id = snowflake()
+    return {
+        'id': str(snowflake()), 'channel_id': channel['id'], 'guild_id': guild['id'], 'type': 0,
+        'content': f'message {index} with enough text to look like a typical chat line', 'tts': False,
+        'mention_everyone': False, 'mentions': [], 'mention_roles': [], 'attachments': [], 'embeds': [],
+        'pinned': False, 'timestamp': '2024-01-01T00:00:00+00:00', 'edited_timestamp': None,
+        'author': user_payload(user_id, f'chatter{index}'),
+        'member': {k: v for k, v in member_payload(user_id, f'chatter{index}').items() if k != 'user'},
+    }
+
+
+async def measure(guesser, args):
+    import discord
+
+    client = discord.Client(**guesser.gateway_options(args.child))
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data=user_payload(snowflake(), 'guesser'))
+    guilds = [guild_payload(i, state.self_id, args, state._intents) for i in range(args.guilds)]
+    gc.collect()
+    before = rss_bytes()
+
+    for data in guilds:
+        state.parse_guild_create(data)
+    if state._intents.guild_messages:
+        for guild in guilds:
+            for i in range(args.messages):
+                state.parse_message_create(message_payload(guild, args, i))
+    gc.collect()
+    after = rss_bytes()
+
+    return {
+        'profile': args.child,
+        'rss': after - before,
+        'members': sum(len(guild.members) for guild in client.guilds),
+        'messages': len(state._messages or ()),
+    }
+
+
+def run_profile(profile, args):
+    command = [sys.executable, os.path.abspath(__file__), '--child', profile]
+    for name in ('guilds', 'members', 'voice_users', 'text_channels', 'messages'):
+        command += [f'--{name.replace("_", "-")}', str(getattr(args, name))]
+    return json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=2000)
+    parser.add_argument('--members', type=int, default=50, help='member count reported for each guild')
+    parser.add_argument('--voice-users', type=int, default=5, help='members sitting in voice in each guild')
+    parser.add_argument('--text-channels', type=int, default=10, help='text channels per guild')
+    parser.add_argument('--messages', type=int, default=10, help='channel messages received per guild')
+    parser.add_argument('--child', choices=('default', 'lean'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        import logging
+        logging.getLogger('discord').setLevel(logging.ERROR)
+        import guesser
+        print(json.dumps(asyncio.run(measure(guesser, args))))
+        return
+
+    import guesser
+    print(f'{args.guilds} guilds, {args.voice_users} voice users and {args.messages} messages per guild')
+    print(f'{"profile":<10}{"RSS MB":>10}{"MB/1k guilds":>15}{"members":>10}{"messages":>10}')
+    for profile in guesser.GATEWAY_PROFILES:
+        result = run_profile(profile, args)
+        rss = result['rss'] / (1024 * 1024)
+        print(f'{profile:<10}{rss:>10.1f}{rss * 1000 / args.guilds:>15.2f}{result["members"]:>10}{result["messages"]:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Measure concurrent-guild write throughput across database partition counts.
+
+Many guilds submit guesses at the same time, with one large guild sending a
+burst several times bigger than the rest. Each configuration writes the same
+rows through GuessWriter and through one commit per guess, and reports
+guesses/sec plus the p99 time a guess in a small guild waits for its commit.
+The first row uses SQLite's default journal and sync settings in a single
+file, for comparison with the tuned PRAGMAs.
+
+Usage: python benchmarks/partitioned_writes.py [--guesses 20000] [--guilds 200] [--partitions 1,2,4,8]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def make_rows(args):
+    rng = random.Random(args.seed)
+    # Spread guild ids over the timestamp bits the router hashes on
+    guilds = [(rng.getrandbits(41) << 22) | i for i in range(args.guilds)]
+    big = guilds[0]
+    rows = []
+    for i in range(args.guesses):
+        # A quarter of all guesses come from the one big guild
+        guild_id = big if i % 4 == 0 else rng.choice(guilds[1:])
+        rows.append((guild_id, 1, 1, i, f'user{i}', str(rng.randint(0, 1000))))
+    rng.shuffle(rows)
+    return big, rows
+
+
+async def timed(coro, guild_id, big, waits):
+    start = time.perf_counter()
+    await coro
+    if guild_id != big:
+        waits.append(time.perf_counter() - start)
+
+
+async def run_per_guess(guesser, db, big, rows):
+    waits = []
+    await asyncio.gather(*(
+        timed(db.for_guild(row[0]).execute(
+            'REPLACE INTO guesses (guild_id, round, question_id, user_id, username, guess, guess_num, guess_norm) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (*row, guesser.parse_guess_num(row[5]), guesser.normalize_answer(row[5]))
+        ), row[0], big, waits)
+        for row in rows
+    ))
+    return waits
+
+
+async def run_group_commit(guesser, db, big, rows):
+    writer = guesser.GuessWriter(db)
+    waits = []
+    await asyncio.gather(*(timed(writer.submit(*row), row[0], big, waits) for row in rows))
+    await writer.close()
+    return waits
+
+
+async def bench(guesser, label, partitions, runner, big, rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = guesser.PartitionedDatabase(os.path.join(tmp, 'bench.db'), partitions)
+        await db.run_each(guesser.migrate_database)
+        start = time.perf_counter()
+        waits = await runner(guesser, db, big, rows)
+        elapsed = time.perf_counter() - start
+        stored = sum(count for count, in await db.fetchall('SELECT COUNT(*) FROM guesses'))
+        await db.close()
+    waits.sort()
+    p99 = waits[int(0.99 * (len(waits) - 1))] * 1000
+    print(f'{label:<22}{partitions:>6}{len(rows) / elapsed:>14,.0f}{p99:>14.1f}{stored:>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guesses', type=int, default=20000)
+    parser.add_argument('--guilds', type=int, default=200)
+    parser.add_argument('--partitions', default='1,2,4,8', help='comma-separated partition counts to compare')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    import guesser
+
+    big, rows = make_rows(args)
+    print(f'{"write path":<22}{"files":>6}{"guesses/s":>14}{"p99 wait ms":>14}{"stored":>10}')
+    for label, runner in (('per-guess commit', run_per_guess), ('group commit', run_group_commit)):
+        tuned = guesser.SQLITE_PRAGMAS
+        guesser.SQLITE_PRAGMAS = ()
+        try:
+            asyncio.run(bench(guesser, f'{label} (untuned)', 1, runner, big, rows))
+        finally:
+            guesser.SQLITE_PRAGMAS = tuned
+        for partitions in map(int, args.partitions.split(',')):
+            asyncio.run(bench(guesser, label, partitions, runner, big, rows))
+
+
+if __name__ == '__main__':
+    main()
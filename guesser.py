@@ -1,140 +1,3009 @@
+import aiohttp
+import argparse
 import discord
-from discord.ext import commands
+from discord import app_commands
+from discord.ext import commands, tasks
 import sqlite3
 import os
 from dotenv import load_dotenv
 import asyncio
+import atexit
+import bisect
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import json
 import logging
-from datetime import datetime
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('discord.log', mode='a')  # 'a' for append mode
-    ]
+import logging.handlers
+import math
+import multiprocessing
+import multiprocessing.managers
+import queue
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger('discord.guesser')
+# Subsystem loggers, so their levels can be set separately with LOG_LEVELS
+storage_logger = logger.getChild('storage')
+guess_logger = logger.getChild('guess')
+command_logger = logger.getChild('commands')
+thread_logger = logger.getChild('threads')
+schedule_logger = logger.getChild('schedules')
+shard_logger = logger.getChild('sharding')
+
+# Extra fields copied into JSON log lines when a log call passes them
+LOG_FIELDS = ('guild_id', 'user_id', 'command', 'latency_ms')
+
+class JsonLogFormatter(logging.Formatter):
+    """Formats each record as one compact JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+def setup_logging(filename='discord.log'):
+    """Log to a rotating file and the console from a background thread, and mark the start of a new bot session
+
+    Loggers only put records on a queue; a QueueListener thread formats them
+    and does the writes, so logging never blocks the event loop. Configured
+    from the environment:
+
+    - LOG_FORMAT: ``text`` (default) or ``json`` for JSON lines in the file
+    - LOG_ROTATE: ``size`` (default) to rotate at LOG_MAX_BYTES, or a
+      TimedRotatingFileHandler interval such as ``midnight`` or ``h``
+    - LOG_MAX_BYTES (default 10 MB) and LOG_BACKUPS (default 5 old files)
+    - LOG_LEVEL: level for everything (default INFO)
+    - LOG_LEVELS: per-logger overrides, e.g. ``discord.guesser.guess=WARNING,discord.gateway=WARNING``
+
+    Returns the listener, which must be stopped on exit to flush the queue.
+    """
+    backups = int(os.getenv('LOG_BACKUPS') or 5)
+    rotate = os.getenv('LOG_ROTATE') or 'size'
+    if rotate == 'size':
+        max_bytes = int(os.getenv('LOG_MAX_BYTES') or 10 * 1024 * 1024)
+        file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    else:
+        file_handler = logging.handlers.TimedRotatingFileHandler(filename, when=rotate, backupCount=backups, encoding='utf-8')
+    
+    text_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(JsonLogFormatter() if os.getenv('LOG_FORMAT') == 'json' else text_format)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(text_format)
+    
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    for override in filter(None, os.getenv('LOG_LEVELS', '').split(',')):
+        name, _, level = override.partition('=')
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+    
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    
+    # Add separator for new bot session
+    logger.info('='*60)
+    logger.info(f'NEW BOT SESSION STARTED - {datetime.now()}')
+    logger.info('='*60)
+    return listener
+
+# Default histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 3.0, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics:
+    """In-process counters, histograms and gauges rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._gauges = {}
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def gauge(self, name, help_text, func):
+        """Register a gauge whose value is read from func() at render time"""
+        self.describe(name, 'gauge', help_text)
+        self._gauges[name] = func
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = [*labels, *extra]
+        if not pairs:
+            return ''
+        escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ') for _, v in pairs)
+        return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        lines = []
+        seen = set()
+        
+        def header(name):
+            if name not in seen and name in self._help:
+                kind, help_text = self._help[name]
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+            seen.add(name)
+        
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (h.buckets, list(h.counts), h.sum, h.count)) for key, h in self._histograms.items())
+        
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f'{name}{self._labels(labels)} {value:g}')
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            header(name)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{self._labels(labels, [("le", f"{bound:g}")])} {cumulative}')
+            lines.append(f'{name}_bucket{self._labels(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{self._labels(labels)} {total:.6f}')
+            lines.append(f'{name}_count{self._labels(labels)} {count}')
+        for name, func in sorted(self._gauges.items()):
+            header(name)
+            try:
+                lines.append(f'{name} {func():g}')
+            except Exception as e:
+                logger.warning(f'Failed to read gauge {name}: {e}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+metrics.describe('guesser_command_seconds', 'histogram', 'Time from a command starting to it finishing')
+metrics.describe('guesser_sql_seconds', 'histogram', 'Time spent executing each SQL statement or database job')
+metrics.describe('guesser_rest_requests_total', 'counter', 'Discord REST requests by route and status')
+metrics.describe('guesser_rest_rate_limited_total', 'counter', 'Discord REST responses with status 429, by route')
+metrics.describe('guesser_event_loop_lag_seconds', 'histogram', 'How late the event loop wakes up a sleeping task')
+metrics.describe('guesser_guess_rejected_total', 'counter', '/guess attempts turned away by admission control, by reason')
+
+def sql_label(sql):
+    """Collapse a SQL statement to one short line for use as a metric label"""
+    sql = ' '.join(sql.split())
+    return sql if len(sql) <= 120 else sql[:117] + '...'
+
+# Applied to every database file when it is opened. WAL lets reads run
+# alongside a write, and with synchronous=NORMAL a commit no longer waits for
+# an fsync: a power cut can lose the last few commits but never corrupts the
+# file. The page cache and memory map are sized per file, since partitioned
+# storage opens several
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),  # KiB
+    ('mmap_size', 256 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
 )
-logger = logging.getLogger('discord')
 
-# Add separator for new bot session
-logger.info('='*60)
-logger.info(f'NEW BOT SESSION STARTED - {datetime.now()}')
-logger.info('='*60)
+class Database:
+    """SQLite storage that runs every query on a dedicated thread.
+
+    All reads and writes go through one worker thread that owns the
+    connection, so writes are serialized and slow queries never block the
+    event loop. Handlers await the helpers below; anything that needs several
+    statements in one transaction should use ``run()`` with a plain function
+    that receives the connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='guesser-db')
+        self._backup = None
+
+    def _connection(self):
+        # Only ever called on the database thread
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            for name, value in SQLITE_PRAGMAS:
+                self._conn.execute(f'PRAGMA {name} = {value}')
+        return self._conn
+
+    def _call(self, label, func, args):
+        start = time.perf_counter()
+        try:
+            return func(self._connection(), *args)
+        finally:
+            metrics.observe('guesser_sql_seconds', time.perf_counter() - start, statement=label)
+
+    async def _run(self, label, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, label, func, args)
+
+    async def run(self, func, *args):
+        """Run ``func(conn, *args)`` on the database thread and return its result"""
+        return await self._run(getattr(func, '__qualname__', repr(func)), func, *args)
+
+    async def execute(self, sql, params=()):
+        """Execute a single write statement and commit it"""
+        def _execute(conn):
+            with conn:
+                return conn.execute(sql, params).rowcount
+        return await self._run(sql_label(sql), _execute)
+
+    async def executemany(self, sql, seq_of_params):
+        """Execute a write statement for every parameter tuple in one transaction"""
+        def _executemany(conn):
+            with conn:
+                return conn.executemany(sql, seq_of_params).rowcount
+        return await self._run(sql_label(sql), _executemany)
+
+    async def fetchone(self, sql, params=()):
+        return await self._run(sql_label(sql), lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql, params=()):
+        return await self._run(sql_label(sql), lambda conn: conn.execute(sql, params).fetchall())
+
+    async def backup(self, target):
+        """Copy the database into the file ``target`` with SQLite's online backup API
+
+        The copy is read in a worker thread through its own read-only
+        connection, in a single step, so it is one consistent snapshot and
+        the database thread's connection is never used off that thread. In
+        WAL mode the snapshot's read transaction doesn't block writers, so
+        guesses keep being committed during the copy; they just aren't in
+        it. The finished copy is switched to a rollback journal so it is a
+        single self-contained file.
+        """
+        def _backup():
+            start = time.perf_counter()
+            source = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+            copy = sqlite3.connect(target)
+            try:
+                source.backup(copy)
+                copy.execute('PRAGMA journal_mode = DELETE')
+            finally:
+                copy.close()
+                source.close()
+                metrics.observe('guesser_sql_seconds', time.perf_counter() - start, statement='backup')
+        
+        # close() waits for this, since cancelling the caller can't stop the thread
+        self._backup = asyncio.ensure_future(asyncio.to_thread(_backup))
+        await asyncio.shield(self._backup)
+
+    async def close(self):
+        def _close(conn):
+            conn.close()
+            self._conn = None
+        if self._backup is not None:
+            await asyncio.wait([self._backup])
+        if self._conn is not None:
+            await self.run(_close)
+        self._executor.shutdown(wait=True)
+
+def partition_paths(path, count):
+    """Return the database file for each of ``count`` partitions of ``path``"""
+    if count == 1:
+        return [path]
+    root, ext = os.path.splitext(path)
+    return [f'{root}-p{index}of{count}{ext}' for index in range(count)]
+
+def other_partition_counts(path, count):
+    """Return the partition counts of existing ``path`` partition files made for a count other than ``count``"""
+    directory, name = os.path.split(os.path.abspath(path))
+    root, ext = os.path.splitext(name)
+    pattern = re.compile(rf'{re.escape(root)}-p\d+of(\d+){re.escape(ext)}')
+    counts = {int(match.group(1)) for match in map(pattern.fullmatch, os.listdir(directory)) if match}
+    counts.discard(count)
+    return sorted(counts)
+
+class PartitionedDatabase:
+    """Guild data spread over one or more SQLite files, routed by guild_id.
+
+    With one partition everything stays in ``path``. With N, each guild's rows
+    live in one of N files picked by ``(guild_id >> 22) % N``, the same rule the
+    gateway uses for shards. Every file has its own Database thread and write
+    lock, so a burst of writes in one guild only queues behind guilds in the
+    same file. Bot-wide tables such as thread_cleanup stay in the first file.
+    """
+
+    def __init__(self, path, count=1):
+        self.configure(path, count)
+
+    def configure(self, path, count=1):
+        """Choose the files to use; must be called before any query"""
+        self.path = path
+        self.count = count
+        self.partitions = [Database(partition_path) for partition_path in partition_paths(path, count)]
+
+    @property
+    def main(self):
+        return self.partitions[0]
+
+    def index(self, guild_id):
+        return (guild_id >> 22) % self.count
+
+    def for_guild(self, guild_id):
+        return self.partitions[self.index(guild_id)]
+
+    async def run_each(self, func, *args):
+        """Run ``func(conn, *args)`` on every partition at once and return the results in partition order"""
+        return await asyncio.gather(*(database.run(func, *args) for database in self.partitions))
+
+    async def fetchall(self, sql, params=()):
+        """Run a query on every partition and return all of their rows"""
+        results = await asyncio.gather(*(database.fetchall(sql, params) for database in self.partitions))
+        return [row for rows in results for row in rows]
+
+    async def close(self):
+        await asyncio.gather(*(database.close() for database in self.partitions))
+
+def split_database(path, count):
+    """Copy a single-file database into ``count`` partition files, leaving the original untouched"""
+    targets = partition_paths(path, count)
+    existing = [target for target in targets if os.path.exists(target)]
+    if existing:
+        raise FileExistsError(f'Partition files already exist: {", ".join(existing)}')
+    
+    # Bring the source up to the current schema so the columns line up
+    conn = sqlite3.connect(path)
+    migrate_database(conn)
+    conn.close()
+    
+    for index, target in enumerate(targets):
+        conn = sqlite3.connect(target)
+        migrate_database(conn)
+        conn.execute('ATTACH DATABASE ? AS source', (path,))
+        with conn:
+            for table in ('question', 'guesses', 'guild_settings', 'guild_rounds',
+                          'round_history', 'round_results', 'leaderboard', 'schedules'):
+                columns = ', '.join(col[1] for col in conn.execute(f'PRAGMA main.table_info({table})'))
+                copied = conn.execute(
+                    f'INSERT INTO main.{table} ({columns}) SELECT {columns} FROM source.{table} WHERE (guild_id >> 22) % ? = ?',
+                    (count, index)
+                ).rowcount
+                storage_logger.info(f'Copied {copied} {table} row(s) to {target}')
+            if index == 0:
+                conn.execute('INSERT INTO main.thread_cleanup (thread_id, delete_at, guild_id) SELECT thread_id, delete_at, guild_id FROM source.thread_cleanup')
+        conn.execute('DETACH DATABASE source')
+        conn.close()
+
+# Set up the database; configure_storage() picks the partition count at startup
+db = PartitionedDatabase('guesses.db')
+
+def configure_storage():
+    """Use the number of database files set by DB_PARTITIONS (default 1)"""
+    db.configure('guesses.db', int(os.getenv('DB_PARTITIONS') or 1))
+
+class GuildPartition:
+    """The guilds whose data this process serves.
+
+    A single-process bot owns every guild. A shard-cluster worker owns only
+    the guilds Discord routes to its shards, using the gateway's own rule
+    ``(guild_id >> 22) % shard_count``, and loads nothing else at startup.
+    """
+
+    def __init__(self):
+        self.shard_ids = None
+        self.shard_count = None
+
+    def assign(self, shard_ids, shard_count):
+        self.shard_ids = frozenset(shard_ids)
+        self.shard_count = shard_count
+
+    @property
+    def is_primary(self):
+        """True for the process running shard 0, which also does the bot-wide chores"""
+        return self.shard_ids is None or 0 in self.shard_ids
+
+    def where(self, column='guild_id'):
+        """Return a SQL condition and its parameters that select this partition's rows"""
+        if self.shard_ids is None:
+            return '1', ()
+        placeholders = ', '.join('?' * len(self.shard_ids))
+        return f'(({column} >> 22) % ?) IN ({placeholders})', (self.shard_count, *sorted(self.shard_ids))
+
+partition = GuildPartition()
+
+# Large migrations copy or update this many rows per transaction
+MIGRATION_BATCH_SIZE = 5000
+
+def copy_in_batches(conn, source, target, target_columns, select_columns):
+    """Copy every row of ``source`` into ``target``, committing every MIGRATION_BATCH_SIZE rows"""
+    last = conn.execute(f'SELECT MIN(rowid) - 1 FROM {source}').fetchone()[0]
+    if last is None:
+        return
+    while True:
+        high, count = conn.execute(
+            f'SELECT MAX(rowid), COUNT(*) FROM (SELECT rowid FROM {source} WHERE rowid > ? ORDER BY rowid LIMIT ?)',
+            (last, MIGRATION_BATCH_SIZE)
+        ).fetchone()
+        if not count:
+            return
+        with conn:
+            conn.execute(f'INSERT INTO {target} ({target_columns}) SELECT {select_columns} FROM {source} WHERE rowid > ? AND rowid <= ?',
+                         (last, high))
+        last = high
+
+def backfill_in_batches(conn, column, compute):
+    """Set guesses.<column> to compute(guess) for every row, committing every MIGRATION_BATCH_SIZE rows"""
+    last = conn.execute('SELECT MIN(rowid) - 1 FROM guesses').fetchone()[0]
+    if last is None:
+        return
+    while True:
+        rows = conn.execute('SELECT rowid, guess FROM guesses WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                            (last, MIGRATION_BATCH_SIZE)).fetchall()
+        if not rows:
+            return
+        with conn:
+            conn.executemany(f'UPDATE guesses SET {column} = ? WHERE rowid = ?', [(compute(guess), rowid) for rowid, guess in rows])
+        last = rows[-1][0]
+
+# Schema migrations, applied in order. Databases created before user_version
+# was tracked start at version 0, so every step checks what is already there.
+def migration_1_base_tables(conn):
+    """multi-server guesses, question, guild_settings and thread_cleanup tables"""
+    c = conn.cursor()
+    
+    # Left behind if a rebuild below was interrupted; it is redone from scratch
+    c.execute('DROP TABLE IF EXISTS guesses_new')
+    
+    # Check if tables exist
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='guesses'")
+    if not c.fetchone():
+        storage_logger.info('Creating guesses table...')
+        c.execute('''
+            CREATE TABLE guesses (
+                guild_id INTEGER,
+                user_id INTEGER,
+                username TEXT,
+                guess TEXT,
+                PRIMARY KEY (guild_id, user_id)
+            )
+        ''')
+    else:
+        # Check if guild_id column exists in guesses table
+        c.execute('PRAGMA table_info(guesses)')
+        columns = [column[1] for column in c.fetchall()]
+        
+        if 'guild_id' not in columns:
+            storage_logger.info('Migrating guesses table to support multiple servers...')
+            # Create new table with guild_id
+            c.execute('''
+                CREATE TABLE guesses_new (
+                    guild_id INTEGER,
+                    user_id INTEGER,
+                    username TEXT,
+                    guess TEXT,
+                    PRIMARY KEY (guild_id, user_id)
+                )
+            ''')
+            # Migrate existing data (set guild_id to 0 for old data)
+            copy_in_batches(conn, 'guesses', 'guesses_new', 'guild_id, user_id, username, guess', '0, user_id, username, guess')
+            # Swap the tables in one transaction so an interruption never loses the old one
+            c.execute('BEGIN')
+            c.execute('DROP TABLE guesses')
+            c.execute('ALTER TABLE guesses_new RENAME TO guesses')
+            conn.commit()
+    
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='question'")
+    if not c.fetchone():
+        storage_logger.info('Creating question table...')
+        c.execute('''
+            CREATE TABLE question (
+                guild_id INTEGER PRIMARY KEY,
+                question_text TEXT DEFAULT '',
+                is_open INTEGER DEFAULT 0,
+                is_numeric INTEGER DEFAULT 1
+            )
+        ''')
+    else:
+        # Check for guild_id in question table
+        c.execute('PRAGMA table_info(question)')
+        columns = [column[1] for column in c.fetchall()]
+        
+        if 'guild_id' not in columns or 'id' in columns:
+            storage_logger.info('Migrating question table to support multiple servers...')
+            # Create new table with guild_id
+            c.execute('''
+                CREATE TABLE question_new (
+                    guild_id INTEGER PRIMARY KEY,
+                    question_text TEXT DEFAULT '',
+                    is_open INTEGER DEFAULT 0,
+                    is_numeric INTEGER DEFAULT 1
+                )
+            ''')
+            # Try to migrate existing data
+            try:
+                c.execute('INSERT INTO question_new (guild_id, question_text, is_open, is_numeric) SELECT 0, question_text, is_open, is_numeric FROM question WHERE id = 1')
+            except:
+                pass  # If migration fails, just continue
+            c.execute('DROP TABLE question')
+            c.execute('ALTER TABLE question_new RENAME TO question')
+    
+    # Check guesses table columns for other migrations
+    c.execute('PRAGMA table_info(guesses)')
+    columns = {col[1]: col[2] for col in c.fetchall()}
+    
+    # If guess column is INTEGER, we need to recreate the table with TEXT
+    if 'guess' in columns and columns['guess'] == 'INTEGER':
+        storage_logger.info('Migrating guesses table to support text answers...')
+        c.execute('''
+            CREATE TABLE guesses_new (
+                guild_id INTEGER,
+                user_id INTEGER,
+                username TEXT,
+                guess TEXT,
+                PRIMARY KEY (guild_id, user_id)
+            )
+        ''')
+        copy_in_batches(conn, 'guesses', 'guesses_new', 'guild_id, user_id, username, guess', 'guild_id, user_id, username, CAST(guess AS TEXT)')
+        # Swap the tables in one transaction so an interruption never loses the old one
+        c.execute('BEGIN')
+        c.execute('DROP TABLE guesses')
+        c.execute('ALTER TABLE guesses_new RENAME TO guesses')
+        conn.commit()
+    
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='guild_settings'")
+    if not c.fetchone():
+        storage_logger.info('Creating guild_settings table...')
+        c.execute('''
+            CREATE TABLE guild_settings (
+                guild_id INTEGER PRIMARY KEY,
+                guess_mode TEXT DEFAULT 'modal'
+            )
+        ''')
+    
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='thread_cleanup'")
+    if not c.fetchone():
+        storage_logger.info('Creating thread_cleanup table...')
+        c.execute('''
+            CREATE TABLE thread_cleanup (
+                thread_id INTEGER PRIMARY KEY,
+                delete_at REAL
+            )
+        ''')
+
+def migration_2_guess_num(conn):
+    """typed copy of numeric guesses so closest-guess lookups can seek an index"""
+    columns = [col[1] for col in conn.execute('PRAGMA table_info(guesses)')]
+    if 'guess_num' not in columns:
+        conn.execute('ALTER TABLE guesses ADD COLUMN guess_num INTEGER')
+        backfill_in_batches(conn, 'guess_num', parse_guess_num)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_guesses_guild_num ON guesses (guild_id, guess_num)')
+
+def migration_3_guess_norm(conn):
+    """normalized copy of each answer for text matching in find_closest"""
+    columns = [col[1] for col in conn.execute('PRAGMA table_info(guesses)')]
+    if 'guess_norm' not in columns:
+        conn.execute('ALTER TABLE guesses ADD COLUMN guess_norm TEXT')
+        backfill_in_batches(conn, 'guess_norm', normalize_answer)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_guesses_guild_norm ON guesses (guild_id, guess_norm)')
+
+def migration_4_thread_cleanup_guild(conn):
+    """guild of each queued thread, so shard workers only clean up their own"""
+    if 'guild_id' not in [col[1] for col in conn.execute('PRAGMA table_info(thread_cleanup)')]:
+        conn.execute('ALTER TABLE thread_cleanup ADD COLUMN guild_id INTEGER')
+
+def migration_5_bot_state(conn):
+    """key/value table for bot-wide state such as the synced command hash"""
+    conn.execute('CREATE TABLE IF NOT EXISTS bot_state (key TEXT PRIMARY KEY, value TEXT)')
+
+def migration_6_question_ids(conn):
+    """several questions per guild: question and guesses keyed by question_id"""
+    if 'question_id' not in [col[1] for col in conn.execute('PRAGMA table_info(question)')]:
+        conn.execute('DROP TABLE IF EXISTS question_new')
+        conn.execute('''
+            CREATE TABLE question_new (
+                guild_id INTEGER,
+                question_id INTEGER,
+                question_text TEXT DEFAULT '',
+                is_open INTEGER DEFAULT 0,
+                is_numeric INTEGER DEFAULT 1,
+                PRIMARY KEY (guild_id, question_id)
+            )
+        ''')
+        # A reset used to leave an empty question row behind; those guilds simply have no questions now
+        conn.execute('''
+            INSERT INTO question_new (guild_id, question_id, question_text, is_open, is_numeric)
+            SELECT guild_id, 1, question_text, is_open, is_numeric FROM question WHERE question_text != ''
+        ''')
+        conn.execute('DROP TABLE question')
+        conn.execute('ALTER TABLE question_new RENAME TO question')
+        conn.commit()
+    
+    if 'question_id' not in [col[1] for col in conn.execute('PRAGMA table_info(guesses)')]:
+        conn.execute('DROP TABLE IF EXISTS guesses_new')
+        conn.execute('''
+            CREATE TABLE guesses_new (
+                guild_id INTEGER,
+                question_id INTEGER,
+                user_id INTEGER,
+                username TEXT,
+                guess TEXT,
+                guess_num INTEGER,
+                guess_norm TEXT,
+                PRIMARY KEY (guild_id, question_id, user_id)
+            )
+        ''')
+        columns = 'user_id, username, guess, guess_num, guess_norm'
+        copy_in_batches(conn, 'guesses', 'guesses_new', f'guild_id, question_id, {columns}', f'guild_id, 1, {columns}')
+        conn.execute('BEGIN')
+        conn.execute('DROP TABLE guesses')
+        conn.execute('ALTER TABLE guesses_new RENAME TO guesses')
+        conn.commit()
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_guesses_question_num ON guesses (guild_id, question_id, guess_num)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_guesses_question_norm ON guesses (guild_id, question_id, guess_norm)')
+
+def migration_7_rounds(conn):
+    """numbered rounds per guild, so a reset only advances the guild's round"""
+    conn.execute('CREATE TABLE IF NOT EXISTS guild_rounds (guild_id INTEGER PRIMARY KEY, round INTEGER NOT NULL DEFAULT 1)')
+    if 'round' not in [col[1] for col in conn.execute('PRAGMA table_info(guesses)')]:
+        conn.execute('DROP TABLE IF EXISTS guesses_new')
+        conn.execute('''
+            CREATE TABLE guesses_new (
+                guild_id INTEGER,
+                round INTEGER NOT NULL DEFAULT 1,
+                question_id INTEGER,
+                user_id INTEGER,
+                username TEXT,
+                guess TEXT,
+                guess_num INTEGER,
+                guess_norm TEXT,
+                PRIMARY KEY (guild_id, round, question_id, user_id)
+            )
+        ''')
+        columns = 'guild_id, question_id, user_id, username, guess, guess_num, guess_norm'
+        copy_in_batches(conn, 'guesses', 'guesses_new', columns, columns)
+        conn.execute('BEGIN')
+        conn.execute('DROP TABLE guesses')
+        conn.execute('ALTER TABLE guesses_new RENAME TO guesses')
+        conn.commit()
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_guesses_round_num ON guesses (guild_id, round, question_id, guess_num)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_guesses_round_norm ON guesses (guild_id, round, question_id, guess_norm)')
+    conn.commit()
+
+def migration_8_results(conn):
+    """recorded results of each question and a per-guild leaderboard across rounds"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS round_history (
+            guild_id INTEGER,
+            round INTEGER,
+            question_id INTEGER,
+            question_text TEXT,
+            answer TEXT,
+            guesses INTEGER,
+            recorded_at REAL,
+            PRIMARY KEY (guild_id, round, question_id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS round_results (
+            guild_id INTEGER,
+            round INTEGER,
+            question_id INTEGER,
+            user_id INTEGER,
+            place INTEGER,
+            username TEXT,
+            guess TEXT,
+            points INTEGER,
+            PRIMARY KEY (guild_id, round, question_id, user_id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            guild_id INTEGER,
+            user_id INTEGER,
+            username TEXT,
+            wins INTEGER NOT NULL DEFAULT 0,
+            podiums INTEGER NOT NULL DEFAULT 0,
+            points INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, user_id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_leaderboard_rank ON leaderboard (guild_id, points DESC, wins DESC)')
+
+def migration_9_schedules(conn):
+    """scheduled opens, closes and new questions, run by QuestionScheduler"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schedules (
+            guild_id INTEGER,
+            schedule_id INTEGER,
+            channel_id INTEGER,
+            action TEXT NOT NULL,
+            question_id INTEGER NOT NULL,
+            due_at REAL NOT NULL,
+            repeat TEXT,
+            question_text TEXT,
+            is_numeric INTEGER DEFAULT 1,
+            PRIMARY KEY (guild_id, schedule_id)
+        )
+    ''')
+
+def migration_10_question_serials(conn):
+    """a never-reused serial per question, which recorded results are keyed on"""
+    if 'serial' not in [col[1] for col in conn.execute('PRAGMA table_info(question)')]:
+        conn.execute('DROP TABLE IF EXISTS question_new')
+        conn.execute('''
+            CREATE TABLE question_new (
+                serial INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER,
+                question_id INTEGER,
+                question_text TEXT DEFAULT '',
+                is_open INTEGER DEFAULT 0,
+                is_numeric INTEGER DEFAULT 1,
+                UNIQUE (guild_id, question_id)
+            )
+        ''')
+        conn.execute('''
+            INSERT INTO question_new (guild_id, question_id, question_text, is_open, is_numeric)
+            SELECT guild_id, question_id, question_text, is_open, is_numeric FROM question ORDER BY guild_id, question_id
+        ''')
+        conn.execute('DROP TABLE question')
+        conn.execute('ALTER TABLE question_new RENAME TO question')
+    
+    if 'question_serial' not in [col[1] for col in conn.execute('PRAGMA table_info(round_history)')]:
+        conn.execute('DROP TABLE IF EXISTS round_history_new')
+        conn.execute('DROP TABLE IF EXISTS round_results_new')
+        conn.execute('''
+            CREATE TABLE round_history_new (
+                guild_id INTEGER,
+                question_serial INTEGER,
+                round INTEGER,
+                question_id INTEGER,
+                question_text TEXT,
+                answer TEXT,
+                guesses INTEGER,
+                recorded_at REAL,
+                PRIMARY KEY (guild_id, question_serial)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE round_results_new (
+                guild_id INTEGER,
+                question_serial INTEGER,
+                round INTEGER,
+                question_id INTEGER,
+                user_id INTEGER,
+                place INTEGER,
+                username TEXT,
+                guess TEXT,
+                points INTEGER,
+                PRIMARY KEY (guild_id, question_serial, user_id)
+            )
+        ''')
+        # Results recorded for a question that is still current keep its serial,
+        # so they can't be recorded twice; older ones get serials no question has
+        conn.execute('''
+            INSERT INTO round_history_new (guild_id, question_serial, round, question_id, question_text, answer, guesses, recorded_at)
+            SELECT h.guild_id, COALESCE(q.serial, -h.rowid), h.round, h.question_id, h.question_text, h.answer, h.guesses, h.recorded_at
+            FROM round_history h
+            LEFT JOIN guild_rounds r ON r.guild_id = h.guild_id
+            LEFT JOIN question q ON q.guild_id = h.guild_id AND q.question_id = h.question_id AND h.round = COALESCE(r.round, 1)
+        ''')
+        conn.execute('''
+            INSERT INTO round_results_new (guild_id, question_serial, round, question_id, user_id, place, username, guess, points)
+            SELECT r.guild_id, h.question_serial, r.round, r.question_id, r.user_id, r.place, r.username, r.guess, r.points
+            FROM round_results r
+            JOIN round_history_new h ON h.guild_id = r.guild_id AND h.round = r.round AND h.question_id = r.question_id
+        ''')
+        conn.execute('DROP TABLE round_history')
+        conn.execute('DROP TABLE round_results')
+        conn.execute('ALTER TABLE round_history_new RENAME TO round_history')
+        conn.execute('ALTER TABLE round_results_new RENAME TO round_results')
+
+MIGRATIONS = [
+    migration_1_base_tables,
+    migration_2_guess_num,
+    migration_3_guess_norm,
+    migration_4_thread_cleanup_guild,
+    migration_5_bot_state,
+    migration_6_question_ids,
+    migration_7_rounds,
+    migration_8_results,
+    migration_9_schedules,
+    migration_10_question_serials,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Function to check and update database schema
+def migrate_database(conn):
+    """Apply the migrations this database file has not had yet
+
+    PRAGMA user_version records the last one applied, so a current schema
+    costs a single pragma read. Each migration commits together with its
+    version bump, so an interrupted upgrade resumes where it stopped.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version > SCHEMA_VERSION:
+        storage_logger.warning(f'Database schema version {version} is newer than this bot ({SCHEMA_VERSION})')
+    if version >= SCHEMA_VERSION:
+        return
+    
+    storage_logger.info(f'Migrating database schema from version {version} to {SCHEMA_VERSION}...')
+    if not conn.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchone():
+        # Only takes effect before the first table is created; older files
+        # are switched over offline with --vacuum
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        storage_logger.info(f'Applying migration {number}: {migration.__doc__}')
+        migration(conn)
+        conn.execute(f'PRAGMA user_version = {number}')
+        conn.commit()
+    storage_logger.info('Database schema migration complete.')
+
+def normalize_answer(text):
+    """Casefold, strip accents and collapse whitespace so equivalent answers compare equal"""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.casefold().split())
+
+# Numeric guesses are plain ASCII digits: str.isdigit() also passes characters
+# like '²' that int() rejects
+WHOLE_NUMBER_RE = re.compile(r'[0-9]+')
+TOO_LARGE_MESSAGE = f"❌ That number is too large. Guesses can be at most {2**63 - 1:,}. Please use `/guess` again."
+
+def parse_guess_num(guess):
+    """Return the guess as an integer SQLite can store, or None if it isn't one"""
+    try:
+        num = int(guess)
+    except (TypeError, ValueError):
+        return None
+    if not -2**63 <= num < 2**63:
+        return None
+    return num
+
+# A guild's questions all fit in one /guess select menu and autocomplete list
+MAX_QUESTIONS_PER_GUILD = 25
+
+@dataclass
+class QuestionState:
+    question_text: str = ''
+    is_open: bool = False
+    is_numeric: bool = True
+    # Unique to this question within its database file; a number can be reused, a serial never is
+    serial: int = None
+
+class QuestionCache:
+    """In-memory copy of the question table: each guild's questions by question_id.
+
+    Loaded once at startup and updated write-through by the admin commands,
+    so read-only paths like /guess never touch the database. The list of
+    each guild's open questions is cached too, for /guess and its
+    autocomplete, along with each guild's current round from guild_rounds.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._states = {}
+        self._open = {}
+        self._rounds = {}
+
+    async def load(self, partition):
+        where, params = partition.where()
+        rows = await self.db.fetchall(
+            f'SELECT guild_id, question_id, question_text, is_open, is_numeric, serial FROM question WHERE {where} ORDER BY guild_id, question_id',
+            params
+        )
+        self._states = {}
+        self._open = {}
+        for guild_id, question_id, question_text, is_open, is_numeric, serial in rows:
+            self._states.setdefault(guild_id, {})[question_id] = QuestionState(question_text or '', bool(is_open), bool(is_numeric), serial)
+        self._rounds = dict(await self.db.fetchall(f'SELECT guild_id, round FROM guild_rounds WHERE {where}', params))
+        storage_logger.info(f'Loaded {len(rows)} question(s) for {len(self._states)} guild(s)')
+
+    def get(self, guild_id, question_id):
+        """Return a question's QuestionState, or None if it doesn't exist"""
+        return self._states.get(guild_id, {}).get(question_id)
+
+    def current_round(self, guild_id):
+        """Return the guild's round number; only guesses from this round count"""
+        return self._rounds.get(guild_id, 1)
+
+    def questions(self, guild_id):
+        """Return the guild's {question_id: QuestionState}, in question_id order"""
+        return self._states.get(guild_id, {})
+
+    def open_questions(self, guild_id):
+        """Return [(question_id, QuestionState)] for the guild's open questions"""
+        open_questions = self._open.get(guild_id)
+        if open_questions is None:
+            open_questions = self._open[guild_id] = [item for item in self.questions(guild_id).items() if item[1].is_open]
+        return open_questions
+
+    async def set_question(self, guild_id, question_id, question_text, is_numeric):
+        """Create or replace a question; it starts out closed, with a new serial"""
+        serial = await self.db.for_guild(guild_id).run(write_question, guild_id, question_id, question_text, is_numeric)
+        guild_questions = self._states.setdefault(guild_id, {})
+        guild_questions[question_id] = QuestionState(question_text, False, bool(is_numeric), serial)
+        self._states[guild_id] = dict(sorted(guild_questions.items()))
+        self._open.pop(guild_id, None)
+
+    async def add_question(self, guild_id, question_text, is_numeric):
+        """Create a question with the next free number and return that number"""
+        question_id = max(self.questions(guild_id), default=0) + 1
+        await self.set_question(guild_id, question_id, question_text, is_numeric)
+        return question_id
+
+    async def set_open(self, guild_id, question_id, is_open):
+        await self.db.for_guild(guild_id).execute('UPDATE question SET is_open = ? WHERE guild_id = ? AND question_id = ?', 
+                                                  (1 if is_open else 0, guild_id, question_id))
+        state = self.get(guild_id, question_id)
+        if state:
+            state.is_open = bool(is_open)
+        self._open.pop(guild_id, None)
+
+    def replace_question(self, guild_id, question_id, state):
+        """Swap in one question's QuestionState after it was written by QuestionScheduler"""
+        guild_questions = self._states.setdefault(guild_id, {})
+        guild_questions[question_id] = state
+        self._states[guild_id] = dict(sorted(guild_questions.items()))
+        self._open.pop(guild_id, None)
+
+    def replace_guild(self, guild_id, game_round, rows):
+        """Swap in a guild's round and (question_id, question_text, is_open, is_numeric, serial) rows after a restore"""
+        self._rounds[guild_id] = game_round
+        self._states[guild_id] = {
+            question_id: QuestionState(question_text or '', bool(is_open), bool(is_numeric), serial)
+            for question_id, question_text, is_open, is_numeric, serial in sorted(rows)
+        }
+        self._open.pop(guild_id, None)
+
+    async def remove(self, guild_id, question_id):
+        """Delete one question and its guesses"""
+        await self.db.for_guild(guild_id).run(remove_question_rows, guild_id, self.current_round(guild_id), question_id)
+        self._states.get(guild_id, {}).pop(question_id, None)
+        self._open.pop(guild_id, None)
+
+    async def reset(self, guild_id):
+        """Delete all of the guild's questions and start its next round, returning the new round number"""
+        game_round = await self.db.for_guild(guild_id).run(reset_guild, guild_id)
+        self._rounds[guild_id] = game_round
+        self._states.pop(guild_id, None)
+        self._open.pop(guild_id, None)
+        return game_round
+
+# How /guess collects answers: a pop-up form, or the original private thread
+GUESS_MODES = ('modal', 'thread')
+DEFAULT_GUESS_MODE = 'modal'
+
+class GuildSettings:
+    """Per-guild bot options, cached in memory and written through to guild_settings"""
+
+    def __init__(self, db):
+        self.db = db
+        self._guess_modes = {}
+
+    async def load(self, partition):
+        where, params = partition.where()
+        rows = await self.db.fetchall(f'SELECT guild_id, guess_mode FROM guild_settings WHERE {where}', params)
+        self._guess_modes = {guild_id: mode for guild_id, mode in rows if mode in GUESS_MODES}
+
+    def guess_mode(self, guild_id):
+        return self._guess_modes.get(guild_id, DEFAULT_GUESS_MODE)
+
+    async def set_guess_mode(self, guild_id, mode):
+        await self.db.for_guild(guild_id).execute('INSERT OR REPLACE INTO guild_settings (guild_id, guess_mode) VALUES (?, ?)', (guild_id, mode))
+        self._guess_modes[guild_id] = mode
+
+# Group-commit limits for guess writes: a batch is committed once it holds
+# GUESS_BATCH_MAX_ROWS rows or GUESS_BATCH_MAX_DELAY seconds after its first row
+GUESS_BATCH_MAX_ROWS = 500
+GUESS_BATCH_MAX_DELAY = 0.05
+
+def write_guesses(conn, rows):
+    """Upsert a batch of guesses in a single transaction (runs on the database thread)
+
+    Returns one (guild_id, round, question_id, old, new) change per row,
+    where old and new are the user's previous and new (guess_num,
+    guess_norm) pair and old is None for a user's first guess on the
+    question, so in-memory indexes can retract what REPLACE overwrote.
+    """
+    changes = []
+    with conn:
+        for guild_id, game_round, question_id, user_id, username, guess, guess_num, guess_norm in rows:
+            old = conn.execute('SELECT guess_num, guess_norm FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? AND user_id = ?', 
+                               (guild_id, game_round, question_id, user_id)).fetchone()
+            conn.execute('REPLACE INTO guesses (guild_id, round, question_id, user_id, username, guess, guess_num, guess_norm) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', 
+                         (guild_id, game_round, question_id, user_id, username, guess, guess_num, guess_norm))
+            changes.append((guild_id, game_round, question_id, old, (guess_num, guess_norm)))
+    return changes
+
+class GuessWriter:
+    """Write-behind queue that coalesces guess upserts into group commits.
+
+    ``submit()`` only returns once the transaction containing the guess has
+    committed, so callers can confirm a guess as soon as it resolves while a
+    burst of submissions costs one commit per batch instead of one per guess.
+    Guesses are batched per database partition, and each partition commits
+    on its own thread.
+
+    Listeners added with ``add_listener()`` are called on the event loop with
+    ``(part, seq, changes)`` after every commit. ``seq`` counts the commits of
+    partition ``part`` and is only advanced on that partition's database
+    thread, so a snapshot read there can record which batches it already
+    includes.
+    """
+
+    def __init__(self, db, max_rows=GUESS_BATCH_MAX_ROWS, max_delay=GUESS_BATCH_MAX_DELAY):
+        self.db = db
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._pending = {}
+        self._timers = {}
+        self._flushes = set()
+        self._listeners = []
+        self.seqs = defaultdict(int)
+        self.batches_committed = 0
+        self.rows_committed = 0
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    @property
+    def queued(self):
+        return sum(len(batch) for batch in self._pending.values())
+
+    def _write(self, conn, part, rows):
+        changes = write_guesses(conn, rows)
+        self.seqs[part] += 1
+        return self.seqs[part], changes
+
+    async def submit(self, guild_id, game_round, question_id, user_id, username, guess):
+        """Queue a guess and wait until its batch is durable"""
+        future = asyncio.get_running_loop().create_future()
+        row = (guild_id, game_round, question_id, user_id, username, guess, parse_guess_num(guess), normalize_answer(guess))
+        part = self.db.index(guild_id)
+        pending = self._pending.setdefault(part, [])
+        pending.append((row, future))
+        if len(pending) >= self.max_rows:
+            self._start_flush(part)
+        elif part not in self._timers:
+            self._timers[part] = asyncio.get_running_loop().call_later(self.max_delay, self._start_flush, part)
+        await future
+
+    def _start_flush(self, part):
+        timer = self._timers.pop(part, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(part, None)
+        if not batch:
+            return
+        task = asyncio.create_task(self._flush(part, batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, part, batch):
+        try:
+            seq, changes = await self.db.partitions[part].run(self._write, part, [row for row, _ in batch])
+        except Exception as e:
+            storage_logger.error(f'Failed to commit batch of {len(batch)} guess(es): {e}')
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches_committed += 1
+        self.rows_committed += len(batch)
+        for listener in self._listeners:
+            try:
+                listener(part, seq, changes)
+            except Exception as e:
+                storage_logger.error(f'Guess listener {listener} failed: {e}')
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def drain(self, guild_id):
+        """Commit the guesses queued for the guild's partition now and wait for every in-flight batch"""
+        self._start_flush(self.db.index(guild_id))
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def close(self):
+        """Commit anything still queued and wait for in-flight batches"""
+        for part in list(self._pending):
+            self._start_flush(part)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+def answer_trigrams(norm):
+    padded = f'  {norm} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a, b):
+    """Levenshtein distance, compared on at most the first 100 characters"""
+    a, b = a[:100], b[:100]
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+class AnswerIndex:
+    """Distinct normalized answers for one guild, with counts and a trigram index"""
+
+    def __init__(self, seq, game_round):
+        self.seq = seq
+        self.round = game_round
+        self.counts = {}
+        self.trigrams = defaultdict(set)
+
+    def add(self, norm, count=1):
+        if norm not in self.counts:
+            self.counts[norm] = 0
+            for trigram in answer_trigrams(norm):
+                self.trigrams[trigram].add(norm)
+        self.counts[norm] += count
+
+    def remove(self, norm):
+        if norm not in self.counts:
+            return
+        self.counts[norm] -= 1
+        if self.counts[norm] <= 0:
+            del self.counts[norm]
+            for trigram in answer_trigrams(norm):
+                postings = self.trigrams.get(trigram)
+                if postings:
+                    postings.discard(norm)
+                    if not postings:
+                        del self.trigrams[trigram]
+
+    def rank(self, norm, limit):
+        """Return up to ``limit`` (answer, count, similarity) groups closest to ``norm``
+
+        Candidates are the answers sharing a trigram with ``norm``. The best
+        ones by trigram overlap are then ordered exact match first, then by
+        edit distance, so only a handful of edit distances are computed.
+        """
+        wanted = answer_trigrams(norm)
+        shared = defaultdict(int)
+        for trigram in wanted:
+            for candidate in self.trigrams.get(trigram, ()):
+                shared[candidate] += 1
+        
+        def overlap(candidate):
+            common = shared[candidate]
+            return common / (len(wanted) + len(answer_trigrams(candidate)) - common)
+        
+        shortlist = sorted(shared, key=overlap, reverse=True)[:limit * 3]
+        scored = []
+        for candidate in shortlist:
+            distance = edit_distance(norm, candidate)
+            similarity = 1 - distance / max(len(norm[:100]), len(candidate[:100]), 1)
+            scored.append((candidate != norm, distance, -overlap(candidate), -self.counts[candidate], candidate, similarity))
+        scored.sort()
+        return [(candidate, self.counts[candidate], similarity) for *_, candidate, similarity in scored[:limit]]
+
+# Most questions whose answer index is kept in memory at once, across all guilds
+ANSWER_INDEX_MAX_QUESTIONS = 256
+
+class AnswerMatcher:
+    """Per-question answer indexes for matching text answers in find_closest.
+
+    An index is built on first use from idx_guesses_round_norm and then
+    kept current from GuessWriter's change feed. Least recently used
+    questions are evicted once ANSWER_INDEX_MAX_QUESTIONS are loaded, and
+    an index left over from an earlier round is rebuilt.
+    """
+
+    def __init__(self, db, writer, questions):
+        self.db = db
+        self.writer = writer
+        self.questions = questions
+        self._indexes = OrderedDict()
+        writer.add_listener(self.apply)
+
+    def _snapshot(self, conn, guild_id, game_round, question_id):
+        rows = conn.execute(
+            'SELECT guess_norm, COUNT(*) FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? GROUP BY guess_norm',
+            (guild_id, game_round, question_id)
+        ).fetchall()
+        return self.writer.seqs[self.db.index(guild_id)], rows
+
+    async def get(self, guild_id, question_id):
+        key = (guild_id, question_id)
+        game_round = self.questions.current_round(guild_id)
+        index = self._indexes.get(key)
+        if index is None or index.round != game_round:
+            seq, rows = await self.db.for_guild(guild_id).run(self._snapshot, guild_id, game_round, question_id)
+            index = AnswerIndex(seq, game_round)
+            for norm, count in rows:
+                if norm is not None:
+                    index.add(norm, count)
+            self._indexes[key] = index
+            while len(self._indexes) > ANSWER_INDEX_MAX_QUESTIONS:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(key)
+        return index
+
+    def apply(self, part, seq, changes):
+        # A guild's rows live in one partition, so its index seq is comparable with that partition's
+        for guild_id, game_round, question_id, old, new in changes:
+            index = self._indexes.get((guild_id, question_id))
+            # Skip questions not loaded, other rounds, and batches the snapshot already contains
+            if index is None or game_round != index.round or seq <= index.seq:
+                continue
+            if old is not None:
+                index.remove(old[1])
+            index.add(new[1])
+
+    def forget(self, guild_id, question_id):
+        """Drop a question's index after its guesses are deleted outside GuessWriter"""
+        self._indexes.pop((guild_id, question_id), None)
+
+class FrequencyMap:
+    """Value counts with O(1) updates, bucketed by count for quick mode/top-k lookups"""
+
+    def __init__(self):
+        self.counts = {}
+        self.buckets = defaultdict(set)
+        self.max_count = 0
+
+    def _move(self, value, old, new):
+        if old:
+            bucket = self.buckets[old]
+            bucket.discard(value)
+            if not bucket:
+                del self.buckets[old]
+        if new:
+            self.buckets[new].add(value)
+            self.counts[value] = new
+        else:
+            del self.counts[value]
+
+    def add(self, value):
+        count = self.counts.get(value, 0)
+        self._move(value, count, count + 1)
+        self.max_count = max(self.max_count, count + 1)
+
+    def remove(self, value):
+        count = self.counts.get(value, 0)
+        if not count:
+            return
+        self._move(value, count, count - 1)
+        if count == self.max_count and count not in self.buckets:
+            self.max_count = count - 1 if count - 1 in self.buckets else max(self.buckets, default=0)
+
+    def most_common(self, limit):
+        """Return up to ``limit`` (value, count) pairs, highest count first"""
+        if limit == 1 and self.max_count:
+            # The mode comes straight from the top bucket; ties go to the same value as below
+            return [(min(self.buckets[self.max_count], key=str), self.max_count)]
+        result = []
+        for count in sorted(self.buckets, reverse=True):
+            for value in sorted(self.buckets[count], key=str):
+                result.append((value, count))
+                if len(result) == limit:
+                    return result
+        return result
+
+def _size(node):
+    return node.size if node is not None else 0
+
+class _TreeNode:
+    __slots__ = ('value', 'count', 'size', 'priority', 'left', 'right')
+
+    def __init__(self, value):
+        self.value = value
+        self.count = 1
+        self.size = 1
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+
+def _rotate_right(node):
+    left = node.left
+    node.left = left.right
+    left.right = node
+    node.size = _size(node.left) + _size(node.right) + node.count
+    left.size = _size(left.left) + node.size + left.count
+    return left
+
+def _rotate_left(node):
+    right = node.right
+    node.right = right.left
+    right.left = node
+    node.size = _size(node.left) + _size(node.right) + node.count
+    right.size = node.size + _size(right.right) + right.count
+    return right
+
+class OrderStatisticTree:
+    """Multiset of comparable values with O(log n) add, remove and k-th smallest
+
+    A treap: a binary search tree whose nodes also carry a random priority
+    kept in heap order, which keeps the expected depth logarithmic whatever
+    order values arrive in. Equal values share a node with a count, and each
+    node records the size of its subtree so kth() can walk straight down.
+    """
+
+    def __init__(self):
+        self._root = None
+
+    def __len__(self):
+        return _size(self._root)
+
+    def __contains__(self, value):
+        node = self._root
+        while node is not None and node.value != value:
+            node = node.left if value < node.value else node.right
+        return node is not None
+
+    def add(self, value):
+        self._root = self._add(self._root, value)
+
+    def _add(self, node, value):
+        if node is None:
+            return _TreeNode(value)
+        node.size += 1
+        if value == node.value:
+            node.count += 1
+        elif value < node.value:
+            node.left = self._add(node.left, value)
+            if node.left.priority > node.priority:
+                return _rotate_right(node)
+        else:
+            node.right = self._add(node.right, value)
+            if node.right.priority > node.priority:
+                return _rotate_left(node)
+        return node
+
+    def remove(self, value):
+        """Remove one copy of ``value``; values not in the tree are ignored"""
+        if value in self:
+            self._root = self._remove(self._root, value)
+
+    def _remove(self, node, value):
+        if value < node.value:
+            node.left = self._remove(node.left, value)
+        elif value > node.value:
+            node.right = self._remove(node.right, value)
+        elif node.count > 1:
+            node.count -= 1
+        elif node.left is None:
+            return node.right
+        elif node.right is None:
+            return node.left
+        elif node.left.priority > node.right.priority:
+            # Rotate the node down towards a leaf, then remove it from there
+            node = _rotate_right(node)
+            node.right = self._remove(node.right, value)
+        else:
+            node = _rotate_left(node)
+            node.left = self._remove(node.left, value)
+        node.size -= 1
+        return node
+
+    def kth(self, k):
+        """Return the k-th smallest value, counting from 0"""
+        node = self._root
+        while node is not None:
+            left = _size(node.left)
+            if k < left:
+                node = node.left
+            elif k < left + node.count:
+                return node.value
+            else:
+                k -= left + node.count
+                node = node.right
+        raise IndexError(k)
+
+class GuildStats:
+    """Running aggregates over one guild's guesses
+
+    Numeric guesses are kept in an OrderStatisticTree, so each update and
+    each min, max or median read is O(log n) however many guesses a question
+    collects.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.num_sum = 0
+        self.num_sumsq = 0
+        self.nums = OrderStatisticTree()
+        self.answers = FrequencyMap()
+
+    def add(self, guess_num, guess_norm):
+        self.count += 1
+        self.answers.add(guess_norm)
+        if guess_num is not None:
+            self.num_sum += guess_num
+            self.num_sumsq += guess_num * guess_num
+            self.nums.add(guess_num)
+
+    def remove(self, guess_num, guess_norm):
+        self.count -= 1
+        self.answers.remove(guess_norm)
+        if guess_num is not None:
+            self.num_sum -= guess_num
+            self.num_sumsq -= guess_num * guess_num
+            self.nums.remove(guess_num)
+
+    @property
+    def mean(self):
+        return self.num_sum / len(self.nums) if self.nums else None
+
+    @property
+    def stdev(self):
+        if not self.nums:
+            return None
+        n = len(self.nums)
+        return max(self.num_sumsq * n - self.num_sum * self.num_sum, 0) ** 0.5 / n
+
+    @property
+    def median(self):
+        n = len(self.nums)
+        if not n:
+            return None
+        if n % 2:
+            return self.nums.kth(n // 2)
+        return (self.nums.kth(n // 2 - 1) + self.nums.kth(n // 2)) / 2
+
+    @property
+    def minimum(self):
+        return self.nums.kth(0) if self.nums else None
+
+    @property
+    def maximum(self):
+        return self.nums.kth(len(self.nums) - 1) if self.nums else None
+
+class StatsTracker:
+    """GuildStats for every question in each guild's current round, rebuilt
+    from the guesses table at startup and kept current from GuessWriter's
+    change feed"""
+
+    def __init__(self, db, writer, questions):
+        self.db = db
+        self.writer = writer
+        self.questions = questions
+        self.seqs = {}
+        self._questions = {}
+        self._guild_counts = {}
+        self._guild_seqs = {}
+        self.total_guesses = 0
+        self.active_guilds = 0
+        writer.add_listener(self.apply)
+
+    def _snapshot(self, conn, part, partition):
+        where, params = partition.where('g.guild_id')
+        rows = conn.execute(
+            'SELECT g.guild_id, g.question_id, g.guess_num, g.guess_norm FROM guesses g '
+            'LEFT JOIN guild_rounds r ON r.guild_id = g.guild_id '
+            f'WHERE {where} AND g.round = COALESCE(r.round, 1)',
+            params
+        ).fetchall()
+        return self.writer.seqs[part], rows
+
+    async def load(self, partition):
+        snapshots = await asyncio.gather(*(
+            database.run(self._snapshot, part, partition) for part, database in enumerate(self.db.partitions)
+        ))
+        self.seqs = {part: seq for part, (seq, _) in enumerate(snapshots)}
+        rows = [row for _, part_rows in snapshots for row in part_rows]
+        questions = defaultdict(GuildStats)
+        guild_counts = defaultdict(int)
+        for guild_id, question_id, guess_num, guess_norm in rows:
+            questions[guild_id, question_id].add(guess_num, guess_norm)
+            guild_counts[guild_id] += 1
+        self._questions = dict(questions)
+        self._guild_counts = dict(guild_counts)
+        self.total_guesses = len(rows)
+        self.active_guilds = len(self._guild_counts)
+        storage_logger.info(f'Built guess statistics for {len(self._questions)} question(s) in {self.active_guilds} guild(s) from {len(rows)} guess(es)')
+
+    def get(self, guild_id, question_id):
+        """Return the question's GuildStats, or None if it has no guesses"""
+        stats = self._questions.get((guild_id, question_id))
+        return stats if stats and stats.count else None
+
+    def count(self, guild_id, question_id):
+        stats = self._questions.get((guild_id, question_id))
+        return stats.count if stats else 0
+
+    def guild_count(self, guild_id):
+        """Guesses across all of the guild's questions"""
+        return self._guild_counts.get(guild_id, 0)
+
+    def apply(self, part, seq, changes):
+        if seq <= self.seqs.get(part, 0):
+            return
+        for guild_id, game_round, question_id, old, new in changes:
+            # Skip batches a guild's reload already contains, and guesses a reset left behind
+            if seq <= self._guild_seqs.get(guild_id, 0) or game_round != self.questions.current_round(guild_id):
+                continue
+            stats = self._questions.get((guild_id, question_id))
+            if stats is None:
+                stats = self._questions[guild_id, question_id] = GuildStats()
+            if old is not None:
+                stats.remove(*old)
+            else:
+                if guild_id not in self._guild_counts:
+                    self._guild_counts[guild_id] = 0
+                    self.active_guilds += 1
+                self._guild_counts[guild_id] += 1
+                self.total_guesses += 1
+            stats.add(*new)
+
+    def reload_guild(self, guild_id, seq, rows):
+        """Rebuild one guild's aggregates from its (question_id, guess_num, guess_norm) rows
+
+        ``seq`` is the partition's commit count when the rows were read, for
+        after the guild's guesses are replaced outside GuessWriter.
+        """
+        for question_id in [key[1] for key in self._questions if key[0] == guild_id]:
+            self.forget(guild_id, question_id)
+        for question_id, guess_num, guess_norm in rows:
+            self._questions.setdefault((guild_id, question_id), GuildStats()).add(guess_num, guess_norm)
+        if rows:
+            self._guild_counts[guild_id] = len(rows)
+            self.total_guesses += len(rows)
+            self.active_guilds += 1
+        self._guild_seqs[guild_id] = seq
+
+    def forget(self, guild_id, question_id):
+        """Drop a question's aggregates after its guesses are deleted outside GuessWriter"""
+        stats = self._questions.pop((guild_id, question_id), None)
+        if stats and stats.count:
+            self.total_guesses -= stats.count
+            self._guild_counts[guild_id] -= stats.count
+            if not self._guild_counts[guild_id]:
+                del self._guild_counts[guild_id]
+                self.active_guilds -= 1
+
+def matching_answers(conn, guild_id, game_round, question_id, norms, limit):
+    """Return {guess_norm: [(username, guess), ...]} with up to ``limit`` rows per answer"""
+    return {
+        norm: conn.execute('SELECT username, guess FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? AND guess_norm = ? LIMIT ?',
+                           (guild_id, game_round, question_id, norm, limit)).fetchall()
+        for norm in norms
+    }
+
+def closest_guesses(conn, guild_id, game_round, question_id, answer, limit):
+    """Return up to ``limit`` (username, guess, difference) tuples closest to ``answer``
+
+    Does two bounded seeks on idx_guesses_round_num, one below the answer
+    and one above, and merges them, so the cost scales with ``limit`` rather
+    than with the number of guesses on the question. Runs on the database thread.
+    """
+    below = conn.execute(
+        'SELECT username, guess_num FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? AND guess_num <= ? ORDER BY guess_num DESC LIMIT ?',
+        (guild_id, game_round, question_id, answer, limit)
+    ).fetchall()
+    above = conn.execute(
+        'SELECT username, guess_num FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? AND guess_num > ? ORDER BY guess_num ASC LIMIT ?',
+        (guild_id, game_round, question_id, answer, limit)
+    ).fetchall()
+    
+    # Both lists are already ordered by distance from the answer
+    merged = []
+    i = j = 0
+    while len(merged) < limit and (i < len(below) or j < len(above)):
+        if j >= len(above) or (i < len(below) and answer - below[i][1] <= above[j][1] - answer):
+            username, guess_num = below[i]
+            i += 1
+        else:
+            username, guess_num = above[j]
+            j += 1
+        merged.append((username, guess_num, abs(guess_num - answer)))
+    return merged
+
+# Leaderboard points for each place when a question's results are recorded.
+# Tied guesses share a place, a win is first place and a podium the top three
+PLACE_POINTS = (10, 6, 4, 2, 1)
+PODIUM_PLACES = 3
+LEADERBOARD_SIZE = 10
+
+def place_guesses(conn, guild_id, game_round, question_id, answer, is_numeric):
+    """Return [(place, user_id, username, guess)] for everyone who placed on a question
+
+    Numeric guesses are ranked by distance from the answer, with every guess
+    tied with the last place counted; the range is found with one bounded
+    seek on idx_guesses_round_num. Text answers only place when they match
+    the answer exactly, and all of those share first place.
+    """
+    if not is_numeric:
+        rows = conn.execute(
+            'SELECT user_id, username, guess FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? AND guess_norm = ? ORDER BY user_id',
+            (guild_id, game_round, question_id, normalize_answer(answer))
+        ).fetchall()
+        return [(1, user_id, username, guess) for user_id, username, guess in rows]
+    
+    nearest = closest_guesses(conn, guild_id, game_round, question_id, answer, len(PLACE_POINTS))
+    if not nearest:
+        return []
+    cutoff = nearest[-1][2]
+    rows = conn.execute(
+        'SELECT user_id, username, guess, guess_num FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? AND guess_num BETWEEN ? AND ?',
+        (guild_id, game_round, question_id, max(answer - cutoff, -2**63), min(answer + cutoff, 2**63 - 1))
+    ).fetchall()
+    rows.sort(key=lambda row: (abs(row[3] - answer), row[0]))
+    
+    placed = []
+    place = previous = None
+    for position, (user_id, username, guess, guess_num) in enumerate(rows, 1):
+        difference = abs(guess_num - answer)
+        if difference != previous:
+            place, previous = position, difference
+        if place > len(PLACE_POINTS):
+            break
+        placed.append((place, user_id, username, guess))
+    return placed
+
+def record_results(conn, guild_id, game_round, question_id, question_serial, question_text, answer, is_numeric, guesses):
+    """Archive a question's placings and add them to the guild's leaderboard in one transaction (runs on the database thread)
+
+    round_history and round_results are append-only and keyed on the
+    question's serial, so a question's results can be recorded once, even
+    if a later question reuses its number; returns None if they already were.
+    Otherwise returns the [(place, user_id, username, guess)] rows recorded.
+    The leaderboard is only ever adjusted here, by the placed users' rows,
+    so reading it never has to look at past rounds.
+    """
+    placed = place_guesses(conn, guild_id, game_round, question_id, answer, is_numeric)
+    with conn:
+        try:
+            conn.execute(
+                'INSERT INTO round_history (guild_id, question_serial, round, question_id, question_text, answer, guesses, recorded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (guild_id, question_serial, game_round, question_id, question_text, str(answer), guesses, time.time())
+            )
+        except sqlite3.IntegrityError:
+            return None
+        conn.executemany(
+            'INSERT INTO round_results (guild_id, question_serial, round, question_id, user_id, place, username, guess, points) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(guild_id, question_serial, game_round, question_id, user_id, place, username, guess, PLACE_POINTS[place - 1])
+             for place, user_id, username, guess in placed]
+        )
+        conn.executemany(
+            'INSERT INTO leaderboard (guild_id, user_id, username, wins, podiums, points) VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (guild_id, user_id) DO UPDATE SET username = excluded.username, wins = wins + excluded.wins, '
+            'podiums = podiums + excluded.podiums, points = points + excluded.points',
+            [(guild_id, user_id, username, int(place == 1), int(place <= PODIUM_PLACES), PLACE_POINTS[place - 1])
+             for place, user_id, username, guess in placed]
+        )
+    return placed
+
+def fetch_leaderboard(conn, guild_id, user_id, limit=LEADERBOARD_SIZE):
+    """Return the guild's top ``limit`` (user_id, username, wins, podiums, points) rows and the user's own row (runs on the database thread)
+
+    The top rows are read in order straight off idx_leaderboard_rank and the
+    user's row off the primary key, so the cost doesn't grow with the
+    number of rounds played or players ranked.
+    """
+    top = conn.execute(
+        'SELECT user_id, username, wins, podiums, points FROM leaderboard WHERE guild_id = ? ORDER BY points DESC, wins DESC LIMIT ?',
+        (guild_id, limit)
+    ).fetchall()
+    own = conn.execute(
+        'SELECT user_id, username, wins, podiums, points FROM leaderboard WHERE guild_id = ? AND user_id = ?', (guild_id, user_id)
+    ).fetchone()
+    return top, own
+
+class MessageRouter:
+    """Delivers thread messages to the session waiting on (channel_id, user_id).
+
+    bot.wait_for runs every pending check against every message the bot
+    sees; here each message costs one dict lookup no matter how many guess
+    or reset sessions are open. Timeouts are scheduled with call_later, so
+    they share the event loop's timer heap rather than one task per session.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+
+    @property
+    def pending(self):
+        """Number of sessions currently waiting for a message"""
+        return len(self._sessions)
+
+    def is_waiting(self, channel_id, user_id):
+        session = self._sessions.get((channel_id, user_id))
+        return session is not None and not session[0].done()
+
+    async def wait_for(self, channel_id, user_id, check, timeout):
+        """Wait for a message from user_id in channel_id that passes check
+
+        Raises asyncio.TimeoutError if none arrives within timeout seconds.
+        A newer session for the same channel and user ends an older one as
+        if it had timed out.
+        """
+        key = (channel_id, user_id)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        previous = self._sessions.get(key)
+        if previous and not previous[0].done():
+            previous[0].set_exception(asyncio.TimeoutError())
+        self._sessions[key] = (future, check)
+        timer = loop.call_later(timeout, self._expire, future)
+        try:
+            return await future
+        finally:
+            timer.cancel()
+            if self._sessions.get(key, (None,))[0] is future:
+                del self._sessions[key]
+
+    @staticmethod
+    def _expire(future):
+        if not future.done():
+            future.set_exception(asyncio.TimeoutError())
+
+    def dispatch(self, message):
+        session = self._sessions.get((message.channel.id, message.author.id))
+        if session is None:
+            return
+        future, check = session
+        if not future.done() and check(message):
+            future.set_result(message)
+
+# /guess admission limits: a user can start GUESS_USER_BURST guesses in a row,
+# then one every 1 / GUESS_USER_RATE seconds; a guild GUESS_GUILD_BURST, then
+# GUESS_GUILD_RATE per second. At most ADMISSION_MAX_BUCKETS of each are kept.
+GUESS_USER_RATE = 0.2
+GUESS_USER_BURST = 3
+GUESS_GUILD_RATE = 50
+GUESS_GUILD_BURST = 200
+ADMISSION_MAX_BUCKETS = 100_000
+
+class TokenBuckets:
+    """Token buckets keyed by id, kept in least-recently-used order.
+
+    A bucket left alone for ``burst / rate`` seconds has refilled, which is
+    the same as having no bucket, so idle buckets are dropped from the cold
+    end as new ones arrive. ``max_buckets`` caps memory if every bucket is
+    busy. Each call is O(1) amortized.
+    """
+
+    def __init__(self, rate, burst, max_buckets):
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self.idle = burst / rate
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key, now):
+        """Take a token for key, returning 0 if one was available or else the seconds until one will be"""
+        buckets = self._buckets
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if now - oldest[1] < self.idle:
+                break
+            buckets.popitem(last=False)
+        
+        tokens, updated = buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+        buckets[key] = (tokens - 1 if not wait else tokens, now)
+        if len(buckets) > self.max_buckets:
+            buckets.popitem(last=False)
+        return wait
+
+    def refund(self, key):
+        """Give back a token taken by the last take() for key"""
+        bucket = self._buckets.get(key)
+        if bucket:
+            self._buckets[key] = (min(self.burst, bucket[0] + 1), bucket[1])
+
+class GuessAdmission:
+    """Turns away /guess spam before it costs any database or Discord work.
+
+    Every /guess takes a token from the user's bucket and the guild's, and a
+    user can only have one private-thread guess in progress in each guild.
+    Everything lives in memory and each check is a few dict operations, so
+    a rejection can be answered straight away.
+    """
+
+    def __init__(self):
+        self.users = TokenBuckets(GUESS_USER_RATE, GUESS_USER_BURST, ADMISSION_MAX_BUCKETS)
+        self.guilds = TokenBuckets(GUESS_GUILD_RATE, GUESS_GUILD_BURST, ADMISSION_MAX_BUCKETS)
+        self._sessions = set()
+
+    def admit(self, guild_id, user_id):
+        """Return None if the guess may start, or (reason, seconds to wait) if not"""
+        if (guild_id, user_id) in self._sessions:
+            return self._reject('pending', 0)
+        now = time.monotonic()
+        wait = self.users.take(user_id, now)
+        if wait:
+            return self._reject('user', wait)
+        wait = self.guilds.take(guild_id, now)
+        if wait:
+            # The user shouldn't pay for a guess the guild turned away
+            self.users.refund(user_id)
+            return self._reject('guild', wait)
+        return None
+
+    @staticmethod
+    def _reject(reason, wait):
+        metrics.inc('guesser_guess_rejected_total', reason=reason)
+        return reason, wait
+
+    def start_session(self, guild_id, user_id):
+        """Mark a private-thread guess as in progress, returning False if the user already has one in the guild"""
+        if (guild_id, user_id) in self._sessions:
+            metrics.inc('guesser_guess_rejected_total', reason='pending')
+            return False
+        self._sessions.add((guild_id, user_id))
+        return True
+
+    def end_session(self, guild_id, user_id):
+        self._sessions.discard((guild_id, user_id))
+
+class ThreadJanitor:
+    """Deletes finished guess and reset threads from a persisted queue.
+
+    Handlers call ``schedule()`` and return right away. Due times are kept in
+    the thread_cleanup table, so threads still get deleted if the bot restarts
+    in the meantime, and a single background task works through them in due
+    order. Deletions are sent one at a time, leaving discord.py's per-route
+    rate limiting to pace the requests.
+    """
+
+    BATCH_SIZE = 50
+    RETRY_DELAY = 60
+
+    def __init__(self, db):
+        self.db = db
+        self.bot = None
+        self._due = {}
+        self._heap = []
+        self._wake = asyncio.Event()
+        self._task = None
+
+    async def start(self, bot, partition):
+        self.bot = bot
+        where, params = partition.where()
+        if partition.is_primary:
+            # Threads queued before guild_id was recorded
+            where = f'({where} OR guild_id IS NULL)'
+        rows = await self.db.main.fetchall(f'SELECT thread_id, delete_at FROM thread_cleanup WHERE {where}', params)
+        self._due = dict(rows)
+        self._heap = [(delete_at, thread_id) for thread_id, delete_at in rows]
+        heapq.heapify(self._heap)
+        overdue = sum(1 for delete_at, _ in self._heap if delete_at <= time.time())
+        if overdue:
+            thread_logger.info(f'Sweeping {overdue} overdue thread(s) left from a previous session')
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            # Let a batch in progress unwind before the database is closed
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def schedule(self, guild_id, thread_id, delay):
+        """Delete thread_id after delay seconds, replacing any earlier schedule"""
+        delete_at = time.time() + delay
+        # A retry passes guild_id=None and keeps the guild recorded on the first schedule
+        await self.db.main.execute(
+            'INSERT INTO thread_cleanup (thread_id, guild_id, delete_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (thread_id) DO UPDATE SET delete_at = excluded.delete_at',
+            (thread_id, guild_id, delete_at)
+        )
+        self._due[thread_id] = delete_at
+        heapq.heappush(self._heap, (delete_at, thread_id))
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            # Drop heap entries superseded by a later schedule() call
+            while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            
+            delay = self._heap[0][0] - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            batch = []
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now and len(batch) < self.BATCH_SIZE:
+                delete_at, thread_id = heapq.heappop(self._heap)
+                if self._due.get(thread_id) == delete_at:
+                    batch.append(thread_id)
+            
+            done = []
+            try:
+                for thread_id in batch:
+                    if await self._delete(thread_id):
+                        done.append(thread_id)
+                    else:
+                        await self.schedule(None, thread_id, self.RETRY_DELAY)
+                await self.db.main.executemany('DELETE FROM thread_cleanup WHERE thread_id = ?', [(thread_id,) for thread_id in done])
+            except Exception as e:
+                thread_logger.error(f'Thread cleanup failed, retrying in {self.RETRY_DELAY}s: {e}')
+                # Put the whole batch back; threads already deleted come back as NotFound
+                retry_at = time.time()
+                for thread_id in batch:
+                    self._due[thread_id] = retry_at
+                    heapq.heappush(self._heap, (retry_at, thread_id))
+                await asyncio.sleep(self.RETRY_DELAY)
+                continue
+            for thread_id in done:
+                del self._due[thread_id]
+
+    async def _delete(self, thread_id):
+        """Delete one thread, returning False if it should be retried later"""
+        try:
+            await self.bot.http.delete_channel(thread_id, reason='Guessing game thread cleanup')
+        except (discord.NotFound, discord.Forbidden):
+            pass  # Already gone, or we can no longer manage it
+        except discord.HTTPException as e:
+            thread_logger.warning(f'Failed to delete thread {thread_id}, will retry: {e}')
+            return False
+        except Exception as e:
+            thread_logger.error(f'Unexpected error deleting thread {thread_id}: {e}')
+            return False
+        return True
+
+# Actions /schedule can run, how far apart repeats are, and how many
+# schedules each guild can keep
+SCHEDULE_ACTIONS = ('open', 'close', 'set')
+SCHEDULE_REPEATS = {'daily': 86400, 'weekly': 7 * 86400}
+MAX_SCHEDULES_PER_GUILD = 25
+SCHEDULE_OFFSET_RE = re.compile(r'\+(\d+)([mhd])')
+SCHEDULE_OFFSET_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+
+def parse_schedule_time(text, now):
+    """Return the timestamp for a /schedule time, or None if it can't be read
+
+    Accepts an offset from now (``+30m``, ``+2h``, ``+1d``), ``HH:MM`` for
+    the next time the UTC clock shows it, or ``YYYY-MM-DD HH:MM`` in UTC.
+    """
+    text = text.strip()
+    offset = SCHEDULE_OFFSET_RE.fullmatch(text)
+    if offset:
+        return now + int(offset.group(1)) * SCHEDULE_OFFSET_UNITS[offset.group(2)]
+    try:
+        return datetime.strptime(text, '%Y-%m-%d %H:%M').replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        pass
+    try:
+        clock = datetime.strptime(text, '%H:%M')
+    except ValueError:
+        return None
+    today = datetime.fromtimestamp(now, timezone.utc).replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+    if today.timestamp() <= now:
+        today += timedelta(days=1)
+    return today.timestamp()
+
+@dataclass
+class Schedule:
+    guild_id: int
+    schedule_id: int
+    channel_id: int
+    action: str
+    question_id: int
+    due_at: float
+    repeat: str = None
+    question_text: str = None
+    is_numeric: bool = True
+
+def apply_schedule_changes(conn, question_rows, open_rows, advanced, finished):
+    """Write the question changes and schedule updates from one scheduler pass in a single transaction (runs on the database thread)
+
+    ``question_rows`` replace whole questions, for scheduled /set_question,
+    and the new questions' serials are returned in the same order.
+    ``open_rows`` only set is_open, so they keep any other change made to
+    the question after the pass read it.
+    """
+    with conn:
+        serials = [
+            conn.execute('INSERT OR REPLACE INTO question (guild_id, question_id, question_text, is_open, is_numeric) VALUES (?, ?, ?, ?, ?)',
+                         row).lastrowid
+            for row in question_rows
+        ]
+        conn.executemany('UPDATE question SET is_open = ? WHERE guild_id = ? AND question_id = ?', open_rows)
+        conn.executemany('UPDATE schedules SET due_at = ? WHERE guild_id = ? AND schedule_id = ?', advanced)
+        conn.executemany('DELETE FROM schedules WHERE guild_id = ? AND schedule_id = ?', finished)
+    return serials
+
+class QuestionScheduler:
+    """Opens, closes and sets questions at the times admins chose with /schedule.
+
+    Schedules are kept in the schedules table and, for the guilds this
+    process serves, in one min-heap of due times, so a single background
+    task sleeps until the next one is due however many guilds have
+    schedules. Everything due at once is applied as one batch: the events
+    are replayed in due order against the cached questions, only each
+    question's final state is written, and each partition's writes go in
+    one transaction. That is also how schedules missed while the bot was
+    offline are caught up at startup, with a repeating schedule run once
+    and moved to its next time rather than once per missed repeat.
+    """
+
+    RETRY_DELAY = 60
+
+    def __init__(self, db, questions, stats):
+        self.db = db
+        self.bot = None
+        self.questions = questions
+        self.stats = stats
+        self._schedules = {}
+        self._heap = []
+        self._wake = asyncio.Event()
+        self._task = None
+
+    async def start(self, bot, partition):
+        self.bot = bot
+        where, params = partition.where()
+        rows = await self.db.fetchall(
+            'SELECT guild_id, schedule_id, channel_id, action, question_id, due_at, repeat, question_text, is_numeric '
+            f'FROM schedules WHERE {where}',
+            params
+        )
+        self._schedules = {}
+        for row in rows:
+            schedule = Schedule(*row[:-1], is_numeric=bool(row[-1]))
+            self._schedules[schedule.guild_id, schedule.schedule_id] = schedule
+        self._heap = [(schedule.due_at, key) for key, schedule in self._schedules.items()]
+        heapq.heapify(self._heap)
+        overdue = sum(1 for due_at, _ in self._heap if due_at <= time.time())
+        if overdue:
+            schedule_logger.info(f'Catching up on {overdue} schedule(s) that came due while the bot was offline')
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def guild_schedules(self, guild_id):
+        """Return the guild's schedules, soonest first"""
+        return sorted((schedule for (g, _), schedule in self._schedules.items() if g == guild_id), key=lambda schedule: schedule.due_at)
+
+    async def add(self, guild_id, channel_id, action, question_id, due_at, repeat=None, question_text=None, is_numeric=True):
+        """Persist a new schedule and return it"""
+        schedule_id = max((s for g, s in self._schedules if g == guild_id), default=0) + 1
+        schedule = Schedule(guild_id, schedule_id, channel_id, action, question_id, due_at, repeat, question_text, is_numeric)
+        await self.db.for_guild(guild_id).execute(
+            'INSERT INTO schedules (guild_id, schedule_id, channel_id, action, question_id, due_at, repeat, question_text, is_numeric) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (guild_id, schedule_id, channel_id, action, question_id, due_at, repeat, question_text, 1 if is_numeric else 0)
+        )
+        self._schedules[guild_id, schedule_id] = schedule
+        heapq.heappush(self._heap, (due_at, (guild_id, schedule_id)))
+        self._wake.set()
+        return schedule
+
+    async def cancel(self, guild_id, schedule_id):
+        """Delete a schedule, returning False if it doesn't exist"""
+        if self._schedules.pop((guild_id, schedule_id), None) is None:
+            return False
+        await self.db.for_guild(guild_id).execute('DELETE FROM schedules WHERE guild_id = ? AND schedule_id = ?', (guild_id, schedule_id))
+        return True
+
+    async def _run(self):
+        while True:
+            # Drop heap entries for cancelled or rescheduled schedules
+            while self._heap and self._is_stale(*self._heap[0]):
+                heapq.heappop(self._heap)
+            
+            delay = self._heap[0][0] - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due_at, key = heapq.heappop(self._heap)
+                if not self._is_stale(due_at, key):
+                    due.append(self._schedules[key])
+            try:
+                await self._apply(due, now)
+            except Exception as e:
+                schedule_logger.error(f'Failed to run {len(due)} schedule(s), retrying in {self.RETRY_DELAY}s: {e}')
+                for schedule in due:
+                    heapq.heappush(self._heap, (schedule.due_at, (schedule.guild_id, schedule.schedule_id)))
+                await asyncio.sleep(self.RETRY_DELAY)
+
+    def _is_stale(self, due_at, key):
+        schedule = self._schedules.get(key)
+        return schedule is None or schedule.due_at != due_at
+
+    async def _apply(self, due, now):
+        """Run a batch of due schedules, writing each partition's changes in one transaction
+
+        Opens and closes only write is_open, and once the batch is written
+        they are applied to each question as the cache holds it then, so an
+        admin command that lands while the batch is being written is kept.
+        """
+        replaced = {}
+        opened = {}
+        announced = {}
+        advanced = defaultdict(list)
+        finished = defaultdict(list)
+        next_due = {}
+        for schedule in sorted(due, key=lambda schedule: schedule.due_at):
+            guild_id, question_id = key = (schedule.guild_id, schedule.question_id)
+            part = self.db.index(guild_id)
+            if schedule.action == 'set':
+                replaced[key] = QuestionState(schedule.question_text, False, schedule.is_numeric)
+                opened.pop(key, None)
+                announced[key] = schedule
+            elif key in replaced:
+                replaced[key].is_open = schedule.action == 'open'
+                announced[key] = schedule
+            elif self.questions.get(guild_id, question_id) is None:
+                schedule_logger.info(f'Skipping schedule {schedule.schedule_id} in guild {guild_id}: question #{question_id} no longer exists')
+            else:
+                opened[key] = schedule.action == 'open'
+                announced[key] = schedule
+            
+            if schedule.repeat:
+                period = SCHEDULE_REPEATS[schedule.repeat]
+                # Missed repeats are skipped, not replayed
+                due_at = schedule.due_at + period * (math.floor((now - schedule.due_at) / period) + 1)
+                next_due[guild_id, schedule.schedule_id] = due_at
+                advanced[part].append((due_at, guild_id, schedule.schedule_id))
+            else:
+                finished[part].append((guild_id, schedule.schedule_id))
+        
+        replaced_keys = defaultdict(list)
+        question_rows = defaultdict(list)
+        open_rows = defaultdict(list)
+        for (guild_id, question_id), state in replaced.items():
+            part = self.db.index(guild_id)
+            replaced_keys[part].append((guild_id, question_id))
+            question_rows[part].append((guild_id, question_id, state.question_text, 1 if state.is_open else 0, 1 if state.is_numeric else 0))
+        for (guild_id, question_id), is_open in opened.items():
+            open_rows[self.db.index(guild_id)].append((1 if is_open else 0, guild_id, question_id))
+        parts = list(set(question_rows) | set(open_rows) | set(advanced) | set(finished))
+        serials = await asyncio.gather(*(
+            self.db.partitions[part].run(apply_schedule_changes, question_rows[part], open_rows[part], advanced[part], finished[part])
+            for part in parts
+        ))
+        for part, part_serials in zip(parts, serials):
+            for key, serial in zip(replaced_keys[part], part_serials):
+                replaced[key].serial = serial
+        
+        states = dict(replaced)
+        for key, is_open in opened.items():
+            state = self.questions.get(*key)
+            # Removed by an admin while the batch was being written
+            if state is not None:
+                states[key] = QuestionState(state.question_text, is_open, state.is_numeric, state.serial)
+        for key, state in states.items():
+            self.questions.replace_question(*key, state)
+        for part_finished in finished.values():
+            for key in part_finished:
+                self._schedules.pop(key, None)
+        for key, due_at in next_due.items():
+            schedule = self._schedules.get(key)
+            if schedule:
+                schedule.due_at = due_at
+                heapq.heappush(self._heap, (due_at, key))
+        schedule_logger.info(f'Ran {len(due)} schedule(s), updating {len(states)} question(s)')
+        
+        for (guild_id, question_id), schedule in announced.items():
+            if (guild_id, question_id) in states:
+                await self._announce(schedule, question_id, states[guild_id, question_id])
+
+    async def _announce(self, schedule, question_id, state):
+        """Post the question's new state where the schedule was made, as the matching command would"""
+        if state.is_open:
+            embed = discord.Embed(
+                title="🎯 Guessing is Now OPEN!",
+                description=f"**Question #{question_id}:** {state.question_text}\n\nUse `/guess` to submit your answer!",
+                color=discord.Color.green()
+            )
+        elif schedule.action == 'close':
+            embed = discord.Embed(
+                title="🔒 Guessing is Now CLOSED!",
+                description=f"No more guesses will be accepted on question #{question_id}.\n\n"
+                            f"**Total guesses received:** {self.stats.count(schedule.guild_id, question_id)}",
+                color=discord.Color.red()
+            )
+        else:
+            embed = discord.Embed(
+                title="📝 New Question",
+                description=f"**Question #{question_id}:** {state.question_text}\n\nGuessing opens when an admin opens it.",
+                color=discord.Color.blue()
+            )
+        try:
+            await self.bot.get_partial_messageable(schedule.channel_id).send(embed=embed)
+        except discord.HTTPException as e:
+            schedule_logger.warning(f'Could not announce schedule {schedule.schedule_id} in guild {schedule.guild_id}: {e}')
+
+GUESS_PAGE_SIZE = 20
+
+def fetch_guess_page(conn, guild_id, game_round, question_id, after=None, before=None, offset=None):
+    """Fetch one page of (user_id, username, guess) rows for a question, ordered by user_id
+
+    Pages are keyset-paginated on the (guild_id, round, question_id, user_id)
+    primary key: ``after`` and ``before`` are the last and first user_id of
+    the page being left, so every page costs the same however deep into the
+    list it is. ``offset`` jumps straight to a page. Forward fetches return
+    one extra row when another page follows. Runs on the database thread.
+    """
+    if before is not None:
+        rows = conn.execute(
+            'SELECT user_id, username, guess FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? AND user_id < ? ORDER BY user_id DESC LIMIT ?',
+            (guild_id, game_round, question_id, before, GUESS_PAGE_SIZE)
+        ).fetchall()
+        return rows[::-1]
+    
+    if offset:
+        # Find the page's first user on the primary key index, then seek from there
+        anchor = conn.execute(
+            'SELECT user_id FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? ORDER BY user_id LIMIT 1 OFFSET ?',
+            (guild_id, game_round, question_id, offset)
+        ).fetchone()
+        if not anchor:
+            return []
+        after = anchor[0] - 1
+    
+    if after is None:
+        return conn.execute(
+            'SELECT user_id, username, guess FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? ORDER BY user_id LIMIT ?',
+            (guild_id, game_round, question_id, GUESS_PAGE_SIZE + 1)
+        ).fetchall()
+    return conn.execute(
+        'SELECT user_id, username, guess FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? AND user_id > ? ORDER BY user_id LIMIT ?',
+        (guild_id, game_round, question_id, after, GUESS_PAGE_SIZE + 1)
+    ).fetchall()
+
+# /export_guesses reads this many rows at a time, and keeps up to
+# EXPORT_SPOOL_BYTES of compressed output in memory before spilling to disk
+EXPORT_BATCH_SIZE = 1000
+EXPORT_SPOOL_BYTES = 1024 * 1024
+EXPORT_COLUMNS = ('user_id', 'username', 'guess')
+
+def iter_guess_batches(conn, guild_id, game_round, question_id, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a question's (user_id, username, guess) rows in batches of ``batch_size``
+
+    Each batch is a seek on the primary key from the last user_id of the
+    one before, so only one batch is ever held in memory.
+    """
+    after = None
+    while True:
+        if after is None:
+            rows = conn.execute(
+                'SELECT user_id, username, guess FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? ORDER BY user_id LIMIT ?',
+                (guild_id, game_round, question_id, batch_size)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                'SELECT user_id, username, guess FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ? AND user_id > ? ORDER BY user_id LIMIT ?',
+                (guild_id, game_round, question_id, after, batch_size)
+            ).fetchall()
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        after = rows[-1][0]
+
+def export_guesses_file(path, guild_id, game_round, question_id, file_format):
+    """Write a question's guesses to a gzip-compressed CSV or JSON lines file (blocking; run in a worker thread)
+
+    Reads through a connection of its own, so a long export never holds up
+    the database thread that commits guesses; the read transaction gives it
+    one consistent snapshot while WAL lets writes carry on. Returns the
+    rewound file and the number of rows written.
+    """
+    start = time.perf_counter()
+    export = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    count = 0
+    try:
+        conn.execute('BEGIN')
+        with gzip.GzipFile(fileobj=export, mode='wb') as compressed, \
+                io.TextIOWrapper(compressed, encoding='utf-8', newline='') as text:
+            if file_format == 'csv':
+                writer = csv.writer(text)
+                writer.writerow(EXPORT_COLUMNS)
+                for rows in iter_guess_batches(conn, guild_id, game_round, question_id):
+                    writer.writerows(rows)
+                    count += len(rows)
+            else:
+                for rows in iter_guess_batches(conn, guild_id, game_round, question_id):
+                    text.writelines(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n' for row in rows)
+                    count += len(rows)
+    except BaseException:
+        export.close()
+        raise
+    finally:
+        conn.close()
+        metrics.observe('guesser_sql_seconds', time.perf_counter() - start, statement='export_guesses_file')
+    export.seek(0)
+    return export, count
+
+SNAPSHOT_PREFIX = 'snapshot-'
+SNAPSHOT_TIME_FORMAT = '%Y%m%d-%H%M%S'
+
+class BackupManager:
+    """Scheduled online snapshots of every database file, and per-guild restore.
+
+    A snapshot is a directory under BACKUP_DIR holding a copy of each
+    partition file, written under a ``.partial`` name and renamed once every
+    file is complete. With BACKUP_INTERVAL_HOURS set, the primary process
+    takes one whenever the newest snapshot is that old (including right
+    after a restart) and keeps the newest BACKUP_KEEP. Restores copy one
+    guild's question and guesses rows back, so other guilds are untouched.
+    """
+
+    RETRY_DELAY = 300
+
+    def __init__(self, db, writer, questions, answers, stats, compactor):
+        self.db = db
+        self.writer = writer
+        self.questions = questions
+        self.answers = answers
+        self.stats = stats
+        self.compactor = compactor
+        self.directory = 'backups'
+        self.interval = None
+        self.keep = 7
+        self.snapshots = []
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def _scan(self, cleanup):
+        """List finished snapshots, newest first, optionally removing interrupted ones (blocking)"""
+        os.makedirs(self.directory, exist_ok=True)
+        names = []
+        for name in os.listdir(self.directory):
+            if not name.startswith(SNAPSHOT_PREFIX):
+                continue
+            if name.endswith('.partial'):
+                if cleanup:
+                    shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            else:
+                names.append(name)
+        return sorted(names, reverse=True)
+
+    async def start(self, partition):
+        self.directory = os.getenv('BACKUP_DIR', 'backups')
+        self.keep = max(1, int(os.getenv('BACKUP_KEEP') or 7))
+        hours = float(os.getenv('BACKUP_INTERVAL_HOURS') or 0)
+        self.interval = hours * 3600 if hours > 0 else None
+        # Snapshots cover whole files, so only one shard-cluster worker schedules them
+        self.snapshots = await asyncio.to_thread(self._scan, partition.is_primary)
+        if self.interval and partition.is_primary:
+            storage_logger.info(f'Taking a backup snapshot every {hours:g} hour(s) into {self.directory}, keeping {self.keep}')
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def taken_at(self, name):
+        stamp = datetime.strptime(name[len(SNAPSHOT_PREFIX):], SNAPSHOT_TIME_FORMAT)
+        return stamp.replace(tzinfo=timezone.utc).timestamp()
+
+    async def _run(self):
+        while True:
+            due = self.taken_at(self.snapshots[0]) + self.interval if self.snapshots else 0
+            delay = due - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            try:
+                await self.snapshot()
+            except Exception as e:
+                storage_logger.error(f'Scheduled backup failed, retrying in {self.RETRY_DELAY}s: {e}')
+                await asyncio.sleep(self.RETRY_DELAY)
+
+    async def snapshot(self):
+        """Copy every partition into a new snapshot, prune old ones and return the new snapshot's name"""
+        async with self._lock:
+            start = time.perf_counter()
+            name = SNAPSHOT_PREFIX + datetime.now(timezone.utc).strftime(SNAPSHOT_TIME_FORMAT)
+            final = os.path.join(self.directory, name)
+            partial = final + '.partial'
+            if name in self.snapshots:
+                raise FileExistsError(f'Snapshot {name} already exists')
+            await asyncio.to_thread(os.makedirs, partial, exist_ok=True)
+            for database in self.db.partitions:
+                await database.backup(os.path.join(partial, os.path.basename(database.path)))
+            await asyncio.to_thread(os.rename, partial, final)
+            self.snapshots.insert(0, name)
+            storage_logger.info(f'Wrote backup snapshot {final} in {time.perf_counter() - start:.1f}s')
+            
+            expired = self.snapshots[self.keep:]
+            del self.snapshots[self.keep:]
+            for old in expired:
+                await asyncio.to_thread(shutil.rmtree, os.path.join(self.directory, old), True)
+                storage_logger.info(f'Removed old backup snapshot {old}')
+            return name
+
+    def _find_source(self, name, guild_id):
+        """Return (path, is_scratch_copy) for the snapshot file holding guild_id's rows (blocking)
+
+        Snapshots from an older schema are migrated on a scratch copy, so the
+        snapshot itself is never modified. Returns (None, False) if no file
+        in the snapshot has rows for the guild.
+        """
+        directory = os.path.join(self.directory, name)
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            try:
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                found = conn.execute(
+                    'SELECT 1 FROM question WHERE guild_id = ? UNION ALL SELECT 1 FROM guesses WHERE guild_id = ? LIMIT 1',
+                    (guild_id, guild_id)
+                ).fetchone()
+            finally:
+                conn.close()
+            if not found:
+                continue
+            if version > SCHEMA_VERSION:
+                raise ValueError(f'{name} was written by a newer version of the bot (schema {version})')
+            if version == SCHEMA_VERSION:
+                return path, False
+            fd, scratch = tempfile.mkstemp(suffix='.db', dir=self.directory)
+            os.close(fd)
+            shutil.copyfile(path, scratch)
+            conn = sqlite3.connect(scratch)
+            try:
+                migrate_database(conn)
+            finally:
+                conn.close()
+            return scratch, True
+        return None, False
+
+    def _restore(self, conn, part, source, guild_id):
+        """Replace a guild's questions and guesses with the rows in ``source`` (runs on the database thread)
+
+        The restored guesses go into a new round, like a reset, so the ones
+        they replace are left for RoundCompactor.
+        """
+        conn.execute('ATTACH DATABASE ? AS snapshot', (source,))
+        try:
+            with conn:
+                game_round = advance_round(conn, guild_id)
+                conn.execute('DELETE FROM question WHERE guild_id = ?', (guild_id,))
+                conn.execute(
+                    # Restored questions start closed with new serials, like new ones
+                    'INSERT INTO question (guild_id, question_id, question_text, is_open, is_numeric) '
+                    'SELECT guild_id, question_id, question_text, 0, is_numeric FROM snapshot.question WHERE guild_id = ?',
+                    (guild_id,)
+                )
+                # Only the round that was current when the snapshot was taken
+                conn.execute(
+                    'INSERT INTO guesses (guild_id, round, question_id, user_id, username, guess, guess_num, guess_norm) '
+                    'SELECT g.guild_id, ?, g.question_id, g.user_id, g.username, g.guess, g.guess_num, g.guess_norm FROM snapshot.guesses g '
+                    'LEFT JOIN snapshot.guild_rounds r ON r.guild_id = g.guild_id '
+                    'WHERE g.guild_id = ? AND g.round = COALESCE(r.round, 1)',
+                    (game_round, guild_id)
+                )
+        finally:
+            conn.execute('DETACH DATABASE snapshot')
+        question_rows = conn.execute(
+            'SELECT question_id, question_text, is_open, is_numeric, serial FROM question WHERE guild_id = ?', (guild_id,)
+        ).fetchall()
+        guess_rows = conn.execute(
+            'SELECT question_id, guess_num, guess_norm FROM guesses WHERE guild_id = ? AND round = ?', (guild_id, game_round)
+        ).fetchall()
+        return self.writer.seqs[part], game_round, question_rows, guess_rows
+
+    async def restore(self, name, guild_id):
+        """Restore one guild from a snapshot and refresh its cached state
+
+        Returns the number of questions and guesses restored, or None if the
+        snapshot has no data for the guild.
+        """
+        source, scratch = await asyncio.to_thread(self._find_source, name, guild_id)
+        if source is None:
+            return None
+        try:
+            part = self.db.index(guild_id)
+            seq, game_round, question_rows, guess_rows = await self.db.partitions[part].run(self._restore, part, source, guild_id)
+        finally:
+            if scratch:
+                await asyncio.to_thread(os.remove, source)
+        
+        for question_id in set(self.questions.questions(guild_id)) | {row[0] for row in question_rows}:
+            self.answers.forget(guild_id, question_id)
+        self.questions.replace_guild(guild_id, game_round, question_rows)
+        self.stats.reload_guild(guild_id, seq, guess_rows)
+        self.compactor.schedule(guild_id, game_round)
+        storage_logger.info(f'Restored {len(question_rows)} question(s) and {len(guess_rows)} guess(es) for guild {guild_id} from {name}')
+        return len(question_rows), len(guess_rows)
+
+class BotInfo:
+    """Figures shown by /botinfo, computed off the command path
+
+    Build details are resolved once at startup. Server and user totals are
+    adjusted as guilds are joined or left and fully recounted by a
+    background task, so /botinfo only formats what is already in memory.
+    """
+
+    def __init__(self):
+        self.branch = "unknown"
+        self.commit_hash = "unknown"
+        self.commit_date = "unknown"
+        self.total_lines = 0
+        self.server_count = 0
+        self.total_users = 0
+        # Shard-cluster workers share their figures through the supervisor
+        self.cluster_id = None
+        self.shared = None
+        self.cluster_totals = None
+
+    def resolve_build(self):
+        """Read git and source details (blocking; run in a worker thread)"""
+        here = os.path.dirname(os.path.abspath(__file__))
+        try:
+            # Get current branch
+            self.branch = subprocess.check_output(["git", "rev-parse", "--abbrev-ref", "HEAD"], cwd=here).decode("utf-8").strip()
+            
+            # Get current commit hash (short)
+            self.commit_hash = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=here).decode("utf-8").strip()
+            
+            # Get commit date
+            self.commit_date = subprocess.check_output(["git", "log", "-1", "--format=%cd", "--date=short"], cwd=here).decode("utf-8").strip()
+        except Exception:
+            pass
+        
+        # Count lines of code in this file
+        try:
+            with open(__file__, "r", encoding="utf-8") as f:
+                self.total_lines = sum(1 for _ in f)
+        except Exception:
+            pass
+
+    def recount(self, guilds):
+        self.server_count = len(guilds)
+        self.total_users = sum(guild.member_count or 0 for guild in guilds)
+
+    def share(self, stats):
+        """Publish this cluster's figures and add up every cluster's (blocking IPC; run in a worker thread)"""
+        self.shared[self.cluster_id] = (self.server_count, self.total_users, stats.total_guesses, stats.active_guilds)
+        self.cluster_totals = tuple(map(sum, zip(*self.shared.values())))
+
+def advance_round(conn, guild_id):
+    """Move a guild on to its next round and return the new round number (inside the caller's transaction)"""
+    conn.execute(
+        'INSERT INTO guild_rounds (guild_id, round) VALUES (?, 2) ON CONFLICT (guild_id) DO UPDATE SET round = round + 1',
+        (guild_id,)
+    )
+    return conn.execute('SELECT round FROM guild_rounds WHERE guild_id = ?', (guild_id,)).fetchone()[0]
+
+def reset_guild(conn, guild_id):
+    """Delete a guild's questions and start its next round, returning the new round number (runs on the database thread)
+
+    The old round's guesses stay in the table, where nothing reads them any
+    more, until RoundCompactor deletes them. That keeps a reset at a couple
+    of single-row writes however many guesses the guild had.
+    """
+    with conn:
+        game_round = advance_round(conn, guild_id)
+        conn.execute('DELETE FROM question WHERE guild_id = ?', (guild_id,))
+    return game_round
+
+def write_question(conn, guild_id, question_id, question_text, is_numeric):
+    """Create or replace a closed question and return its new serial (runs on the database thread)"""
+    with conn:
+        return conn.execute(
+            'INSERT OR REPLACE INTO question (guild_id, question_id, question_text, is_numeric, is_open) VALUES (?, ?, ?, ?, 0)',
+            (guild_id, question_id, question_text, 1 if is_numeric else 0)
+        ).lastrowid
+
+def remove_question_rows(conn, guild_id, game_round, question_id):
+    """Delete one question and its guesses in the current round (runs on the database thread)"""
+    with conn:
+        conn.execute('DELETE FROM guesses WHERE guild_id = ? AND round = ? AND question_id = ?', (guild_id, game_round, question_id))
+        conn.execute('DELETE FROM question WHERE guild_id = ? AND question_id = ?', (guild_id, question_id))
+
+def delete_old_rounds(conn, guild_id, game_round, limit):
+    """Delete up to ``limit`` of a guild's guesses from rounds before ``game_round`` and return how many went (runs on the database thread)"""
+    with conn:
+        return conn.execute(
+            'DELETE FROM guesses WHERE rowid IN (SELECT rowid FROM guesses WHERE guild_id = ? AND round < ? LIMIT ?)',
+            (guild_id, game_round, limit)
+        ).rowcount
+
+def vacuum_database(path):
+    """Rewrite a database file with incremental vacuum enabled, so RoundCompactor can hand its free pages back
+
+    Files created before rounds existed don't have it. The rewrite needs as
+    much free disk as the file itself and locks the file while it runs, so
+    it is only done offline, by python guesser.py --vacuum.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return False
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        return True
+    finally:
+        conn.close()
+
+def release_free_pages(conn, pages):
+    """Hand up to ``pages`` free pages back to the filesystem and return how many are left (runs on the database thread)"""
+    # executescript steps the pragma to completion; execute() would free a single page
+    conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+    return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+# RoundCompactor deletes COMPACT_BATCH_SIZE old guesses per transaction,
+# pausing COMPACT_PAUSE seconds between batches, then releases free pages
+# COMPACT_VACUUM_PAGES at a time
+COMPACT_BATCH_SIZE = 500
+COMPACT_PAUSE = 0.05
+COMPACT_VACUUM_PAGES = 256
+
+class RoundCompactor:
+    """Deletes the guesses of finished rounds in the background.
+
+    A reset only advances the guild's round, so the old round's guesses wait
+    here until a single background task deletes them, a small batch per
+    transaction, so guess commits queued on the same database thread are
+    held up by at most one batch. Once nothing is left to delete, each
+    partition's free pages are returned to the filesystem with incremental
+    vacuum, also in small steps. Guilds with old rounds still on disk are
+    found again at startup, so a restart never strands any rows.
+    """
+
+    RETRY_DELAY = 60
+
+    def __init__(self, db):
+        self.db = db
+        self._guilds = OrderedDict()
+        self._dirty = set()
+        self._wake = asyncio.Event()
+        self._task = None
+        self.rows_deleted = 0
+
+    @property
+    def backlog(self):
+        return len(self._guilds)
+
+    async def start(self, partition):
+        where, params = partition.where('r.guild_id')
+        for database in self.db.partitions:
+            rows = await database.fetchall(
+                'SELECT r.guild_id, r.round FROM guild_rounds r '
+                f'WHERE {where} AND EXISTS (SELECT 1 FROM guesses g WHERE g.guild_id = r.guild_id AND g.round < r.round)',
+                params
+            )
+            self._guilds.update(rows)
+        # Pages freed before a restart are released too
+        self._dirty.update(range(len(self.db.partitions)))
+        if self._guilds:
+            storage_logger.info(f'Compacting old rounds left by {len(self._guilds)} guild(s) in a previous session')
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def schedule(self, guild_id, game_round):
+        """Delete the guild's guesses from rounds before ``game_round``"""
+        self._guilds[guild_id] = game_round
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                if self._guilds:
+                    await self._compact_next()
+                elif self._dirty:
+                    await self._vacuum(self._dirty.pop())
+                else:
+                    self._wake.clear()
+                    await self._wake.wait()
+                    continue
+            except Exception as e:
+                storage_logger.error(f'Round compaction failed, retrying in {self.RETRY_DELAY}s: {e}')
+                await asyncio.sleep(self.RETRY_DELAY)
+                continue
+            await asyncio.sleep(COMPACT_PAUSE)
+
+    async def _compact_next(self):
+        """Delete one batch for the guild at the front of the queue, then move it to the back"""
+        guild_id, game_round = next(iter(self._guilds.items()))
+        part = self.db.index(guild_id)
+        deleted = await self.db.partitions[part].run(delete_old_rounds, guild_id, game_round, COMPACT_BATCH_SIZE)
+        self.rows_deleted += deleted
+        if deleted:
+            self._dirty.add(part)
+        # A reset while the batch ran leaves a newer round to compact up to
+        if self._guilds.get(guild_id) != game_round:
+            return
+        if deleted < COMPACT_BATCH_SIZE:
+            del self._guilds[guild_id]
+        else:
+            self._guilds.move_to_end(guild_id)
+
+    async def _vacuum(self, part):
+        database = self.db.partitions[part]
+        left = None
+        while True:
+            remaining = await database.run(release_free_pages, COMPACT_VACUUM_PAGES)
+            # Stop once the free list is empty, or if a step frees nothing
+            if not remaining or remaining == left:
+                return
+            left = remaining
+            # New old rounds take priority; this partition gets another pass after them
+            if self._guilds:
+                self._dirty.add(part)
+                return
+            await asyncio.sleep(COMPACT_PAUSE)
+
+class InstrumentedTree(app_commands.CommandTree):
+    """Command tree that stamps each command's start time for the latency histogram"""
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        interaction.extras['started'] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error):
+        record_command(interaction, 'error')
+        await super().on_error(interaction, error)
+
+def log_command(interaction, command, outcome, seconds):
+    command_logger.info(f'{command} finished in {seconds * 1000:.1f} ms ({outcome})', extra={
+        'guild_id': interaction.guild_id, 'user_id': interaction.user.id,
+        'command': command, 'latency_ms': round(seconds * 1000, 3),
+    })
+
+def record_command(interaction, outcome):
+    started = interaction.extras.get('started')
+    if started is not None and interaction.command is not None:
+        seconds = time.perf_counter() - started
+        metrics.observe('guesser_command_seconds', seconds, command=interaction.command.qualified_name, outcome=outcome)
+        log_command(interaction, interaction.command.qualified_name, outcome, seconds)
+
+# Snowflakes and interaction/webhook tokens in REST paths, collapsed so routes group together
+SNOWFLAKE_RE = re.compile(r'/\d{15,}')
+TOKEN_RE = re.compile(r'(/(?:interactions|webhooks)/\{id\})/[^/]+')
+
+def rest_route(method, url):
+    path = SNOWFLAKE_RE.sub('/{id}', url.path)
+    path = TOKEN_RE.sub(r'\1/{token}', path)
+    return f'{method} {path}'
+
+async def on_rest_request_end(session, context, params):
+    route = rest_route(params.method, params.url)
+    status = params.response.status
+    metrics.inc('guesser_rest_requests_total', route=route, status=status)
+    if status == 429:
+        metrics.inc('guesser_rest_rate_limited_total', route=route)
+
+rest_trace = aiohttp.TraceConfig()
+rest_trace.on_request_end.append(on_rest_request_end)
+
+async def monitor_event_loop(interval=0.5):
+    """Measure how late the loop wakes this task up; long handlers show up as lag"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        metrics.observe('guesser_event_loop_lag_seconds', max(time.perf_counter() - start - interval, 0.0))
+
+async def serve_metrics(reader, writer):
+    try:
+        # Every request gets the metrics page; read and discard the request head
+        while (await reader.readline()).strip():
+            pass
+        body = metrics.render().encode('utf-8')
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+            b'Connection: close\r\n\r\n' + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def init_storage():
+    """Migrate the database and load this process's share of the game state from it"""
+    await db.run_each(migrate_database)
+    await questions.load(partition)
+    await settings.load(partition)
+    await stats.load(partition)
+
+def command_tree_hash(tree):
+    """Hash the payload Discord stores for every registered slash command"""
+    payload = [command.to_dict(tree) for command in sorted(tree.get_commands(), key=lambda command: command.name)]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+async def sync_commands(tree):
+    """Sync slash commands with Discord, skipping the request when nothing changed since the last sync"""
+    key = f'command_hash:{tree.client.application_id}'
+    digest = command_tree_hash(tree)
+    row = await db.main.fetchone('SELECT value FROM bot_state WHERE key = ?', (key,))
+    if row and row[0] == digest:
+        logger.info('Slash commands unchanged since the last sync, skipping sync')
+        return
+    try:
+        synced = await tree.sync()
+        logger.info(f"Synced {len(synced)} command(s)")
+    except Exception as e:
+        logger.error(f"Failed to sync commands: {e}")
+        return
+    await db.main.execute('INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)', (key, digest))
+
+class GuesserBot(commands.AutoShardedBot):
+    async def setup_hook(self):
+        # Run database migration before connecting to the gateway
+        await init_storage()
+        
+        # Commands are global, so only the shard 0 worker syncs them, once per start
+        if partition.is_primary:
+            await sync_commands(self.tree)
+        await asyncio.to_thread(bot_info.resolve_build)
+        recount_servers.start()
+        if bot_info.shared is not None:
+            share_cluster_totals.start()
+        self.loop_monitor = asyncio.create_task(monitor_event_loop())
+        
+        # Serve Prometheus-style metrics on a local port (disabled when unset)
+        metrics_port = os.getenv('METRICS_PORT')
+        if metrics_port:
+            # Each shard-cluster worker listens on its own port after the first
+            metrics_port = int(metrics_port) + (bot_info.cluster_id or 0)
+            metrics_host = os.getenv('METRICS_HOST', '127.0.0.1')
+            self.metrics_server = await asyncio.start_server(serve_metrics, metrics_host, metrics_port)
+            logger.info(f'Serving metrics on http://{metrics_host}:{metrics_port}/metrics')
+        await janitor.start(self, partition)
+        await backups.start(partition)
+        await compactor.start(partition)
+        await scheduler.start(self, partition)
+
+    async def close(self):
+        recount_servers.cancel()
+        share_cluster_totals.cancel()
+        if getattr(self, 'loop_monitor', None):
+            self.loop_monitor.cancel()
+        if getattr(self, 'metrics_server', None):
+            self.metrics_server.close()
+        await janitor.stop()
+        await backups.stop()
+        await compactor.stop()
+        await scheduler.stop()
+        await super().close()
+        await guess_writer.close()
+        await db.close()
+
+questions = QuestionCache(db)
+guess_writer = GuessWriter(db)
+answers = AnswerMatcher(db, guess_writer, questions)
+stats = StatsTracker(db, guess_writer, questions)
+settings = GuildSettings(db)
+compactor = RoundCompactor(db)
+backups = BackupManager(db, guess_writer, questions, answers, stats, compactor)
+router = MessageRouter()
+admission = GuessAdmission()
+bot_info = BotInfo()
 
-# Load environment variables from .env file
-load_dotenv()
-TOKEN = os.getenv('DISCORD_BOT_TOKEN')
+GATEWAY_PROFILES = ('default', 'lean')
 
-# Set up the database
-conn = sqlite3.connect('guesses.db')
-c = conn.cursor()
+def gateway_options(profile='default'):
+    """discord.py cache and intent settings for a GATEWAY_PROFILE
 
-# Function to check and update database schema
-def migrate_database():
-    logger.info('Checking database schema...')
-    
-    # Check if tables exist
-    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='guesses'")
-    if not c.fetchone():
-        logger.info('Creating guesses table...')
-        c.execute('''
-            CREATE TABLE guesses (
-                guild_id INTEGER,
-                user_id INTEGER,
-                username TEXT,
-                guess TEXT,
-                PRIMARY KEY (guild_id, user_id)
-            )
-        ''')
-    else:
-        # Check if guild_id column exists in guesses table
-        c.execute('PRAGMA table_info(guesses)')
-        columns = [column[1] for column in c.fetchall()]
-        
-        if 'guild_id' not in columns:
-            logger.info('Migrating guesses table to support multiple servers...')
-            # Create new table with guild_id
-            c.execute('''
-                CREATE TABLE guesses_new (
-                    guild_id INTEGER,
-                    user_id INTEGER,
-                    username TEXT,
-                    guess TEXT,
-                    PRIMARY KEY (guild_id, user_id)
-                )
-            ''')
-            # Migrate existing data (set guild_id to 0 for old data)
-            c.execute('INSERT INTO guesses_new (guild_id, user_id, username, guess) SELECT 0, user_id, username, guess FROM guesses')
-            c.execute('DROP TABLE guesses')
-            c.execute('ALTER TABLE guesses_new RENAME TO guesses')
-    
-    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='question'")
-    if not c.fetchone():
-        logger.info('Creating question table...')
-        c.execute('''
-            CREATE TABLE question (
-                guild_id INTEGER PRIMARY KEY,
-                question_text TEXT DEFAULT '',
-                is_open INTEGER DEFAULT 0,
-                is_numeric INTEGER DEFAULT 1
-            )
-        ''')
-    else:
-        # Check for guild_id in question table
-        c.execute('PRAGMA table_info(question)')
-        columns = [column[1] for column in c.fetchall()]
-        
-        if 'guild_id' not in columns or 'id' in columns:
-            logger.info('Migrating question table to support multiple servers...')
-            # Create new table with guild_id
-            c.execute('''
-                CREATE TABLE question_new (
-                    guild_id INTEGER PRIMARY KEY,
-                    question_text TEXT DEFAULT '',
-                    is_open INTEGER DEFAULT 0,
-                    is_numeric INTEGER DEFAULT 1
-                )
-            ''')
-            # Try to migrate existing data
-            try:
-                c.execute('INSERT INTO question_new (guild_id, question_text, is_open, is_numeric) SELECT 0, question_text, is_open, is_numeric FROM question WHERE id = 1')
-            except:
-                pass  # If migration fails, just continue
-            c.execute('DROP TABLE question')
-            c.execute('ALTER TABLE question_new RENAME TO question')
-    
-    # Check guesses table columns for other migrations
-    c.execute('PRAGMA table_info(guesses)')
-    columns = {col[1]: col[2] for col in c.fetchall()}
-    
-    # If guess column is INTEGER, we need to recreate the table with TEXT
-    if 'guess' in columns and columns['guess'] == 'INTEGER':
-        logger.info('Migrating guesses table to support text answers...')
-        c.execute('''
-            CREATE TABLE guesses_new (
-                guild_id INTEGER,
-                user_id INTEGER,
-                username TEXT,
-                guess TEXT,
-                PRIMARY KEY (guild_id, user_id)
-            )
-        ''')
-        c.execute('INSERT INTO guesses_new SELECT guild_id, user_id, username, CAST(guess AS TEXT) FROM guesses')
-        c.execute('DROP TABLE guesses')
-        c.execute('ALTER TABLE guesses_new RENAME TO guesses')
+    The default profile keeps discord.py's defaults. The bot only reads
+    messages in its guess threads as they arrive, and takes nicknames from
+    the member on each interaction, so the lean profile keeps no message
+    cache, caches no members but itself, never chunks guilds and only
+    subscribes to guild and guild message events.
+    """
+    if profile == 'lean':
+        return {
+            'intents': discord.Intents(guilds=True, guild_messages=True, message_content=True),
+            'max_messages': None,
+            'member_cache_flags': discord.MemberCacheFlags.none(),
+            'chunk_guilds_at_startup': False,
+        }
+    intents = discord.Intents.default()
+    intents.message_content = True
+    return {'intents': intents}
+
+# Slash commands are defined before the bot exists; create_bot() adds them to its tree
+COMMANDS = []
+
+def slash_command(**kwargs):
+    """Define a slash command, like bot.tree.command, for create_bot() to register"""
+    def decorator(func):
+        command = app_commands.command(**kwargs)(func)
+        COMMANDS.append(command)
+        return command
+    return decorator
+
+# Built by create_bot() at startup, once GATEWAY_PROFILE can be read
+bot = None
+
+def create_bot(**options):
+    """Build the bot for GATEWAY_PROFILE (default or lean) and GATEWAY_MAX_MESSAGES and register its commands and listeners"""
+    global bot
+    profile = os.getenv('GATEWAY_PROFILE') or 'default'
+    if profile not in GATEWAY_PROFILES:
+        logger.warning(f'Unknown GATEWAY_PROFILE {profile!r}; using the default profile')
+        profile = 'default'
+    options.update(gateway_options(profile))
+    max_messages = os.getenv('GATEWAY_MAX_MESSAGES')
+    if max_messages:
+        # 0 turns the message cache off
+        options['max_messages'] = int(max_messages) or None
     
-    conn.commit()
-    logger.info('Database schema check complete.')
+    bot = GuesserBot(command_prefix='/', tree_cls=InstrumentedTree, http_trace=rest_trace, **options)
+    for command in COMMANDS:
+        bot.tree.add_command(command)
+    bot.add_listener(on_ready)
+    bot.add_listener(count_joined_guild, 'on_guild_join')
+    bot.add_listener(count_removed_guild, 'on_guild_remove')
+    bot.add_listener(time_command, 'on_app_command_completion')
+    bot.add_listener(route_message, 'on_message')
+    logger.info(f'Using the {profile} gateway profile (intents {bot.intents.value})')
+    return bot
 
-# Run database migration
-migrate_database()
+janitor = ThreadJanitor(db)
+scheduler = QuestionScheduler(db, questions, stats)
 
-intents = discord.Intents.default()
-intents.message_content = True
-bot = commands.Bot(command_prefix='/', intents=intents)
+metrics.gauge('guesser_pending_sessions', 'Guess and reset sessions waiting for a thread message', lambda: router.pending)
+metrics.gauge('guesser_guess_queue_depth', 'Guesses waiting for the next group commit', lambda: guess_writer.queued)
+metrics.gauge('guesser_guess_batches_committed', 'Group commits written since startup', lambda: guess_writer.batches_committed)
+metrics.gauge('guesser_guess_rows_committed', 'Guesses written since startup', lambda: guess_writer.rows_committed)
+metrics.gauge('guesser_threads_awaiting_cleanup', 'Threads queued for deletion', lambda: len(janitor._due))
+metrics.gauge('guesser_schedules', 'Scheduled opens, closes and questions waiting to run', lambda: len(scheduler._schedules))
+metrics.gauge('guesser_guilds', 'Guilds the bot is in', lambda: len(bot.guilds))
+metrics.gauge('guesser_compaction_backlog', 'Guilds with guesses from old rounds waiting to be deleted', lambda: compactor.backlog)
+metrics.gauge('guesser_compacted_rows', 'Old-round guesses deleted by the compactor since startup', lambda: compactor.rows_deleted)
+metrics.gauge('guesser_admission_buckets', 'Rate-limit buckets held for /guess users and guilds', lambda: len(admission.users) + len(admission.guilds))
 
-@bot.tree.command(name="guesshelp", description="Show available commands")
+@slash_command(name="guesshelp", description="Show available commands")
 async def guesshelp(interaction: discord.Interaction):
     """Shows available commands based on user permissions"""
     embed = discord.Embed(
@@ -146,9 +3015,11 @@ async def guesshelp(interaction: discord.Interaction):
     embed.add_field(
         name="📝 User Commands",
         value=(
-            "**/guess** - Start a private thread to submit your guess\n"
-            "**/show_question** - Display the current question\n"
+            "**/guess [question]** - Submit your guess privately\n"
+            "**/show_question [question]** - Display the current question\n"
+            "**/list_questions** - List this server's questions\n"
             "**/guessing_status** - Check if guessing is open or closed\n"
+            "**/leaderboard** - Show the top players across every recorded round\n"
             "**/guesshelp** - Show this help message\n"
             "**/botinfo** - Show info about this bot"
         ),
@@ -160,12 +3031,27 @@ async def guesshelp(interaction: discord.Interaction):
         embed.add_field(
             name="🛠️ Administrator Commands",
             value=(
-                "**/open_guessing** - Open the guessing event\n"
-                "**/close_guessing** - Close the guessing event\n"
+                "**/open_guessing [question]** - Open the guessing event\n"
+                "**/close_guessing [question] [answer]** - Close the guessing event, optionally recording the results\n"
                 "**/set_question <question>** - Set a new question for the game\n"
-                "**/list_guesses** - Show all submitted guesses\n"
-                "**/find_closest <answer>** - Find the closest guess to the answer\n"
-                "**/reset_game** - Clear all guesses and reset the game"
+                "**/add_question <question>** - Add another question to run alongside the others\n"
+                "**/remove_question <question>** - Delete a closed question and its guesses\n"
+                "**/guess_mode <mode>** - Collect guesses with a pop-up form or a private thread\n"
+                "**/list_guesses [question]** - Show all submitted guesses\n"
+                "**/find_closest <answer> [question] [record]** - Find the closest guess to the answer\n"
+                "**/stats [question]** - Show participation statistics for the current game"
+            ),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="🗂️ Scheduling and Game Data",
+            value=(
+                "**/schedule <action> <when>** - Open, close or set a question automatically, once or on repeat\n"
+                "**/list_schedules** / **/cancel_schedule <schedule>** - See or cancel scheduled actions\n"
+                "**/export_guesses [format] [question]** - Download the guesses as a compressed CSV or JSON lines file\n"
+                "**/reset_game** - Clear all guesses and reset the game\n"
+                "**/restore_backup <snapshot>** - Restore this server's game from a backup snapshot"
             ),
             inline=False
         )
@@ -174,7 +3060,8 @@ async def guesshelp(interaction: discord.Interaction):
             name="📌 Admin Examples",
             value=(
                 "`/set_question How many jelly beans are in the jar?`\n"
-                "`/find_closest 150` - If the answer is 150"
+                "`/find_closest 150` - If the answer is 150\n"
+                "`/add_question Name a country starting with B numeric_only:False`"
             ),
             inline=False
         )
@@ -182,39 +3069,14 @@ async def guesshelp(interaction: discord.Interaction):
     embed.set_footer(text="Only admins can see admin commands")
     await interaction.response.send_message(embed=embed)
 
-@bot.tree.command(name="botinfo", description="Show info about this bot")
+@slash_command(name="botinfo", description="Show info about this bot")
 async def botinfo(interaction: discord.Interaction):
     """Shows information about the bot"""
-    import sys
-    import subprocess
-    
-    # Try to get the current git branch
-    branch = "unknown"
-    commit_hash = "unknown"
-    commit_date = "unknown"
-    
-    try:
-        # Get current branch
-        branch = subprocess.check_output(["git", "rev-parse", "--abbrev-ref", "HEAD"]).decode("utf-8").strip()
-        
-        # Get current commit hash (short)
-        commit_hash = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"]).decode("utf-8").strip()
-        
-        # Get commit date
-        commit_date = subprocess.check_output(["git", "log", "-1", "--format=%cd", "--date=short"]).decode("utf-8").strip()
-    except Exception:
-        pass
-
-    # Git info formatting
-    git_info = f"**Branch:** `{branch}`\n**Commit:** `{commit_hash}` ({commit_date})"
-
-    # Count lines of code in this file
-    total_lines = 0
-    try:
-        with open(__file__, "r", encoding="utf-8") as f:
-            total_lines = sum(1 for _ in f)
-    except Exception:
-        pass
+    # Everything shown here is precomputed; see BotInfo
+    branch = bot_info.branch
+    commit_hash = bot_info.commit_hash
+    commit_date = bot_info.commit_date
+    total_lines = bot_info.total_lines
 
     # Get bot uptime
     uptime_str = "Unknown"
@@ -231,14 +3093,16 @@ async def botinfo(interaction: discord.Interaction):
             uptime_str = f"{minutes}m"
     
     # Server count
-    server_count = len(bot.guilds)
-    total_users = sum(guild.member_count for guild in bot.guilds)
+    server_count = bot_info.server_count
+    total_users = bot_info.total_users
+    
+    # Game stats, kept current by the stats tracker
+    total_guesses = stats.total_guesses
+    servers_with_guesses = stats.active_guilds
     
-    # Database stats
-    c.execute('SELECT COUNT(*) FROM guesses')
-    total_guesses = c.fetchone()[0]
-    c.execute('SELECT COUNT(DISTINCT guild_id) FROM guesses')
-    servers_with_guesses = c.fetchone()[0]
+    # In sharded mode, show the totals across every shard cluster
+    if bot_info.cluster_totals:
+        server_count, total_users, total_guesses, servers_with_guesses = bot_info.cluster_totals
     
     # Create embed for better formatting
     embed = discord.Embed(
@@ -249,7 +3113,7 @@ async def botinfo(interaction: discord.Interaction):
     
     embed.add_field(
         name="📊 Bot Statistics",
-        value=f"Servers: **{server_count}**\nUsers: **{total_users:,}**\nUptime: **{uptime_str}**",
+        value=f"Servers: **{server_count}**\nUsers: **{total_users:,}**\nShards: **{bot.shard_count or 1}**\nUptime: **{uptime_str}**",
         inline=True
     )
     
@@ -281,102 +3145,369 @@ async def botinfo(interaction: discord.Interaction):
     
     await interaction.response.send_message(embed=embed)
 
-@bot.event
 async def on_ready():
     # Store bot start time for uptime calculation
     if not hasattr(bot, 'start_time'):
         bot.start_time = datetime.now()
     
     logger.info(f'Logged in as {bot.user} (ID: {bot.user.id})')
+
+@tasks.loop(minutes=10)
+async def recount_servers():
+    # Member counts drift as people join and leave, so recount periodically
+    bot_info.recount(bot.guilds)
+
+@recount_servers.before_loop
+async def before_recount_servers():
+    await bot.wait_until_ready()
+
+@tasks.loop(seconds=30)
+async def share_cluster_totals():
+    # Only started in shard-cluster workers; see ShardSupervisor
     try:
-        synced = await bot.tree.sync()
-        logger.info(f"Synced {len(synced)} command(s)")
+        await asyncio.to_thread(bot_info.share, stats)
     except Exception as e:
-        logger.error(f"Failed to sync commands: {e}")
+        shard_logger.warning(f'Could not share totals with the other shard clusters: {e}')
+
+@share_cluster_totals.before_loop
+async def before_share_cluster_totals():
+    await bot.wait_until_ready()
 
-# Remove this duplicate guesshelp command definition
-# @bot.tree.command(name="guesshelp", description="Show available commands")
-# async def guesshelp(interaction: discord.Interaction):
-#     """Shows available commands based on user permissions"""
-#     embed = discord.Embed(
-#         title="🎯 Guessing Game Bot Commands",
-#         color=discord.Color.blue()
-#     )
-#     
-#     # User commands (everyone can see these)
-#     embed.add_field(
-#         name="📝 User Commands",
-#         value=(
-#             "**/guess** - Start a private thread to submit your guess\n"
-#             "**/show_question** - Display the current question\n"
-#             "**/guessing_status** - Check if guessing is open or closed\n"
-#             "**/guesshelp** - Show this help message\n"
-#             "**/botinfo** - Show info about this bot"
-#         ),
-#         inline=False
-#     )
-#     
-#     # Check if user is an admin
-#     if interaction.user.guild_permissions.administrator:
-#         embed.add_field(
-#             name="🛠️ Administrator Commands",
-#             value=(
-#                 "**/open_guessing** - Open the guessing event\n"
-#                 "**/close_guessing** - Close the guessing event\n"
-#                 "**/set_question <question>** - Set a new question for the game\n"
-#                 "**/list_guesses** - Show all submitted guesses\n"
-#                 "**/find_closest <answer>** - Find the closest guess to the answer\n"
-#                 "**/reset_game** - Clear all guesses and reset the game"
-#             ),
-#             inline=False
-#         )
-#         
-#         embed.add_field(
-#             name="📌 Admin Examples",
-#             value=(
-#                 "`/set_question How many jelly beans are in the jar?`\n"
-#                 "`/find_closest 150` - If the answer is 150"
-#             ),
-#             inline=False
-#         )
-#     
-#     embed.set_footer(text="Only admins can see admin commands")
-#     await interaction.response.send_message(embed=embed)
-
-@bot.tree.command(name="guess", description="Submit your private guess")
-async def guess(interaction: discord.Interaction):
+async def count_joined_guild(guild):
+    bot_info.server_count += 1
+    bot_info.total_users += guild.member_count or 0
+
+async def count_removed_guild(guild):
+    bot_info.server_count -= 1
+    bot_info.total_users -= guild.member_count or 0
+
+async def time_command(interaction, command):
+    record_command(interaction, 'ok')
+
+async def route_message(message):
+    # Hand thread replies to the guess or reset session waiting for them
+    router.dispatch(message)
+
+async def record_guess(interaction, game_round, question_id, guess_value):
+    """Save the user's guess on one of the guild's questions, returning once it is committed"""
     guild_id = interaction.guild_id
-    logger.info(f'User {interaction.user} (ID: {interaction.user.id}) initiated guess command in guild {guild_id}')
+    user_id = interaction.user.id
     
-    # Check if guessing is open for this guild
-    c.execute('SELECT is_open, is_numeric FROM question WHERE guild_id = ?', (guild_id,))
-    result = c.fetchone()
+    # Get server nickname if available, otherwise use global username. The
+    # interaction carries the member, so this works without a member cache
+    display_name = getattr(interaction.user, 'nick', None)
+    if display_name:
+        guess_logger.debug(f'Using server nickname: {display_name} for user {interaction.user}')
+    else:
+        display_name = interaction.user.name
+        guess_logger.debug(f'Using Discord username: {display_name} (no server nickname set)')
     
-    if not result:
+    # Returns once the batch holding this guess has been committed
+    await guess_writer.submit(guild_id, game_round, question_id, user_id, display_name, str(guess_value))
+    guess_logger.info(f'User {display_name} (ID: {user_id}) guessed: {guess_value} on question #{question_id} in guild {guild_id}',
+                      extra={'guild_id': guild_id, 'user_id': user_id, 'command': 'guess'})
+
+class GuessModal(discord.ui.Modal):
+    """Pop-up form that collects a guess in a single interaction"""
+
+    def __init__(self, game_round, question_id, question, is_numeric):
+        title = question if len(question) <= 45 else question[:44] + '…'
+        super().__init__(title=title)
+        self.game_round = game_round
+        self.question_id = question_id
+        self.is_numeric = is_numeric
+        self.answer = discord.ui.TextInput(
+            label="Your guess (numbers only)" if is_numeric else "Your answer",
+            placeholder="Type a whole number" if is_numeric else "Type your answer",
+            max_length=19 if is_numeric else 200
+        )
+        self.add_item(self.answer)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        # Form submissions aren't app commands, so time them here
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            await self.submit(interaction)
+            outcome = 'ok'
+        finally:
+            seconds = time.perf_counter() - start
+            metrics.observe('guesser_command_seconds', seconds, command='guess (form)', outcome=outcome)
+            log_command(interaction, 'guess (form)', outcome, seconds)
+
+    async def submit(self, interaction):
+        guild_id = interaction.guild_id
+        content = self.answer.value.strip()
+        
+        # Guessing may have closed or the game been reset while the form was open
+        state = questions.get(guild_id, self.question_id)
+        if not state or not state.is_open or questions.current_round(guild_id) != self.game_round:
+            await interaction.response.send_message("❌ Guessing closed before your guess was submitted.", ephemeral=True)
+            guess_logger.info(f'User {interaction.user} submitted a guess after guessing closed in guild {guild_id}')
+            return
+        
+        is_numeric = state.is_numeric
+        if not content:
+            await interaction.response.send_message("❌ Your answer can't be empty. Please use `/guess` again.", ephemeral=True)
+            return
+        if is_numeric and not WHOLE_NUMBER_RE.fullmatch(content):
+            await interaction.response.send_message(
+                f"❌ **{content}** isn't a valid guess. Please use `/guess` again and enter a whole number.", 
+                ephemeral=True
+            )
+            return
+        
+        guess_value = parse_guess_num(content) if is_numeric else content
+        if guess_value is None:
+            await interaction.response.send_message(TOO_LARGE_MESSAGE, ephemeral=True)
+            return
+        await record_guess(interaction, self.game_round, self.question_id, guess_value)
         await interaction.response.send_message(
-            "❌ No question has been set for this server yet. An admin needs to use `/set_question` first.", 
+            f"✅ Your {'guess' if is_numeric else 'answer'} of **{guess_value}** has been recorded!", 
             ephemeral=True
         )
+
+class GuessListView(discord.ui.View):
+    """Prev/Next/Jump pager for /list_guesses that fetches one page per click"""
+
+    def __init__(self, interaction, guild_id, game_round, question_id, total):
+        super().__init__(timeout=600)
+        self.interaction = interaction
+        self.guild_id = guild_id
+        self.game_round = game_round
+        self.question_id = question_id
+        self.total = total
+        self.page = 0
+        self.rows = []
+        self.has_next = False
+
+    @property
+    def page_count(self):
+        return max(1, -(-self.total // GUESS_PAGE_SIZE))
+
+    async def load(self, page, after=None, before=None):
+        if after is None and before is None:
+            rows = await db.for_guild(self.guild_id).run(fetch_guess_page, self.guild_id, self.game_round, self.question_id, None, None, page * GUESS_PAGE_SIZE)
+        else:
+            rows = await db.for_guild(self.guild_id).run(fetch_guess_page, self.guild_id, self.game_round, self.question_id, after, before)
+        
+        self.has_next = len(rows) > GUESS_PAGE_SIZE or (before is not None and bool(rows))
+        self.rows = rows[:GUESS_PAGE_SIZE]
+        self.page = page
+        self.prev_page.disabled = page == 0 or not self.rows
+        self.next_page.disabled = not self.has_next
+
+    def build_embed(self):
+        embed = discord.Embed(
+            title=f"All Guesses for Question #{self.question_id} ({self.total} total)",
+            color=discord.Color.green()
+        )
+        # Keep very long text answers from overflowing the embed
+        lines = []
+        for _, username, guess in self.rows:
+            if len(guess) > 150:
+                guess = guess[:149] + '…'
+            lines.append(f'**{username}**: {guess}')
+        embed.description = '\n'.join(lines) or 'No guesses on this page.'
+        
+        first = self.page * GUESS_PAGE_SIZE + 1
+        embed.set_footer(
+            text=f"Page {self.page + 1}/{self.page_count} • Showing guesses {first}-{first + len(self.rows) - 1} of {self.total}"
+        )
+        return embed
+
+    async def show(self, interaction, page, after=None, before=None):
+        await self.load(page, after=after, before=before)
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.user.id != self.interaction.user.id:
+            await interaction.response.send_message("Only the admin who ran `/list_guesses` can change pages.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page - 1, before=self.rows[0][0])
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page + 1, after=self.rows[-1][0])
+
+    @discord.ui.button(label="Jump to page", style=discord.ButtonStyle.primary)
+    async def jump_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(JumpToPageModal(self))
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        try:
+            await self.interaction.edit_original_response(view=self)
+        except discord.HTTPException:
+            pass
+
+class JumpToPageModal(discord.ui.Modal, title="Jump to page"):
+    def __init__(self, view):
+        super().__init__()
+        self.list_view = view
+        self.page = discord.ui.TextInput(label=f"Page number (1-{view.page_count})", max_length=6)
+        self.add_item(self.page)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        value = self.page.value.strip()
+        if not WHOLE_NUMBER_RE.fullmatch(value) or not 1 <= int(value) <= self.list_view.page_count:
+            await interaction.response.send_message(f"Please enter a page between 1 and {self.list_view.page_count}.", ephemeral=True)
+            return
+        await self.list_view.show(interaction, int(value) - 1)
+
+def question_label(question_id, state):
+    """'#id text', cut to fit Discord's 100-character choice and option labels"""
+    label = f'#{question_id} {state.question_text}'
+    return label if len(label) <= 100 else label[:99] + '…'
+
+def question_choices(items, current):
+    current = current.casefold()
+    labels = ((question_id, question_label(question_id, state)) for question_id, state in items)
+    return [app_commands.Choice(name=label, value=question_id) for question_id, label in labels if current in label.casefold()][:25]
+
+async def question_autocomplete(interaction: discord.Interaction, current: str):
+    return question_choices(questions.questions(interaction.guild_id).items(), current)
+
+async def open_question_autocomplete(interaction: discord.Interaction, current: str):
+    return question_choices(questions.open_questions(interaction.guild_id), current)
+
+async def resolve_question(interaction, question_id):
+    """Return (question_id, QuestionState) for a command's ``question`` option
+
+    Without the option the guild's only question is used. Sends an
+    ephemeral error and returns None when that doesn't pick out a question.
+    """
+    guild_questions = questions.questions(interaction.guild_id)
+    if question_id is None:
+        if len(guild_questions) == 1:
+            return next(iter(guild_questions.items()))
+        if not guild_questions:
+            message = "❌ No question has been set for this server yet. An admin needs to use `/set_question` first."
+        else:
+            message = "❌ This server has several questions. Choose one with the `question` option (see `/list_questions`)."
+    else:
+        state = guild_questions.get(question_id)
+        if state:
+            return question_id, state
+        message = f"❌ Question #{question_id} doesn't exist. Use `/list_questions` to see this server's questions."
+    await interaction.response.send_message(message, ephemeral=True)
+    return None
+
+class QuestionSelectView(discord.ui.View):
+    """Menu /guess shows when several questions are open and none was chosen"""
+
+    def __init__(self, open_questions):
+        super().__init__(timeout=120)
+        self.select = discord.ui.Select(
+            placeholder="Choose a question to answer",
+            options=[discord.SelectOption(label=question_label(question_id, state), value=str(question_id))
+                     for question_id, state in open_questions[:25]]
+        )
+        self.select.callback = self.choose
+        self.add_item(self.select)
+
+    async def choose(self, interaction: discord.Interaction):
+        question_id = int(self.select.values[0])
+        state = questions.get(interaction.guild_id, question_id)
+        if not state or not state.is_open:
+            await interaction.response.send_message("❌ Guessing on that question has closed.", ephemeral=True)
+            return
+        await start_guess(interaction, question_id, state)
+
+ADMISSION_MESSAGES = {
+    'pending': "⏳ You already have a guess in progress. Finish it in your private thread first.",
+    'user': "⏳ You're guessing too fast. Please try again in {wait}s.",
+    'guild': "⏳ This server is receiving a lot of guesses right now. Please try again in {wait}s.",
+}
+
+@slash_command(name="guess", description="Submit your private guess")
+@discord.app_commands.describe(question="Which question to answer, if more than one is open")
+@discord.app_commands.autocomplete(question=open_question_autocomplete)
+async def guess(interaction: discord.Interaction, question: int = None):
+    guild_id = interaction.guild_id
+    guess_logger.info(f'User {interaction.user} (ID: {interaction.user.id}) initiated guess command in guild {guild_id}')
+    
+    # Turn away spam before doing any other work
+    rejection = admission.admit(guild_id, interaction.user.id)
+    if rejection:
+        reason, wait = rejection
+        await interaction.response.send_message(ADMISSION_MESSAGES[reason].format(wait=math.ceil(wait)), ephemeral=True)
+        guess_logger.info(f'Rejected guess from {interaction.user} (ID: {interaction.user.id}) in guild {guild_id}: {reason}')
         return
     
-    is_open = result[0]
-    is_numeric = result[1]
+    # Check if guessing is open for this guild
+    if question is None:
+        open_questions = questions.open_questions(guild_id)
+        if len(open_questions) > 1:
+            await interaction.response.send_message(
+                "Several questions are open. Which one would you like to answer?", 
+                view=QuestionSelectView(open_questions), 
+                ephemeral=True
+            )
+            return
+        if open_questions:
+            question, state = open_questions[0]
+        else:
+            state = None
+            if not questions.questions(guild_id):
+                await interaction.response.send_message(
+                    "❌ No question has been set for this server yet. An admin needs to use `/set_question` first.", 
+                    ephemeral=True
+                )
+                return
+    else:
+        state = questions.get(guild_id, question)
+        if not state:
+            await interaction.response.send_message(
+                f"❌ Question #{question} doesn't exist. Use `/list_questions` to see this server's questions.", 
+                ephemeral=True
+            )
+            return
     
-    if not is_open:
+    if not state or not state.is_open:
         await interaction.response.send_message(
             "❌ Guessing is currently closed. There's nothing to guess at right now!", 
             ephemeral=True
         )
-        logger.info(f'User {interaction.user} tried to guess but event is closed in guild {guild_id}')
+        guess_logger.info(f'User {interaction.user} tried to guess but event is closed in guild {guild_id}')
+        return
+    
+    await start_guess(interaction, question, state)
+
+async def start_guess(interaction, question_id, state):
+    """Collect a guess on an open question with the guild's guess mode"""
+    guild_id = interaction.guild_id
+    is_numeric = state.is_numeric
+    question = state.question_text
+    # The guess belongs to this round even if the game is reset before it arrives
+    game_round = questions.current_round(guild_id)
+    
+    if settings.guess_mode(guild_id) == 'modal':
+        # A single interaction response: the form's submission records the guess
+        await interaction.response.send_modal(GuessModal(game_round, question_id, question, is_numeric))
+        return
+    
+    # One private thread per user in each server at a time, however many menus they opened
+    if not admission.start_session(guild_id, interaction.user.id):
+        await interaction.response.send_message(ADMISSION_MESSAGES['pending'], ephemeral=True)
         return
+    try:
+        await guess_in_thread(interaction, game_round, question_id, question, is_numeric)
+    finally:
+        admission.end_session(guild_id, interaction.user.id)
+
+async def guess_in_thread(interaction, game_round, question_id, question, is_numeric):
+    """Collect a guess in a private thread, waiting up to two minutes for the reply"""
+    guild_id = interaction.guild_id
     
     # Defer the response to avoid timeout
     await interaction.response.defer(ephemeral=True)
     
-    # Get the current question for this guild
-    c.execute('SELECT question_text FROM question WHERE guild_id = ?', (guild_id,))
-    question = c.fetchone()[0]
-    
     # Create a private thread for the user
     thread = await interaction.channel.create_thread(
         name=f"Private guess - {interaction.user.name}",
@@ -384,7 +3515,10 @@ async def guess(interaction: discord.Interaction):
         auto_archive_duration=60,
         invitable=False
     )
-    logger.info(f'Created private thread for {interaction.user} (Thread ID: {thread.id}) in guild {guild_id}')
+    guess_logger.info(f'Created private thread for {interaction.user} (Thread ID: {thread.id}) in guild {guild_id}')
+    
+    # Make sure the thread goes away even if the bot restarts mid-guess
+    await janitor.schedule(guild_id, thread.id, 125)
     
     # Add only the user and the bot to the thread
     await thread.add_user(interaction.user)
@@ -401,168 +3535,246 @@ async def guess(interaction: discord.Interaction):
     )
     
     def check(m):
-        if m.author != interaction.user or m.channel != thread:
-            return False
         if is_numeric:
-            return m.content.isdigit()
+            return WHOLE_NUMBER_RE.fullmatch(m.content.strip()) is not None
         else:
             return len(m.content.strip()) > 0  # Any non-empty text is valid
     
     try:
-        msg = await bot.wait_for('message', timeout=120.0, check=check)
+        msg = await router.wait_for(thread.id, interaction.user.id, check, timeout=120.0)
+        
+        # Guessing may have closed or the game been reset while we waited for the reply
+        state = questions.get(guild_id, question_id)
+        if not state or not state.is_open or questions.current_round(guild_id) != game_round:
+            await thread.send("❌ Guessing closed before your guess was submitted.")
+            guess_logger.info(f'User {interaction.user} submitted a guess after guessing closed in guild {guild_id}')
+            await janitor.schedule(guild_id, thread.id, 5)
+            return
         
         if is_numeric:
-            guess_value = int(msg.content)
+            guess_value = parse_guess_num(msg.content)
+            if guess_value is None:
+                await thread.send(TOO_LARGE_MESSAGE)
+                await janitor.schedule(guild_id, thread.id, 5)
+                return
         else:
             guess_value = msg.content.strip()
         
-        # Save the guess with guild_id
-        user_id = interaction.user.id
-        
-        # Get server nickname if available, otherwise use global username
-        member = interaction.guild.get_member(user_id)
-        if member and member.nick:
-            display_name = member.nick
-            logger.info(f'Using server nickname: {display_name} for user {interaction.user}')
-        else:
-            display_name = interaction.user.name
-            logger.info(f'Using Discord username: {display_name} (no server nickname set)')
-        
-        c.execute('REPLACE INTO guesses (guild_id, user_id, username, guess) VALUES (?, ?, ?, ?)', 
-                  (guild_id, user_id, display_name, str(guess_value)))
-        conn.commit()
-        logger.info(f'User {display_name} (ID: {user_id}) guessed: {guess_value} in guild {guild_id}')
+        await record_guess(interaction, game_round, question_id, guess_value)
         
         await thread.send(f"✅ Your {'guess' if is_numeric else 'answer'} of **{guess_value}** has been recorded!")
         
         # Delete the thread after a short delay
-        await asyncio.sleep(5)
-        await thread.delete()
+        await janitor.schedule(guild_id, thread.id, 5)
         
     except asyncio.TimeoutError:
-        logger.warning(f'Guess timeout for user {interaction.user} (ID: {interaction.user.id}) in guild {guild_id}')
+        guess_logger.warning(f'Guess timeout for user {interaction.user} (ID: {interaction.user.id}) in guild {guild_id}')
         await thread.send("⏰ Time's up! Please use `/guess` again if you want to make a guess.")
-        await asyncio.sleep(3)
-        await thread.delete()
+        await janitor.schedule(guild_id, thread.id, 3)
 
-@bot.tree.command(name="set_question", description="Set a new question for the guessing game")
+@slash_command(name="set_question", description="Set a new question for the guessing game")
 @discord.app_commands.describe(
     question="The new question to ask",
+    numeric_only="Whether to accept only numeric answers (default: True)",
+    question_id="Which question to replace, if the server has several"
+)
+@discord.app_commands.autocomplete(question_id=question_autocomplete)
+async def set_question(interaction: discord.Interaction, question: str, numeric_only: bool = True, question_id: int = None):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    guild_id = interaction.guild_id
+    
+    # Replace the chosen question, or the only one; the first question is #1
+    guild_questions = questions.questions(guild_id)
+    if question_id is None:
+        if len(guild_questions) > 1:
+            await interaction.response.send_message(
+                "❌ This server has several questions. Choose one with the `question_id` option, or use `/add_question`.", 
+                ephemeral=True
+            )
+            return
+        question_id = next(iter(guild_questions), 1)
+    elif question_id not in guild_questions:
+        await interaction.response.send_message(
+            f"❌ Question #{question_id} doesn't exist. Use `/add_question` to create a new one.", 
+            ephemeral=True
+        )
+        return
+    
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) set question #{question_id} in guild {guild_id}: "{question}" (numeric_only: {numeric_only})')
+    
+    # Insert or update the question for this guild
+    await questions.set_question(guild_id, question_id, question, numeric_only)
+    
+    response_type = "numeric answers only" if numeric_only else "text or numeric answers"
+    await interaction.response.send_message(
+        f'Question #{question_id} updated to: "{question}"\nAccepting: {response_type}'
+    )
+
+@slash_command(name="add_question", description="Add another question to this server's game (Admin only)")
+@discord.app_commands.describe(
+    question="The question to ask",
     numeric_only="Whether to accept only numeric answers (default: True)"
 )
-async def set_question(interaction: discord.Interaction, question: str, numeric_only: bool = True):
+async def add_question(interaction: discord.Interaction, question: str, numeric_only: bool = True):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    guild_id = interaction.guild_id
+    if len(questions.questions(guild_id)) >= MAX_QUESTIONS_PER_GUILD:
+        await interaction.response.send_message(
+            f"❌ This server already has {MAX_QUESTIONS_PER_GUILD} questions. Use `/remove_question` to make room.", 
+            ephemeral=True
+        )
+        return
+    
+    question_id = await questions.add_question(guild_id, question, numeric_only)
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) added question #{question_id} in guild {guild_id}: "{question}" (numeric_only: {numeric_only})')
+    
+    response_type = "numeric answers only" if numeric_only else "text or numeric answers"
+    await interaction.response.send_message(
+        f'Added question #{question_id}: "{question}"\nAccepting: {response_type}\n'
+        f'Use `/open_guessing question:{question_id}` to start taking guesses.'
+    )
+
+@slash_command(name="list_questions", description="List this server's questions")
+async def list_questions(interaction: discord.Interaction):
+    guild_id = interaction.guild_id
+    guild_questions = questions.questions(guild_id)
+    
+    if not guild_questions:
+        await interaction.response.send_message('❌ No question has been set yet. An admin needs to use `/set_question` first.')
+        return
+    
+    embed = discord.Embed(title=f"📋 Questions ({len(guild_questions)})", color=discord.Color.blue())
+    lines = []
+    for question_id, state in guild_questions.items():
+        status = "🟢 Open" if state.is_open else "🔴 Closed"
+        text = state.question_text if len(state.question_text) <= 100 else state.question_text[:99] + '…'
+        lines.append(f"**#{question_id}** {text}\n{status} • {stats.count(guild_id, question_id)} guesses")
+    embed.description = '\n'.join(lines)[:4096]
+    await interaction.response.send_message(embed=embed)
+
+@slash_command(name="remove_question", description="Delete a question and its guesses (Admin only)")
+@discord.app_commands.describe(question="The question to delete")
+@discord.app_commands.autocomplete(question=question_autocomplete)
+async def remove_question(interaction: discord.Interaction, question: int):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    resolved = await resolve_question(interaction, question)
+    if not resolved:
+        return
+    
+    guild_id = interaction.guild_id
+    question_id, state = resolved
+    if state.is_open:
+        await interaction.response.send_message(
+            f"❌ Question #{question_id} is still open. Use `/close_guessing question:{question_id}` first.", 
+            ephemeral=True
+        )
+        return
+    
+    total_guesses = stats.count(guild_id, question_id)
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) removed question #{question_id} with {total_guesses} guesses in guild {guild_id}')
+    await questions.remove(guild_id, question_id)
+    answers.forget(guild_id, question_id)
+    stats.forget(guild_id, question_id)
+    
+    await interaction.response.send_message(f'🗑️ Removed question #{question_id} and its {total_guesses} guesses.')
+
+@slash_command(name="guess_mode", description="Choose how users submit guesses (Admin only)")
+@discord.app_commands.describe(mode="Pop-up form (fastest) or a private thread per guess")
+@discord.app_commands.choices(mode=[
+    discord.app_commands.Choice(name="Pop-up form", value="modal"),
+    discord.app_commands.Choice(name="Private thread", value="thread")
+])
+async def guess_mode(interaction: discord.Interaction, mode: discord.app_commands.Choice[str]):
     if not interaction.user.guild_permissions.administrator:
         await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
         return
     
     guild_id = interaction.guild_id
-    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) set new question in guild {guild_id}: "{question}" (numeric_only: {numeric_only})')
-    
-    # Insert or update question for this guild
-    c.execute('INSERT OR REPLACE INTO question (guild_id, question_text, is_numeric, is_open) VALUES (?, ?, ?, ?)', 
-              (guild_id, question, 1 if numeric_only else 0, 0))
-    conn.commit()
-    
-    response_type = "numeric answers only" if numeric_only else "text or numeric answers"
-    await interaction.response.send_message(
-        f'Question updated to: "{question}"\nAccepting: {response_type}'
-    )
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) set guess mode to {mode.value} in guild {guild_id}')
+    await settings.set_guess_mode(guild_id, mode.value)
+    await interaction.response.send_message(f"Guesses will now be submitted using: **{mode.name}**")
 
-@bot.tree.command(name="show_question", description="Display the current question")
-async def show_question(interaction: discord.Interaction):
+@slash_command(name="show_question", description="Display the current question")
+@discord.app_commands.describe(question="Which question to show, if the server has several")
+@discord.app_commands.autocomplete(question=question_autocomplete)
+async def show_question(interaction: discord.Interaction, question: int = None):
     guild_id = interaction.guild_id
     logger.info(f'User {interaction.user} (ID: {interaction.user.id}) requested current question in guild {guild_id}')
-    c.execute('SELECT question_text FROM question WHERE guild_id = ?', (guild_id,))
-    result = c.fetchone()
     
-    if not result or not result[0] or result[0].strip() == '':
+    if question is None and not questions.questions(guild_id):
         await interaction.response.send_message('❌ No question has been set yet. An admin needs to use `/set_question` first.')
-    else:
-        await interaction.response.send_message(f'Current question: **{result[0]}**')
+        return
+    
+    resolved = await resolve_question(interaction, question)
+    if resolved:
+        question_id, state = resolved
+        await interaction.response.send_message(f'Question #{question_id}: **{state.question_text}**')
 
-@bot.tree.command(name="list_guesses", description="Show all submitted guesses (Admin only)")
-async def list_guesses(interaction: discord.Interaction):
+@slash_command(name="list_guesses", description="Show all submitted guesses (Admin only)")
+@discord.app_commands.describe(question="Which question's guesses to list, if the server has several")
+@discord.app_commands.autocomplete(question=question_autocomplete)
+async def list_guesses(interaction: discord.Interaction, question: int = None):
     if not interaction.user.guild_permissions.administrator:
         await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
         return
     
+    resolved = await resolve_question(interaction, question)
+    if not resolved:
+        return
+    
     guild_id = interaction.guild_id
-    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) requested list of guesses in guild {guild_id}')
-    c.execute('SELECT username, guess FROM guesses WHERE guild_id = ?', (guild_id,))
-    rows = c.fetchall()
+    question_id, _ = resolved
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) requested list of guesses for question #{question_id} in guild {guild_id}')
+    total = stats.count(guild_id, question_id)
     
-    if not rows:
+    if not total:
         await interaction.response.send_message('No guesses have been made yet.')
         return
     
-    # If there are few guesses, show them in a single embed
-    if len(rows) <= 20:
-        embed = discord.Embed(
-            title=f"All Guesses ({len(rows)} total)",
-            color=discord.Color.green()
-        )
-        guess_list = '\n'.join([f'**{username}**: {guess}' for username, guess in rows])
-        embed.description = guess_list
-        await interaction.response.send_message(embed=embed)
+    # Only the current page is ever loaded; the buttons fetch the others on demand
+    view = GuessListView(interaction, guild_id, questions.current_round(guild_id), question_id, total)
+    await view.load(page=0)
+    
+    if total <= GUESS_PAGE_SIZE:
+        await interaction.response.send_message(embed=view.build_embed())
     else:
-        # For many guesses, send multiple embeds
-        await interaction.response.defer()
-        
-        # Split guesses into chunks of 20
-        chunks = [rows[i:i+20] for i in range(0, len(rows), 20)]
-        
-        for i, chunk in enumerate(chunks):
-            embed = discord.Embed(
-                title=f"All Guesses - Part {i+1}/{len(chunks)} ({len(rows)} total)",
-                color=discord.Color.green()
-            )
-            
-            # Create the guess list for this chunk
-            guess_list = '\n'.join([f'**{username}**: {guess}' for username, guess in chunk])
-            
-            # Split into fields if even this chunk is too long
-            if len(guess_list) > 4000:
-                # Split into smaller sections for fields
-                lines = [f'**{username}**: {guess}' for username, guess in chunk]
-                field_content = []
-                current_field = []
-                current_length = 0
-                
-                for line in lines:
-                    if current_length + len(line) + 1 > 1000:  # Leave room for newlines
-                        field_content.append('\n'.join(current_field))
-                        current_field = [line]
-                        current_length = len(line)
-                    else:
-                        current_field.append(line)
-                        current_length += len(line) + 1
-                
-                if current_field:
-                    field_content.append('\n'.join(current_field))
-                
-                # Add fields to embed
-                for j, content in enumerate(field_content[:25]):  # Discord limit: 25 fields
-                    field_name = f"Guesses {i*20 + j*5 + 1}-{min(i*20 + (j+1)*5, len(rows))}"
-                    embed.add_field(name=field_name, value=content, inline=False)
-            else:
-                embed.description = guess_list
-            
-            # Add navigation info to footer
-            embed.set_footer(text=f"Showing guesses {i*20 + 1}-{min((i+1)*20, len(rows))} of {len(rows)}")
-            
-            # Send the embed
-            if i == 0:
-                await interaction.followup.send(embed=embed)
-            else:
-                await interaction.followup.send(embed=embed)
-            
-            # Add a small delay to avoid rate limiting for very large lists
-            if len(chunks) > 10 and i < len(chunks) - 1:
-                await asyncio.sleep(0.5)
+        await interaction.response.send_message(embed=view.build_embed(), view=view)
+
+async def save_results(guild_id, question_id, state, answer):
+    """Record a closed question's results on the leaderboard and return a line describing them"""
+    # Guesses accepted before the question closed may still be waiting for their group commit
+    await guess_writer.drain(guild_id)
+    placed = await db.for_guild(guild_id).run(
+        record_results, guild_id, questions.current_round(guild_id), question_id, state.serial, state.question_text, answer, state.is_numeric, 
+        stats.count(guild_id, question_id)
+    )
+    if placed is None:
+        return f"ℹ️ Results for question #{question_id} were already recorded."
+    logger.info(f'Recorded results for question #{question_id} in guild {guild_id}: {len(placed)} user(s) placed')
+    
+    winners = [username for place, _, username, _ in placed if place == 1]
+    if not winners:
+        return f"📋 Results for question #{question_id} recorded; nobody placed this time."
+    names = ', '.join(winners[:5]) + (f' and {len(winners) - 5} more' if len(winners) > 5 else '')
+    return f"🏆 Results for question #{question_id} recorded on the `/leaderboard`. Winner{'s' if len(winners) > 1 else ''}: {names}"
 
-@bot.tree.command(name="find_closest", description="Find the closest guess to the actual answer (Admin only)")
-@discord.app_commands.describe(answer="The actual answer to compare guesses against")
-async def find_closest(interaction: discord.Interaction, answer: str):
+@slash_command(name="find_closest", description="Find the closest guess to the actual answer (Admin only)")
+@discord.app_commands.describe(
+    answer="The actual answer to compare guesses against",
+    question="Which question the answer is for, if the server has several",
+    record="Record the results on the leaderboard (guessing on the question must be closed)"
+)
+@discord.app_commands.autocomplete(question=question_autocomplete)
+async def find_closest(interaction: discord.Interaction, answer: str, question: int = None, record: bool = False):
     if not interaction.user.guild_permissions.administrator:
         await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
         return
@@ -570,46 +3782,38 @@ async def find_closest(interaction: discord.Interaction, answer: str):
     guild_id = interaction.guild_id
     
     # Check if the question is numeric
-    c.execute('SELECT is_numeric FROM question WHERE guild_id = ?', (guild_id,))
-    result = c.fetchone()
-    if not result:
-        await interaction.response.send_message("No question has been set for this server yet.", ephemeral=True)
+    resolved = await resolve_question(interaction, question)
+    if not resolved:
+        return
+    question_id, state = resolved
+    
+    if record and state.is_open:
+        await interaction.response.send_message(f"❌ Close guessing on question #{question_id} before recording its results.", ephemeral=True)
         return
     
-    is_numeric = result[0]
+    is_numeric = state.is_numeric
     
     if is_numeric:
         # Try to convert answer to int for numeric comparison
-        try:
-            answer_num = int(answer)
-        except ValueError:
+        answer_num = parse_guess_num(answer)
+        if answer_num is None:
             await interaction.response.send_message("The current question expects numeric answers. Please provide a number.", ephemeral=True)
             return
         
         logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) finding closest guesses to answer: {answer_num} in guild {guild_id}')
-        c.execute('SELECT username, guess FROM guesses WHERE guild_id = ?', (guild_id,))
-        rows = c.fetchall()
-        
-        if not rows:
-            await interaction.response.send_message('No guesses have been made yet.')
-            return
-        
-        # Calculate differences for all valid numeric guesses
-        valid_guesses = []
-        for username, guess in rows:
-            try:
-                guess_num = int(guess)
-                difference = abs(guess_num - answer_num)
-                valid_guesses.append((username, guess_num, difference))
-            except ValueError:
-                continue  # Skip non-numeric guesses
+        # Fetch the top 5 plus enough extra rows to spot (and count) ties for 5th
+        valid_guesses = await db.for_guild(guild_id).run(closest_guesses, guild_id, questions.current_round(guild_id), question_id, answer_num, 11)
         
         if not valid_guesses:
-            await interaction.response.send_message('No valid numeric guesses found.')
+            if not stats.count(guild_id, question_id):
+                await interaction.response.send_message('No guesses have been made yet.')
+            else:
+                await interaction.response.send_message('No valid numeric guesses found.')
+            # Still record the question, so it shows up as played with nobody placed
+            if record:
+                await interaction.followup.send(await save_results(guild_id, question_id, state, answer_num))
             return
         
-        # Sort by difference and get top 5
-        valid_guesses.sort(key=lambda x: x[2])
         top_5 = valid_guesses[:5]
         
         logger.info(f'Top 5 guesses to {answer_num}: {[(u, g, d) for u, g, d in top_5]}')
@@ -647,14 +3851,24 @@ async def find_closest(interaction: discord.Interaction, answer: str):
         
         await interaction.response.send_message(embed=embed)
     else:
-        # For text-based questions, show exact matches and closest matches
+        # For text-based questions, show exact matches and the most similar answers
         logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) checking for matches: "{answer}" in guild {guild_id}')
         
-        # First check for exact matches
-        c.execute('SELECT username, guess FROM guesses WHERE guild_id = ? AND LOWER(guess) = LOWER(?)', (guild_id, answer))
-        exact_matches = c.fetchall()
+        norm = normalize_answer(answer)
+        index = await answers.get(guild_id, question_id)
+        
+        if not index.counts:
+            await interaction.response.send_message('No guesses have been made yet.')
+            if record:
+                await interaction.followup.send(await save_results(guild_id, question_id, state, answer))
+            return
+        
+        ranked = index.rank(norm, 10)
+        exact_count = index.counts.get(norm, 0)
+        similar = [group for group in ranked if group[0] != norm]
+        samples = await db.for_guild(guild_id).run(matching_answers, guild_id, questions.current_round(guild_id), question_id, [group[0] for group in ranked], 10 if exact_count else 3)
         
-        if exact_matches:
+        if exact_count:
             embed = discord.Embed(
                 title="🎯 Exact Matches Found!",
                 color=discord.Color.gold(),
@@ -662,17 +3876,17 @@ async def find_closest(interaction: discord.Interaction, answer: str):
             )
             
             # Show up to first 10 exact matches
-            winners = '\n'.join([f"• {username}" for username, _ in exact_matches[:10]])
+            winners = '\n'.join([f"• {username}" for username, _ in samples[norm]])
             embed.add_field(
-                name=f"Users who got it exactly right ({len(exact_matches)} total):",
+                name=f"Users who got it exactly right ({exact_count} total):",
                 value=winners,
                 inline=False
             )
             
-            if len(exact_matches) > 10:
+            if exact_count > 10:
                 embed.add_field(
                     name="Note",
-                    value=f"Showing first 10 of {len(exact_matches)} exact matches",
+                    value=f"Showing first 10 of {exact_count} exact matches",
                     inline=False
                 )
         else:
@@ -682,31 +3896,280 @@ async def find_closest(interaction: discord.Interaction, answer: str):
                 description=f"The answer was: **{answer}**"
             )
         
-        # Show all answers for manual review
-        c.execute('SELECT username, guess FROM guesses WHERE guild_id = ?', (guild_id,))
-        all_rows = c.fetchall()
-        
-        if all_rows and not exact_matches:
-            answers_list = '\n'.join([f'**{username}**: {guess}' for username, guess in all_rows[:20]])
-            embed.add_field(name="All Responses", value=answers_list, inline=False)
-            if len(all_rows) > 20:
-                embed.add_field(name="Note", value=f"Showing first 20 of {len(all_rows)} responses", inline=False)
+        # Group near-misses by normalized answer, most similar first
+        if similar:
+            lines = []
+            for i, (group, count, similarity) in enumerate(similar[:5 if exact_count else 10]):
+                shown = samples[group][0][1] if samples[group] else group
+                if len(shown) > 60:
+                    shown = shown[:59] + '…'
+                names = ', '.join(username for username, _ in samples[group][:3])
+                more = f' +{count - 3} more' if count > 3 else ''
+                lines.append(f"{i + 1}. **{shown}** - {count} user{'s' if count != 1 else ''} ({similarity:.0%} match): {names}{more}")
+            embed.add_field(name="🔎 Closest Answers", value='\n'.join(lines)[:1024], inline=False)
+        elif not exact_count:
+            embed.add_field(name="🔎 Closest Answers", value="No answers are similar to this one.", inline=False)
         
         await interaction.response.send_message(embed=embed)
+    
+    if record:
+        await interaction.followup.send(await save_results(guild_id, question_id, state, answer_num if is_numeric else answer))
 
-@bot.tree.command(name="open_guessing", description="Open the guessing event (Admin only)")
-async def open_guessing(interaction: discord.Interaction):
+@slash_command(name="stats", description="Show participation statistics (Admin only)")
+@discord.app_commands.describe(question="Which question to summarize, if the server has several")
+@discord.app_commands.autocomplete(question=question_autocomplete)
+async def stats_command(interaction: discord.Interaction, question: int = None):
     if not interaction.user.guild_permissions.administrator:
         await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
         return
     
+    resolved = await resolve_question(interaction, question)
+    if not resolved:
+        return
+    
     guild_id = interaction.guild_id
+    question_id, state = resolved
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) requested stats for question #{question_id} in guild {guild_id}')
+    guild_stats = stats.get(guild_id, question_id)
     
-    # Check if a question has been set for this guild
-    c.execute('SELECT question_text FROM question WHERE guild_id = ?', (guild_id,))
-    result = c.fetchone()
+    if not guild_stats:
+        await interaction.response.send_message('No guesses have been made yet.')
+        return
+    
+    embed = discord.Embed(
+        title="📊 Game Statistics",
+        description=f"**Question #{question_id}:** {state.question_text}",
+        color=discord.Color.blue()
+    )
+    embed.add_field(name="Participants", value=str(guild_stats.count), inline=True)
+    
+    def fmt(value):
+        return f"{value:,.2f}".rstrip('0').rstrip('.') if isinstance(value, float) else f"{value:,}"
+    
+    if guild_stats.nums and state.is_numeric:
+        mode, mode_count = guild_stats.answers.most_common(1)[0]
+        embed.add_field(name="Average", value=fmt(guild_stats.mean), inline=True)
+        embed.add_field(name="Median", value=fmt(guild_stats.median), inline=True)
+        embed.add_field(name="Most Common", value=f"{mode} ({mode_count}×)", inline=True)
+        embed.add_field(name="Range", value=f"{fmt(guild_stats.minimum)} to {fmt(guild_stats.maximum)}", inline=True)
+        embed.add_field(name="Std. Deviation", value=fmt(guild_stats.stdev), inline=True)
+    else:
+        top = guild_stats.answers.most_common(5)
+        lines = []
+        for i, (answer, count) in enumerate(top):
+            if len(answer) > 60:
+                answer = answer[:59] + '…'
+            lines.append(f"{i + 1}. **{answer}** - {count} user{'s' if count != 1 else ''}")
+        embed.add_field(name="Most Common Answers", value='\n'.join(lines), inline=False)
+        embed.add_field(name="Distinct Answers", value=str(len(guild_stats.answers.counts)), inline=True)
+    
+    await interaction.response.send_message(embed=embed)
+
+@slash_command(name="leaderboard", description="Show the server's top players across every recorded round")
+async def leaderboard(interaction: discord.Interaction):
+    guild_id = interaction.guild_id
+    top, own = await db.for_guild(guild_id).run(fetch_leaderboard, guild_id, interaction.user.id)
+    
+    if not top:
+        await interaction.response.send_message(
+            "No results have been recorded yet. Admins record them with `/close_guessing answer:` or `/find_closest record:True`.", 
+            ephemeral=True
+        )
+        return
+    
+    rank_emojis = ["🥇", "🥈", "🥉"]
+    lines = []
+    for i, (user_id, username, wins, podiums, points) in enumerate(top):
+        rank = rank_emojis[i] if i < len(rank_emojis) else f"**{i + 1}.**"
+        lines.append(f"{rank} **{username}** - {points} point{'s' if points != 1 else ''} ({wins} win{'s' if wins != 1 else ''}, {podiums} podium{'s' if podiums != 1 else ''})")
+    
+    embed = discord.Embed(
+        title="🏆 Leaderboard",
+        description='\n'.join(lines),
+        color=discord.Color.gold()
+    )
+    if own and own[0] not in [row[0] for row in top]:
+        embed.set_footer(text=f"You: {own[4]} points ({own[2]} wins, {own[3]} podiums)")
+    embed.add_field(
+        name="Scoring",
+        value=f"Points for 1st to {len(PLACE_POINTS)}th place: {', '.join(map(str, PLACE_POINTS))}. Tied guesses share a place.",
+        inline=False
+    )
+    await interaction.response.send_message(embed=embed)
+
+@slash_command(name="export_guesses", description="Download a question's guesses as a compressed file (Admin only)")
+@discord.app_commands.describe(
+    file_format="CSV for spreadsheets or JSON lines for scripts (default: CSV)",
+    question="Which question's guesses to export, if the server has several"
+)
+@discord.app_commands.rename(file_format="format")
+@discord.app_commands.choices(file_format=[
+    discord.app_commands.Choice(name="CSV", value="csv"),
+    discord.app_commands.Choice(name="JSON lines", value="jsonl")
+])
+@discord.app_commands.autocomplete(question=question_autocomplete)
+async def export_guesses(interaction: discord.Interaction, file_format: discord.app_commands.Choice[str] = None, question: int = None):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    resolved = await resolve_question(interaction, question)
+    if not resolved:
+        return
+    
+    guild_id = interaction.guild_id
+    question_id, _ = resolved
+    extension = file_format.value if file_format else 'csv'
+    
+    if not stats.count(guild_id, question_id):
+        await interaction.response.send_message('No guesses have been made yet.', ephemeral=True)
+        return
+    
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) exported question #{question_id} as {extension} in guild {guild_id}')
+    
+    # Large exports take a while to read and compress, so answer Discord first
+    await interaction.response.defer(ephemeral=True)
+    export, count = await asyncio.to_thread(export_guesses_file, db.for_guild(guild_id).path, guild_id, questions.current_round(guild_id), question_id, extension)
+    with export:
+        size = export.seek(0, io.SEEK_END)
+        export.seek(0)
+        if size > interaction.guild.filesize_limit:
+            await interaction.followup.send(
+                f"❌ The export is {size / 1024 / 1024:.1f} MB, more than this server's upload limit.", 
+                ephemeral=True
+            )
+            return
+        await interaction.followup.send(
+            f"📦 {count} guesses for question #{question_id}",
+            file=discord.File(export, filename=f'guesses-{guild_id}-q{question_id}.{extension}.gz'),
+            ephemeral=True
+        )
+
+@slash_command(name="metrics", description="Dump the bot's performance metrics (Bot owner only)")
+async def metrics_command(interaction: discord.Interaction):
+    # Metrics cover every server, so only the bot owner can read them
+    if not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+        return
+    
+    logger.info(f'Owner {interaction.user} (ID: {interaction.user.id}) requested a metrics dump')
+    dump = io.BytesIO(metrics.render().encode('utf-8'))
+    await interaction.response.send_message(file=discord.File(dump, filename='metrics.txt'), ephemeral=True)
+
+@slash_command(name="backup_now", description="Take a backup snapshot of the game database (Bot owner only)")
+async def backup_now(interaction: discord.Interaction):
+    # Snapshots cover every server, so only the bot owner can take them
+    if not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+        return
+    
+    logger.info(f'Owner {interaction.user} (ID: {interaction.user.id}) requested a backup snapshot')
+    await interaction.response.defer(ephemeral=True)
+    try:
+        name = await backups.snapshot()
+    except Exception as e:
+        storage_logger.error(f'Backup requested by {interaction.user} failed: {e}')
+        await interaction.followup.send(f"❌ Backup failed: {e}", ephemeral=True)
+        return
+    await interaction.followup.send(f"✅ Wrote snapshot `{name}` ({len(backups.snapshots)} kept).", ephemeral=True)
+
+async def snapshot_autocomplete(interaction: discord.Interaction, current: str):
+    return [app_commands.Choice(name=name, value=name) for name in backups.snapshots if current in name][:25]
+
+class RestoreConfirmView(discord.ui.View):
+    """Restore/Cancel buttons for /restore_backup"""
+
+    def __init__(self, interaction, snapshot):
+        super().__init__(timeout=60)
+        self.interaction = interaction
+        self.snapshot = snapshot
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.user.id != self.interaction.user.id:
+            await interaction.response.send_message("Only the admin who ran `/restore_backup` can confirm it.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="Restore", style=discord.ButtonStyle.danger)
+    async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.stop()
+        guild_id = interaction.guild_id
+        
+        # Guessing may have been reopened while the buttons were showing
+        if questions.open_questions(guild_id):
+            await interaction.response.edit_message(content="❌ Restore cancelled: guessing was reopened. No data was changed.", view=None)
+            return
+        
+        await interaction.response.edit_message(content=f"⏳ Restoring from `{self.snapshot}`...", view=None)
+        try:
+            restored = await backups.restore(self.snapshot, guild_id)
+        except Exception as e:
+            storage_logger.error(f'Restore of guild {guild_id} from {self.snapshot} failed: {e}')
+            await interaction.edit_original_response(content=f"❌ Restore failed, no data was changed: {e}")
+            return
+        
+        if restored is None:
+            await interaction.edit_original_response(content=f"❌ `{self.snapshot}` has no data for this server. No data was changed.")
+            return
+        
+        question_count, guess_count = restored
+        logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) restored guild {guild_id} from {self.snapshot}')
+        await interaction.edit_original_response(
+            content=f"✅ Restored {question_count} question(s) and {guess_count} guess(es) from `{self.snapshot}`. All questions are closed."
+        )
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.secondary)
+    async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.stop()
+        await interaction.response.edit_message(content="Restore cancelled. No data was changed.", view=None)
+
+    async def on_timeout(self):
+        try:
+            await self.interaction.edit_original_response(content="Restore cancelled due to timeout. No data was changed.", view=None)
+        except discord.HTTPException:
+            pass
+
+@slash_command(name="restore_backup", description="Restore this server's game from a backup snapshot (Admin only)")
+@discord.app_commands.describe(snapshot="The snapshot to restore, newest first")
+@discord.app_commands.autocomplete(snapshot=snapshot_autocomplete)
+async def restore_backup(interaction: discord.Interaction, snapshot: str):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    guild_id = interaction.guild_id
+    if snapshot not in backups.snapshots:
+        await interaction.response.send_message("❌ Unknown snapshot. Pick one from the list.", ephemeral=True)
+        return
+    
+    if questions.open_questions(guild_id):
+        await interaction.response.send_message(
+            "❌ Cannot restore while guessing is open!\n\n"
+            "Please use `/close_guessing` first before restoring a backup.", 
+            ephemeral=True
+        )
+        return
+    
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) started a restore from {snapshot} in guild {guild_id}')
+    await interaction.response.send_message(
+        f"⚠️ This replaces all of this server's questions and guesses with those in `{snapshot}`. "
+        f"The current {stats.guild_count(guild_id)} guess(es) will be lost.",
+        view=RestoreConfirmView(interaction, snapshot),
+        ephemeral=True
+    )
+
+@slash_command(name="open_guessing", description="Open the guessing event (Admin only)")
+@discord.app_commands.describe(question="Which question to open, if the server has several")
+@discord.app_commands.autocomplete(question=question_autocomplete)
+async def open_guessing(interaction: discord.Interaction, question: int = None):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    guild_id = interaction.guild_id
     
-    if not result or not result[0] or result[0].strip() == '':
+    # Check if a question has been set for this guild
+    if question is None and not questions.questions(guild_id):
         await interaction.response.send_message(
             "❌ Cannot open guessing without a question!\n\n"
             "Please use `/set_question` to set a question first.", 
@@ -715,48 +4178,196 @@ async def open_guessing(interaction: discord.Interaction):
         logger.info(f'Admin {interaction.user} tried to open guessing but no question is set in guild {guild_id}')
         return
     
-    question = result[0]
+    resolved = await resolve_question(interaction, question)
+    if not resolved:
+        return
+    question_id, state = resolved
     
-    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) opened guessing in guild {guild_id}')
-    c.execute('UPDATE question SET is_open = 1 WHERE guild_id = ?', (guild_id,))
-    conn.commit()
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) opened guessing on question #{question_id} in guild {guild_id}')
+    await questions.set_open(guild_id, question_id, True)
     
     embed = discord.Embed(
         title="🎯 Guessing is Now OPEN!",
-        description=f"**Current Question:** {question}\n\nUse `/guess` to submit your answer!",
+        description=f"**Question #{question_id}:** {state.question_text}\n\nUse `/guess` to submit your answer!",
         color=discord.Color.green()
     )
     await interaction.response.send_message(embed=embed)
 
-@bot.tree.command(name="close_guessing", description="Close the guessing event (Admin only)")
-async def close_guessing(interaction: discord.Interaction):
+@slash_command(name="close_guessing", description="Close the guessing event (Admin only)")
+@discord.app_commands.describe(
+    question="Which question to close, if the server has several",
+    answer="The correct answer, to record the results on the leaderboard"
+)
+@discord.app_commands.autocomplete(question=question_autocomplete)
+async def close_guessing(interaction: discord.Interaction, question: int = None, answer: str = None):
     if not interaction.user.guild_permissions.administrator:
         await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
         return
     
+    # With several questions open, the one to close has to be named
     guild_id = interaction.guild_id
-    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) closed guessing in guild {guild_id}')
-    c.execute('UPDATE question SET is_open = 0 WHERE guild_id = ?', (guild_id,))
-    conn.commit()
+    open_questions = questions.open_questions(guild_id)
+    if question is None and len(open_questions) == 1:
+        question = open_questions[0][0]
+    resolved = await resolve_question(interaction, question)
+    if not resolved:
+        return
+    question_id, state = resolved
+    
+    if answer is not None and state.is_numeric:
+        answer = parse_guess_num(answer)
+        if answer is None:
+            await interaction.response.send_message("This question expects numeric answers. Please provide a number.", ephemeral=True)
+            return
+    
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) closed guessing on question #{question_id} in guild {guild_id}')
+    await questions.set_open(guild_id, question_id, False)
     
-    # Get total number of guesses for this guild
-    c.execute('SELECT COUNT(*) FROM guesses WHERE guild_id = ?', (guild_id,))
-    total_guesses = c.fetchone()[0]
+    # Recording waits for guesses still being committed, so it comes before the count
+    results = await save_results(guild_id, question_id, state, answer) if answer is not None else None
+    
+    # Get total number of guesses for this question
+    total_guesses = stats.count(guild_id, question_id)
     
     embed = discord.Embed(
         title="🔒 Guessing is Now CLOSED!",
-        description=f"No more guesses will be accepted.\n\n**Total guesses received:** {total_guesses}",
+        description=f"No more guesses will be accepted on question #{question_id}.\n\n**Total guesses received:** {total_guesses}",
         color=discord.Color.red()
     )
+    if results:
+        embed.add_field(name="Results", value=results, inline=False)
     await interaction.response.send_message(embed=embed)
 
-@bot.tree.command(name="guessing_status", description="Check if guessing is open or closed")
+SCHEDULE_ACTION_NAMES = {'open': "Open guessing", 'close': "Close guessing", 'set': "Set question"}
+
+def schedule_label(schedule):
+    """One line describing a schedule, with its time in each reader's own timezone"""
+    repeat = f", {schedule.repeat}" if schedule.repeat else ""
+    text = f': "{schedule.question_text[:60]}"' if schedule.action == 'set' else ""
+    return f"**{schedule.schedule_id}.** {SCHEDULE_ACTION_NAMES[schedule.action]} #{schedule.question_id}{text} <t:{int(schedule.due_at)}:f>{repeat}"
+
+@slash_command(name="schedule", description="Open, close or set a question automatically at a later time (Admin only)")
+@discord.app_commands.describe(
+    action="What to do when the time comes",
+    when="UTC time as HH:MM or YYYY-MM-DD HH:MM, or a delay such as +30m, +2h or +1d",
+    question="Which question to act on, if the server has several",
+    repeat="Run it again every day or week (default: once)",
+    text="The question to set (Set question only)",
+    numeric_only="Whether the new question accepts only numeric answers (Set question only, default: True)"
+)
+@discord.app_commands.choices(
+    action=[discord.app_commands.Choice(name=name, value=value) for value, name in SCHEDULE_ACTION_NAMES.items()],
+    repeat=[
+        discord.app_commands.Choice(name="Once", value="once"),
+        discord.app_commands.Choice(name="Daily", value="daily"),
+        discord.app_commands.Choice(name="Weekly", value="weekly")
+    ]
+)
+@discord.app_commands.autocomplete(question=question_autocomplete)
+async def schedule_command(interaction: discord.Interaction, action: discord.app_commands.Choice[str], when: str, question: int = None,
+                           repeat: discord.app_commands.Choice[str] = None, text: str = None, numeric_only: bool = True):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    guild_id = interaction.guild_id
+    now = time.time()
+    due_at = parse_schedule_time(when, now)
+    if due_at is None or due_at <= now:
+        await interaction.response.send_message(
+            "❌ I couldn't read that time. Use a UTC time like `18:30` or `2025-12-24 18:30`, or a delay like `+30m`, `+2h` or `+1d`.",
+            ephemeral=True
+        )
+        return
+    if len(scheduler.guild_schedules(guild_id)) >= MAX_SCHEDULES_PER_GUILD:
+        await interaction.response.send_message(
+            f"❌ This server already has {MAX_SCHEDULES_PER_GUILD} schedules. Cancel one with `/cancel_schedule` first.",
+            ephemeral=True
+        )
+        return
+    
+    if action.value == 'set':
+        if not text:
+            await interaction.response.send_message("❌ Give the question to set with the `text` option.", ephemeral=True)
+            return
+        # Like /set_question: replace the chosen question, or the only one
+        guild_questions = questions.questions(guild_id)
+        if question is None:
+            if len(guild_questions) > 1:
+                await interaction.response.send_message(
+                    "❌ This server has several questions. Choose one with the `question` option.",
+                    ephemeral=True
+                )
+                return
+            question = next(iter(guild_questions), 1)
+        elif question not in guild_questions:
+            await interaction.response.send_message(
+                f"❌ Question #{question} doesn't exist. Use `/add_question` to create a new one.",
+                ephemeral=True
+            )
+            return
+    else:
+        resolved = await resolve_question(interaction, question)
+        if not resolved:
+            return
+        question = resolved[0]
+    
+    repeat = repeat.value if repeat and repeat.value != 'once' else None
+    schedule = await scheduler.add(guild_id, interaction.channel.id, action.value, question, due_at, repeat, text, numeric_only)
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) scheduled {action.value} on question #{question} '
+                f'for {datetime.fromtimestamp(due_at, timezone.utc):%Y-%m-%d %H:%M} UTC (repeat: {repeat}) in guild {guild_id}')
+    
+    await interaction.response.send_message(f"⏰ Scheduled: {schedule_label(schedule)}\nThe result will be announced in this channel.")
+
+@slash_command(name="list_schedules", description="List this server's scheduled actions (Admin only)")
+async def list_schedules(interaction: discord.Interaction):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    guild_schedules = scheduler.guild_schedules(interaction.guild_id)
+    if not guild_schedules:
+        await interaction.response.send_message("Nothing is scheduled. Use `/schedule` to add something.", ephemeral=True)
+        return
+    
+    embed = discord.Embed(
+        title=f"⏰ Schedules ({len(guild_schedules)})",
+        description='\n'.join(schedule_label(schedule) for schedule in guild_schedules)[:4096],
+        color=discord.Color.blue()
+    )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def schedule_autocomplete(interaction: discord.Interaction, current: str):
+    choices = []
+    for schedule in scheduler.guild_schedules(interaction.guild_id):
+        when = datetime.fromtimestamp(schedule.due_at, timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+        label = f"{schedule.schedule_id}. {SCHEDULE_ACTION_NAMES[schedule.action]} #{schedule.question_id} at {when}"
+        if current.casefold() in label.casefold():
+            choices.append(app_commands.Choice(name=label[:100], value=schedule.schedule_id))
+    return choices[:25]
+
+@slash_command(name="cancel_schedule", description="Cancel a scheduled action (Admin only)")
+@discord.app_commands.describe(schedule="The schedule to cancel")
+@discord.app_commands.autocomplete(schedule=schedule_autocomplete)
+async def cancel_schedule(interaction: discord.Interaction, schedule: int):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    guild_id = interaction.guild_id
+    if not await scheduler.cancel(guild_id, schedule):
+        await interaction.response.send_message(f"❌ Schedule {schedule} doesn't exist. Use `/list_schedules` to see them.", ephemeral=True)
+        return
+    
+    logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) cancelled schedule {schedule} in guild {guild_id}')
+    await interaction.response.send_message(f"🗑️ Cancelled schedule {schedule}.", ephemeral=True)
+
+@slash_command(name="guessing_status", description="Check if guessing is open or closed")
 async def guessing_status(interaction: discord.Interaction):
     guild_id = interaction.guild_id
-    c.execute('SELECT is_open, question_text, is_numeric FROM question WHERE guild_id = ?', (guild_id,))
-    result = c.fetchone()
+    guild_questions = questions.questions(guild_id)
     
-    if not result:
+    if not guild_questions:
         embed = discord.Embed(
             title="❌ No Game Set Up",
             description="No question has been set yet. An admin needs to use `/set_question` first.",
@@ -765,24 +4376,14 @@ async def guessing_status(interaction: discord.Interaction):
         await interaction.response.send_message(embed=embed)
         return
     
-    is_open = result[0]
-    question = result[1]
-    is_numeric = result[2]
-    
-    if is_open:
-        answer_type = "Number" if is_numeric else "Text or Number"
-        embed = discord.Embed(
-            title="✅ Guessing is OPEN",
-            description=f"**Current Question:** {question}\n**Answer Type:** {answer_type}\n\nUse `/guess` to submit your answer!",
-            color=discord.Color.green()
-        )
-    else:
-        # Check if there's even a question set
-        if not question or question.strip() == '':
+    if len(guild_questions) == 1:
+        question_id, state = next(iter(guild_questions.items()))
+        if state.is_open:
+            answer_type = "Number" if state.is_numeric else "Text or Number"
             embed = discord.Embed(
-                title="❌ Guessing is CLOSED",
-                description="No question has been set yet. An admin needs to use `/set_question` first.",
-                color=discord.Color.red()
+                title="✅ Guessing is OPEN",
+                description=f"**Current Question:** {state.question_text}\n**Answer Type:** {answer_type}\n\nUse `/guess` to submit your answer!",
+                color=discord.Color.green()
             )
         else:
             embed = discord.Embed(
@@ -790,10 +4391,24 @@ async def guessing_status(interaction: discord.Interaction):
                 description="There's a question set, but guessing is not open yet. Wait for an admin to open guessing!",
                 color=discord.Color.red()
             )
+        await interaction.response.send_message(embed=embed)
+        return
     
+    # Several questions: one line each
+    open_count = len(questions.open_questions(guild_id))
+    lines = []
+    for question_id, state in guild_questions.items():
+        status = "✅ Open" if state.is_open else "❌ Closed"
+        answer_type = "Number" if state.is_numeric else "Text or Number"
+        lines.append(f"{status} • {question_label(question_id, state)} ({answer_type})")
+    embed = discord.Embed(
+        title=f"✅ Guessing is OPEN on {open_count} of {len(guild_questions)} questions" if open_count else "❌ Guessing is CLOSED",
+        description='\n'.join(lines)[:4000] + ("\n\nUse `/guess` to submit your answer!" if open_count else ""),
+        color=discord.Color.green() if open_count else discord.Color.red()
+    )
     await interaction.response.send_message(embed=embed)
 
-@bot.tree.command(name="reset_game", description="Clear all guesses and reset the game (Admin only)")
+@slash_command(name="reset_game", description="Clear all guesses and reset the game (Admin only)")
 async def reset_game(interaction: discord.Interaction):
     if not interaction.user.guild_permissions.administrator:
         await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
@@ -802,20 +4417,17 @@ async def reset_game(interaction: discord.Interaction):
     guild_id = interaction.guild_id
     logger.info(f'Admin {interaction.user} (ID: {interaction.user.id}) initiated reset_game command in guild {guild_id}')
     
-    # Check if guessing is still open
-    c.execute('SELECT is_open FROM question WHERE guild_id = ?', (guild_id,))
-    result = c.fetchone()
+    # Check if guessing is still open on any question
+    guild_questions = questions.questions(guild_id)
     
-    if not result:
+    if not guild_questions:
         await interaction.response.send_message(
             "❌ No game has been set up for this server yet.", 
             ephemeral=True
         )
         return
     
-    is_open = result[0]
-    
-    if is_open:
+    if questions.open_questions(guild_id):
         await interaction.response.send_message(
             "❌ Cannot reset the game while guessing is still open!\n\n"
             "Please use `/close_guessing` first before resetting the game.", 
@@ -825,11 +4437,9 @@ async def reset_game(interaction: discord.Interaction):
         return
     
     # Get current stats before reset
-    c.execute('SELECT COUNT(*) FROM guesses WHERE guild_id = ?', (guild_id,))
-    total_guesses = c.fetchone()[0]
-    c.execute('SELECT question_text FROM question WHERE guild_id = ?', (guild_id,))
-    result = c.fetchone()
-    current_question = result[0] if result else "No question set"
+    total_guesses = stats.guild_count(guild_id)
+    question_ids = list(guild_questions)
+    current_question = '\n'.join(question_label(question_id, state) for question_id, state in guild_questions.items())[:1024]
     
     # Defer the response to avoid timeout
     await interaction.response.defer(ephemeral=True)
@@ -842,6 +4452,9 @@ async def reset_game(interaction: discord.Interaction):
         invitable=False
     )
     
+    # Make sure the thread goes away even if the bot restarts mid-reset
+    await janitor.schedule(guild_id, thread.id, 70)
+    
     # Add only the admin to the thread
     await thread.add_user(interaction.user)
     
@@ -851,11 +4464,11 @@ async def reset_game(interaction: discord.Interaction):
         description="This action will permanently delete all data for this server!",
         color=discord.Color.red()
     )
-    embed.add_field(name="Current Question", value=current_question, inline=False)
+    embed.add_field(name="Questions" if len(question_ids) > 1 else "Current Question", value=current_question, inline=False)
     embed.add_field(name="Total Guesses", value=str(total_guesses), inline=False)
     embed.add_field(
         name="What will be deleted:",
-        value="• All user guesses\n• The current question\n• Open/closed status",
+        value="• All user guesses\n• Every question\n• Open/closed status",
         inline=False
     )
     
@@ -869,11 +4482,11 @@ async def reset_game(interaction: discord.Interaction):
     )
     
     def check_delete(m):
-        return m.author == interaction.user and m.channel == thread and m.content.upper() == "DELETE"
+        return m.content.upper() == "DELETE"
     
     try:
         # First confirmation
-        await bot.wait_for('message', timeout=30.0, check=check_delete)
+        await router.wait_for(thread.id, interaction.user.id, check_delete, timeout=30.0)
         
         # Second confirmation
         embed2 = discord.Embed(
@@ -890,27 +4503,22 @@ async def reset_game(interaction: discord.Interaction):
         await thread.send(embed=embed2)
         
         def check_confirm(m):
-            return m.author == interaction.user and m.channel == thread and m.content.upper() == "CONFIRM RESET"
+            return m.content.upper() == "CONFIRM RESET"
         
         # Second confirmation
-        await bot.wait_for('message', timeout=30.0, check=check_confirm)
+        await router.wait_for(thread.id, interaction.user.id, check_confirm, timeout=30.0)
         
         # Perform the reset
         logger.info(f'Admin {interaction.user} confirmed game reset. Deleting {total_guesses} guesses in guild {guild_id}.')
         
-        # Clear all guesses for this guild
-        c.execute('DELETE FROM guesses WHERE guild_id = ?', (guild_id,))
-        
-        # Clear the question and ensure guessing is closed for this guild
-        c.execute('''
-            UPDATE question 
-            SET question_text = '',
-                is_open = 0,
-                is_numeric = 1
-            WHERE guild_id = ?
-        ''', (guild_id,))
-        
-        conn.commit()
+        # Start a new round with no questions, including any question added
+        # while the admin was confirming; the old guesses are deleted in the background
+        question_ids = list(questions.questions(guild_id))
+        game_round = await questions.reset(guild_id)
+        for question_id in question_ids:
+            answers.forget(guild_id, question_id)
+            stats.forget(guild_id, question_id)
+        compactor.schedule(guild_id, game_round)
         
         # Send success message
         success_embed = discord.Embed(
@@ -919,25 +4527,190 @@ async def reset_game(interaction: discord.Interaction):
             color=discord.Color.green()
         )
         success_embed.add_field(name="Guesses Deleted", value=str(total_guesses), inline=True)
-        success_embed.add_field(name="Question", value="Cleared", inline=True)
+        success_embed.add_field(name="Questions", value=f"{len(question_ids)} cleared", inline=True)
         success_embed.add_field(name="Status", value="Closed", inline=True)
         
         await thread.send(embed=success_embed)
         logger.info(f'Game reset completed in guild {guild_id}. {total_guesses} guesses deleted. Question cleared.')
         
         # Delete thread after a delay
-        await asyncio.sleep(10)
-        await thread.delete()
+        await janitor.schedule(guild_id, thread.id, 10)
         
     except asyncio.TimeoutError:
         logger.warning(f'Reset timeout for admin {interaction.user} (ID: {interaction.user.id}) in guild {guild_id}')
         await thread.send("❌ Reset cancelled due to timeout. No data was deleted.")
-        await asyncio.sleep(5)
-        await thread.delete()
+        await janitor.schedule(guild_id, thread.id, 5)
+
+def run_cluster(cluster_id, shard_ids, shard_count, shared, token):
+    """Worker process entry point: run one shard cluster against its own guilds' data"""
+    listener = setup_logging(f'discord-cluster{cluster_id}.log')
+    shard_logger.info(f'Shard cluster {cluster_id} starting with shard(s) {shard_ids} of {shard_count}')
+    
+    # The supervisor decides when workers stop: ignore Ctrl+C and shut down cleanly on SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    
+    configure_storage()
+    partition.assign(shard_ids, shard_count)
+    create_bot(shard_ids=list(shard_ids), shard_count=shard_count)
+    bot_info.cluster_id = cluster_id
+    bot_info.shared = shared
+    try:
+        bot.run(token, log_handler=None)
+    finally:
+        # Worker processes exit without running atexit hooks
+        listener.stop()
+
+class ShardSupervisor:
+    """Runs shard clusters in separate worker processes and restarts any that exit.
+
+    Shards are split into contiguous ranges, one per cluster. Workers are
+    started a few seconds apart so their gateway logins stay within Discord's
+    identify rate limit, and a crashed worker is restarted with exponential
+    backoff. Workers report their /botinfo figures through a shared dict
+    hosted by a multiprocessing manager.
+    """
+
+    IDENTIFY_INTERVAL = 5.0
+    RESTART_DELAY = 5.0
+    MAX_RESTART_DELAY = 300.0
+    # A worker that stays up this long is considered healthy again
+    STABLE_AFTER = 600.0
+
+    def __init__(self, token, shard_count, cluster_count):
+        self.token = token
+        self.shard_count = shard_count
+        self.clusters = [
+            list(range(shard_count))[i * shard_count // cluster_count:(i + 1) * shard_count // cluster_count]
+            for i in range(cluster_count)
+        ]
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = {}
+        self._started_at = {}
+        self._next_start = {}
+        self._delays = {}
+        self._stopping = False
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+
+    def _start(self, cluster_id, shared):
+        process = self._context.Process(
+            target=run_cluster,
+            args=(cluster_id, self.clusters[cluster_id], self.shard_count, shared, self.token),
+            name=f'guesser-cluster-{cluster_id}'
+        )
+        process.start()
+        self._workers[cluster_id] = process
+        self._started_at[cluster_id] = time.monotonic()
+        shard_logger.info(f'Started shard cluster {cluster_id} (pid {process.pid}) with shard(s) {self.clusters[cluster_id]}')
+
+    def _check(self, cluster_id, shared):
+        process = self._workers.get(cluster_id)
+        if process is not None and process.is_alive():
+            return
+        now = time.monotonic()
+        if process is not None:
+            # Schedule a restart, backing off if the worker keeps dying
+            uptime = now - self._started_at[cluster_id]
+            delay = self.RESTART_DELAY if uptime >= self.STABLE_AFTER else min(self._delays.get(cluster_id, self.RESTART_DELAY / 2) * 2, self.MAX_RESTART_DELAY)
+            self._delays[cluster_id] = delay
+            self._next_start[cluster_id] = now + delay
+            del self._workers[cluster_id]
+            shared.pop(cluster_id, None)
+            shard_logger.warning(f'Shard cluster {cluster_id} exited with code {process.exitcode}, restarting in {delay:.0f}s')
+        if now >= self._next_start[cluster_id]:
+            self._start(cluster_id, shared)
+
+    def run(self):
+        # Create the schema once, before several processes open the database at the same time
+        for database in db.partitions:
+            conn = sqlite3.connect(database.path)
+            migrate_database(conn)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.close()
+        
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+        manager = multiprocessing.managers.SyncManager(ctx=self._context)
+        manager.start(signal.signal, (signal.SIGINT, signal.SIG_IGN))
+        shared = manager.dict()
+        
+        now = time.monotonic()
+        for cluster_id, shard_ids in enumerate(self.clusters):
+            self._next_start[cluster_id] = now + cluster_id * len(self.clusters[0]) * self.IDENTIFY_INTERVAL
+        shard_logger.info(f'Supervising {len(self.clusters)} shard cluster(s) for {self.shard_count} shard(s)')
+        
+        try:
+            while not self._stopping:
+                for cluster_id in range(len(self.clusters)):
+                    self._check(cluster_id, shared)
+                time.sleep(1)
+        finally:
+            shard_logger.info('Stopping shard clusters...')
+            for process in self._workers.values():
+                process.terminate()
+            for process in self._workers.values():
+                process.join(30)
+                if process.is_alive():
+                    process.kill()
+            manager.shutdown()
 
-# Run the bot using the token from the .env file
-if TOKEN:
+def main():
+    parser = argparse.ArgumentParser(description='Discord guessing game bot')
+    parser.add_argument('--split-database', type=int, metavar='N',
+                        help='copy guesses.db into N partition files for DB_PARTITIONS=N, then exit')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='rewrite the database files so old rounds\' space can be returned to disk, then exit (stop the bot first)')
+    args = parser.parse_args()
+    
+    # Load environment variables from .env file
+    load_dotenv()
+    listener = setup_logging()
+    atexit.register(listener.stop)
+    
+    if args.split_database:
+        split_database('guesses.db', args.split_database)
+        logger.info(f'Split guesses.db into {args.split_database} partition(s); set DB_PARTITIONS={args.split_database} to use them')
+        return
+    
+    configure_storage()
+    if db.count > 1 and os.path.exists(db.path) and not all(os.path.exists(database.path) for database in db.partitions):
+        logger.error(f'guesses.db has not been split yet; run python guesser.py --split-database {db.count} first')
+        return
+    # Guilds in partition files from another layout would silently start out empty
+    other_counts = other_partition_counts(db.path, db.count)
+    if other_counts:
+        resplit = f' and run python guesser.py --split-database {db.count}' if db.count > 1 else ''
+        logger.error(f'Found guesses.db partition files for DB_PARTITIONS={", ".join(map(str, other_counts))} but DB_PARTITIONS is {db.count}; '
+                     f'set DB_PARTITIONS back, or move those files aside{resplit} to start from guesses.db')
+        return
+    if args.vacuum:
+        logger.info('Vacuuming the database files; this can take a while for large ones...')
+        for database in db.partitions:
+            if not os.path.exists(database.path):
+                continue
+            if vacuum_database(database.path):
+                logger.info(f'Rewrote {database.path} with incremental vacuum enabled')
+            else:
+                logger.info(f'{database.path} already has incremental vacuum enabled')
+        return
+    token = os.getenv('DISCORD_BOT_TOKEN')
+    if not token:
+        logger.error('DISCORD_BOT_TOKEN not found in .env file')
+        return
+    
+    # SHARD_COUNT switches to the multi-process sharded mode
+    shard_count = int(os.getenv('SHARD_COUNT') or 0)
+    if shard_count:
+        cluster_count = int(os.getenv('SHARD_CLUSTERS') or min(shard_count, os.cpu_count() or 1))
+        ShardSupervisor(token, shard_count, max(1, min(cluster_count, shard_count))).run()
+        return
+    
+    # Run the bot using the token from the .env file
     logger.info('Starting bot...')
-    bot.run(TOKEN)
-else:
-    logger.error('DISCORD_BOT_TOKEN not found in .env file')
\ No newline at end of file
+    create_bot()
+    bot.run(token, log_handler=None)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
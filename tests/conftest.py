@@ -0,0 +1,28 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import guesser  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """A database file at the current schema"""
+    conn = sqlite3.connect(tmp_path / 'guesses.db')
+    guesser.migrate_database(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A single-file PartitionedDatabase at the current schema, closed after the test"""
+    db = guesser.PartitionedDatabase(str(tmp_path / 'guesses.db'))
+    conn = sqlite3.connect(db.path)
+    guesser.migrate_database(conn)
+    conn.close()
+    return db
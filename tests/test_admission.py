@@ -0,0 +1,49 @@
+import guesser
+
+
+def test_token_bucket_allows_burst_then_waits():
+    buckets = guesser.TokenBuckets(rate=0.5, burst=3, max_buckets=100)
+    assert [buckets.take('a', 0) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take('a', 0) == 2
+    # Another key has its own bucket
+    assert buckets.take('b', 0) == 0
+
+
+def test_token_bucket_refills_at_rate():
+    buckets = guesser.TokenBuckets(rate=0.5, burst=3, max_buckets=100)
+    for _ in range(3):
+        buckets.take('a', 0)
+    assert buckets.take('a', 1) == 1
+    assert buckets.take('a', 2) == 0
+    assert buckets.take('a', 2) == 2
+
+
+def test_token_bucket_refund():
+    buckets = guesser.TokenBuckets(rate=0.5, burst=1, max_buckets=100)
+    assert buckets.take('a', 0) == 0
+    buckets.refund('a')
+    assert buckets.take('a', 0) == 0
+    assert buckets.take('a', 0) == 2
+
+
+def test_token_buckets_drop_idle_and_cap_size():
+    buckets = guesser.TokenBuckets(rate=1, burst=2, max_buckets=3)
+    buckets.take('a', 0)
+    buckets.take('b', 1)
+    # 'a' has refilled by now, so it is dropped; 'b' hasn't yet
+    buckets.take('c', 2)
+    assert len(buckets) == 2
+    for key in 'defg':
+        buckets.take(key, 2)
+    assert len(buckets) == 3
+
+
+def test_admission_rejects_pending_session_per_guild():
+    admission = guesser.GuessAdmission()
+    assert admission.start_session(1, 10)
+    assert not admission.start_session(1, 10)
+    assert admission.admit(1, 10) == ('pending', 0)
+    # The same user can still guess in another guild
+    assert admission.start_session(2, 10)
+    admission.end_session(1, 10)
+    assert admission.admit(1, 10) is None
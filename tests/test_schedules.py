@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timezone
+
+import guesser
+
+GUILD = 5 << 22
+
+
+def at(text):
+    return datetime.strptime(text, '%Y-%m-%d %H:%M').replace(tzinfo=timezone.utc).timestamp()
+
+
+def test_parse_schedule_time_offsets():
+    now = at('2024-03-01 12:00')
+    assert guesser.parse_schedule_time('+30m', now) == now + 30 * 60
+    assert guesser.parse_schedule_time(' +2h ', now) == now + 2 * 3600
+    assert guesser.parse_schedule_time('+1d', now) == now + 86400
+
+
+def test_parse_schedule_time_clock_and_date():
+    now = at('2024-03-01 12:00')
+    assert guesser.parse_schedule_time('18:30', now) == at('2024-03-01 18:30')
+    # A time that has already passed today means tomorrow
+    assert guesser.parse_schedule_time('09:00', now) == at('2024-03-02 09:00')
+    assert guesser.parse_schedule_time('12:00', now) == at('2024-03-02 12:00')
+    assert guesser.parse_schedule_time('2024-12-25 08:15', now) == at('2024-12-25 08:15')
+
+
+def test_parse_schedule_time_rejects_garbage():
+    now = at('2024-03-01 12:00')
+    for text in ('', 'tomorrow', '+5w', '25:00', '2024-13-01 10:00', '+m'):
+        assert guesser.parse_schedule_time(text, now) is None
+
+
+class FakeChannel:
+    def __init__(self, sent):
+        self.sent = sent
+
+    async def send(self, embed=None):
+        self.sent.append(embed.title)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    def get_partial_messageable(self, channel_id):
+        return FakeChannel(self.sent)
+
+
+def run_scheduler(db, steps):
+    async def run():
+        writer = guesser.GuessWriter(db)
+        questions = guesser.QuestionCache(db)
+        await questions.load(guesser.GuildPartition())
+        scheduler = guesser.QuestionScheduler(db, questions, guesser.StatsTracker(db, writer, questions))
+        scheduler.bot = FakeBot()
+        try:
+            return await steps(scheduler, questions)
+        finally:
+            await db.close()
+    return asyncio.run(run())
+
+
+def test_repeating_schedule_skips_missed_repeats(db):
+    async def steps(scheduler, questions):
+        await questions.set_question(GUILD, 1, 'How many beans?', True)
+        now = at('2024-03-10 12:00')
+        # Last ran three and a half days ago
+        schedule = await scheduler.add(GUILD, 7, 'open', 1, at('2024-03-07 00:00'), repeat='daily')
+        await scheduler._apply([schedule], now)
+        stored = await db.main.fetchall('SELECT schedule_id, due_at FROM schedules')
+        return schedule, questions.get(GUILD, 1), stored, scheduler.bot.sent
+
+    schedule, state, stored, sent = run_scheduler(db, steps)
+    # Runs once and moves to the next time after now, not once per missed day
+    assert schedule.due_at == at('2024-03-11 00:00')
+    assert stored == [(1, at('2024-03-11 00:00'))]
+    assert state.is_open
+    assert sent == ['🎯 Guessing is Now OPEN!']
+
+
+def test_weekly_and_one_off_schedules(db):
+    async def steps(scheduler, questions):
+        await questions.set_question(GUILD, 1, 'How many beans?', True)
+        now = at('2024-03-10 12:00')
+        weekly = await scheduler.add(GUILD, 7, 'open', 1, at('2024-03-10 11:00'), repeat='weekly')
+        once = await scheduler.add(GUILD, 7, 'close', 1, at('2024-03-10 11:30'))
+        await scheduler._apply([once, weekly], now)
+        stored = await db.main.fetchall('SELECT schedule_id, due_at FROM schedules')
+        return weekly, questions.get(GUILD, 1), stored, scheduler.guild_schedules(GUILD)
+
+    weekly, state, stored, remaining = run_scheduler(db, steps)
+    assert weekly.due_at == at('2024-03-17 11:00')
+    # The one-off schedule is gone; the later close wins over the earlier open
+    assert stored == [(1, at('2024-03-17 11:00'))]
+    assert remaining == [weekly]
+    assert not state.is_open
+
+
+def test_scheduled_set_question_replaces_it_closed(db):
+    async def steps(scheduler, questions):
+        await questions.set_question(GUILD, 1, 'Old question', True)
+        await questions.set_open(GUILD, 1, True)
+        old_serial = questions.get(GUILD, 1).serial
+        schedule = await scheduler.add(GUILD, 7, 'set', 1, at('2024-03-10 11:00'), question_text='New question', is_numeric=False)
+        await scheduler._apply([schedule], at('2024-03-10 12:00'))
+        return old_serial, questions.get(GUILD, 1)
+
+    old_serial, state = run_scheduler(db, steps)
+    assert (state.question_text, state.is_open, state.is_numeric) == ('New question', False, False)
+    assert state.serial != old_serial
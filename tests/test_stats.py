@@ -0,0 +1,40 @@
+import bisect
+import random
+import statistics
+
+import guesser
+
+
+def test_order_statistic_tree_matches_sorted_list():
+    rng = random.Random(1)
+    tree = guesser.OrderStatisticTree()
+    values = []
+    for _ in range(3000):
+        if values and rng.random() < 0.4:
+            value = rng.choice(values)
+            tree.remove(value)
+            values.remove(value)
+        else:
+            value = rng.randint(-50, 50)
+            tree.add(value)
+            bisect.insort(values, value)
+        assert len(tree) == len(values)
+        if values:
+            assert [tree.kth(0), tree.kth(len(values) // 2), tree.kth(len(values) - 1)] == \
+                [values[0], values[len(values) // 2], values[-1]]
+    # Removing a value that isn't there changes nothing
+    tree.remove(1000)
+    assert len(tree) == len(values)
+
+
+def test_guild_stats_aggregates():
+    stats = guesser.GuildStats()
+    for guess in (5, 1, 9, 3):
+        stats.add(guess, str(guess))
+    stats.add(None, 'lots')
+    assert stats.count == 5
+    assert (stats.minimum, stats.maximum, stats.median, stats.mean) == (1, 9, 4, 4.5)
+    assert stats.stdev == statistics.pstdev([5, 1, 9, 3])
+    stats.remove(9, '9')
+    assert (stats.maximum, stats.median) == (5, 3)
+    assert stats.answers.most_common(1) == [('1', 1)]
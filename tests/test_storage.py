@@ -0,0 +1,119 @@
+import asyncio
+import sqlite3
+
+import guesser
+
+GUILD = 5 << 22
+
+
+def insert_guesses(conn, guesses, guild_id=GUILD, game_round=1, question_id=1):
+    rows = [(guild_id, game_round, question_id, user_id, f'user{user_id}', guess,
+             guesser.parse_guess_num(guess), guesser.normalize_answer(guess))
+            for user_id, guess in enumerate(guesses, 1)]
+    guesser.write_guesses(conn, rows)
+
+
+def test_migrate_fresh_database(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'fresh.db')
+    guesser.migrate_database(conn)
+    tables = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'guesses', 'question', 'guild_settings', 'guild_rounds', 'thread_cleanup', 'round_history',
+            'round_results', 'leaderboard', 'schedules'} <= tables
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == guesser.SCHEMA_VERSION
+    # New files start out with incremental vacuum
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    # Running it again is a no-op
+    guesser.migrate_database(conn)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == guesser.SCHEMA_VERSION
+
+
+def test_migrate_baseline_schema(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'baseline.db')
+    conn.executescript('''
+        CREATE TABLE guesses (guild_id INTEGER, user_id INTEGER, username TEXT, guess TEXT, PRIMARY KEY (guild_id, user_id));
+        CREATE TABLE question (guild_id INTEGER PRIMARY KEY, question_text TEXT DEFAULT '', is_open INTEGER DEFAULT 0, is_numeric INTEGER DEFAULT 1);
+        INSERT INTO guesses VALUES (42, 1, 'alice', '150'), (42, 2, 'bob', 'Café');
+        INSERT INTO question VALUES (42, 'How many beans?', 1, 0);
+    ''')
+    guesser.migrate_database(conn)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == guesser.SCHEMA_VERSION
+    assert conn.execute(
+        'SELECT guild_id, round, question_id, user_id, username, guess, guess_num, guess_norm FROM guesses ORDER BY user_id'
+    ).fetchall() == [
+        (42, 1, 1, 1, 'alice', '150', 150, '150'),
+        (42, 1, 1, 2, 'bob', 'Café', None, 'cafe'),
+    ]
+    assert conn.execute('SELECT guild_id, question_id, question_text, is_open, is_numeric FROM question').fetchall() == [
+        (42, 1, 'How many beans?', 1, 0),
+    ]
+    assert conn.execute('SELECT serial FROM question').fetchone()[0] is not None
+
+
+def test_guess_writer_batches_and_drains(db):
+    async def run():
+        writer = guesser.GuessWriter(db, max_rows=3, max_delay=60)
+        commits = []
+        writer.add_listener(lambda part, seq, changes: commits.append((seq, len(changes))))
+        # Three guesses fill a batch and commit without waiting for the timer
+        await asyncio.gather(*(writer.submit(GUILD, 1, 1, user_id, f'user{user_id}', str(user_id)) for user_id in range(3)))
+        assert commits == [(1, 3)]
+
+        # A partial batch waits for its timer, or for drain()
+        pending = [asyncio.create_task(writer.submit(GUILD, 1, 1, user_id, f'user{user_id}', '7')) for user_id in (3, 4)]
+        await asyncio.sleep(0)
+        assert writer.queued == 2
+        await writer.drain(GUILD)
+        await asyncio.gather(*pending)
+        assert commits == [(1, 3), (2, 2)]
+        assert writer.queued == 0
+
+        rows = await db.main.fetchall('SELECT user_id, guess_num FROM guesses ORDER BY user_id')
+        await writer.close()
+        await db.close()
+        return writer, rows
+
+    writer, rows = asyncio.run(run())
+    assert rows == [(0, 0), (1, 1), (2, 2), (3, 7), (4, 7)]
+    assert (writer.batches_committed, writer.rows_committed) == (2, 5)
+
+
+def test_write_guesses_reports_replaced_guess(conn):
+    insert_guesses(conn, ['10'])
+    changes = guesser.write_guesses(conn, [(GUILD, 1, 1, 1, 'user1', '12', 12, '12')])
+    assert changes == [(GUILD, 1, 1, (10, '10'), (12, '12'))]
+
+
+def test_closest_guesses_with_ties(conn):
+    insert_guesses(conn, ['90', '110', '100', '95', '105', '300'])
+    closest = guesser.closest_guesses(conn, GUILD, 1, 1, 100, 5)
+    assert closest[0] == ('user3', 100, 0)
+    # Equal distances either side of the answer come out together, lower first
+    assert closest[1:] == [('user4', 95, 5), ('user5', 105, 5), ('user1', 90, 10), ('user2', 110, 10)]
+    assert [row[0] for row in guesser.closest_guesses(conn, GUILD, 1, 1, 1000, 2)] == ['user6', 'user2']
+
+
+def test_place_guesses_shares_places_on_ties(conn):
+    insert_guesses(conn, ['100', '98', '102', '90', '90', '80', '120', '50'])
+    placed = guesser.place_guesses(conn, GUILD, 1, 1, 100, True)
+    assert [(place, user_id) for place, user_id, _, _ in placed] == [
+        (1, 1), (2, 2), (2, 3), (4, 4), (4, 5),
+    ]
+
+
+def test_place_guesses_counts_every_guess_tied_with_last_place(conn):
+    insert_guesses(conn, ['100', '99', '101', '98', '102', '103', '97'])
+    placed = guesser.place_guesses(conn, GUILD, 1, 1, 100, True)
+    assert [(place, user_id) for place, user_id, _, _ in placed] == [
+        (1, 1), (2, 2), (2, 3), (4, 4), (4, 5),
+    ]
+    insert_guesses(conn, ['100', '99', '101', '98', '102', '98'], question_id=2)
+    placed = guesser.place_guesses(conn, GUILD, 1, 2, 100, True)
+    assert [(place, user_id) for place, user_id, _, _ in placed] == [
+        (1, 1), (2, 2), (2, 3), (4, 4), (4, 5), (4, 6),
+    ]
+
+
+def test_place_guesses_text_answers_match_normalized(conn):
+    insert_guesses(conn, ['Café', 'cafe ', 'tea'])
+    placed = guesser.place_guesses(conn, GUILD, 1, 1, 'CAFE', False)
+    assert [(place, user_id) for place, user_id, _, _ in placed] == [(1, 1), (1, 2)]